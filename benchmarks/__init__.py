@@ -0,0 +1,33 @@
+import timeit
+from typing import Callable
+
+
+def timed(func: Callable, number: int = 1000, repeat: int = 5) -> dict:
+    """
+    Time a zero argument callable, reporting the best of repeat runs (least affected by other load).
+
+    Parameters
+    ----------
+    func: Callable to time
+    number: Calls per run
+    repeat: Number of runs
+
+    Returns
+    -------
+    Timing summary, per call times in microseconds
+    """
+    runs = timeit.Timer(func).repeat(repeat=repeat, number=number)
+    best = min(runs)
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_us": best / number * 1e6,
+        "mean_us": sum(runs) / len(runs) / number * 1e6,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<40} best {result['best_us']:>10.3f} us/call   mean {result['mean_us']:>10.3f} us/call"
+    )
@@ -0,0 +1,221 @@
+"""
+Runs the benchmark suites, with: python -m packages.shared.benchmarks [suite ...] [options]
+
+Suites needing services are skipped unless enabled: --postgres for the database suites (a local scratch PostgreSQL
+database, see ingest and partitions) and --mongo to use a running MongoDB rather than mongomock. Results can be written
+as JSON (--output) and compared with a previous run (--compare), exiting non-zero if any benchmark is slower by more
+than --threshold:
+
+    python -m packages.shared.benchmarks --output baseline.json
+    python -m packages.shared.benchmarks --compare baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+SUITES: dict[str, Callable] = {}
+POSTGRES_SUITES = {"ingest", "partitions"}
+
+
+def suite(name: str):
+    """Register a suite, called with the scale and parsed arguments and returning its results."""
+
+    def register(func: Callable) -> Callable:
+        SUITES[name] = func
+        return func
+
+    return register
+
+
+def scaled(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+
+# Suites are imported when run, so one with missing dependencies does not stop the others
+
+
+@suite("dates")
+def run_dates(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import dates
+
+    return dates.main(scaled(100_000, scale))
+
+
+@suite("schemas")
+def run_schemas(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import schemas
+
+    return schemas.main(scaled(500, scale))
+
+
+@suite("serialization")
+def run_serialization(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import serialization
+
+    return serialization.main(scaled(500, scale))
+
+
+@suite("outputs")
+def run_outputs(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import outputs
+
+    return outputs.main(scaled(500, scale), mongo=args.mongo)
+
+
+@suite("itineraries")
+def run_itineraries(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import itineraries
+
+    return itineraries.main(scaled(5000, scale))
+
+
+@suite("consume")
+def run_consume(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import consume
+
+    return consume.main(scaled(10_000, scale))
+
+
+@suite("geo")
+def run_geo(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import geo
+
+    return geo.main(scaled(10_000, scale), mongo=args.mongo)
+
+
+@suite("route_loader")
+def run_route_loader(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import route_loader
+
+    return route_loader.main(scaled(100_000, scale), mongo=args.mongo)
+
+
+@suite("imports")
+def run_imports(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import imports
+
+    return imports.main()
+
+
+@suite("ingest")
+def run_ingest(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import ingest
+
+    return ingest.main(scaled(1000, scale), scaled(500, scale))
+
+
+@suite("partitions")
+def run_partitions(scale: float, args: argparse.Namespace) -> dict:
+    from packages.shared.benchmarks import partitions
+
+    return partitions.main(scaled(1_000_000, scale))
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Benchmarks slower than in a baseline run.
+
+    Parameters
+    ----------
+    results: Suite results of this run
+    baseline: Suite results of the baseline run
+    threshold: Allowed slowdown as a fraction of the baseline time, e.g. 0.1 for 10%
+
+    Returns
+    -------
+    Descriptions of the regressions, empty if there are none
+    """
+    regressions = []
+    for name, benchmarks in results.items():
+        for benchmark, result in benchmarks.items():
+            previous = baseline.get(name, {}).get(benchmark)
+            if previous is None:
+                continue
+
+            change = result["best_us"] / previous["best_us"] - 1
+            line = f"{name}: {benchmark:<40} {change:>+8.1%}"
+            print(line)
+            if change > threshold:
+                regressions.append(line)
+
+    return regressions
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m packages.shared.benchmarks")
+    parser.add_argument(
+        "suites", nargs="*", help=f"Suites to run, default all of: {', '.join(SUITES)}"
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier of data sizes"
+    )
+    parser.add_argument("--output", type=Path, help="Write results to a JSON file")
+    parser.add_argument("--compare", type=Path, help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown against --compare, as a fraction",
+    )
+    parser.add_argument(
+        "--postgres", action="store_true", help="Run the PostgreSQL suites"
+    )
+    parser.add_argument(
+        "--mongo", action="store_true", help="Use the configured MongoDB server"
+    )
+
+    args = parser.parse_args(argv)
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+    return args
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+
+    names = args.suites or [
+        name for name in SUITES if args.postgres or name not in POSTGRES_SUITES
+    ]
+
+    results = {}
+    for name in names:
+        print(f"\n{name}")
+        results[name] = SUITES[name](args.scale, args) or {}
+
+    if args.output is not None:
+        output = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "scale": args.scale,
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(output, indent=2))
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["meta"]["scale"] != args.scale:
+            print(f"Warning: baseline was run at scale {baseline['meta']['scale']}")
+
+        print("\nChange against baseline")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} benchmarks slower by over {args.threshold:.0%}"
+            )
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
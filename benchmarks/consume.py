@@ -0,0 +1,77 @@
+"""
+Queue throughput benchmark, run with: python -m packages.shared.benchmarks.consume
+
+Times utils.queue.consume delivering request messages to a callback that parses and acknowledges them, and
+publish_batch, against an in-memory broker (benchmarks.fakes.FakeBroker), so the package's own per message overhead
+is measured rather than the network.
+"""
+
+import sys
+from datetime import datetime
+from unittest import mock
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.benchmarks.fakes import ConsumerStopped, FakeBroker
+from packages.shared.benchmarks.generators import iata_codes, request_creates
+from packages.shared.sql import schemas
+from packages.shared.utils import queue
+
+QUEUE = "benchmark"
+
+
+def request_bodies(n: int) -> list[bytes]:
+    """Request messages, as published by job.submit_requests."""
+    timestamp = datetime(2029, 12, 1, 12)
+    bodies = []
+    for i, payload in enumerate(request_creates(n, iata_codes(100)), start=1):
+        request = schemas.RequestCreate(**payload)
+        bodies.append(
+            schemas.Request(
+                id=i, status="created", timestamp=timestamp, **request.model_dump()
+            )
+            .model_dump_json()
+            .encode()
+        )
+
+    return bodies
+
+
+def main(n: int = 10_000):
+    bodies = request_bodies(n)
+    broker = FakeBroker()
+
+    def callback(channel, method, properties, body):
+        schemas.Request.model_validate_json(body)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def consume():
+        broker.queues[QUEUE].extend(bodies)
+        try:
+            queue.consume(QUEUE, callback)
+        except ConsumerStopped:
+            pass
+
+    def publish():
+        channel = broker.connect().channel()
+        queue.publish_batch(channel, QUEUE, bodies)
+        broker.queues[QUEUE].clear()
+
+    with mock.patch.object(queue, "open_pika_connection", broker.connect):
+        results = {
+            f"consume (n={n})": timed(consume, number=1, repeat=3),
+            f"publish_batch (n={n})": timed(publish, number=1, repeat=3),
+        }
+
+    acked = sum(channel.acked for channel in broker.channels)
+    assert acked == 3 * n, f"Expected {3 * n} messages acknowledged, got {acked}"
+
+    for name, result in results.items():
+        result["per_message_us"] = result["best_us"] / n
+        report(name, result)
+        print(f"{'':<40} {result['per_message_us']:>10.3f} us/message")
+
+    return results
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,59 @@
+"""
+Duration parsing microbenchmark, run with: python -m packages.shared.benchmarks.dates
+"""
+
+import re
+from datetime import timedelta
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.utils.dates import (
+    PERIOD_MAPPING,
+    minutes_from_string,
+    parse_durations,
+    time_from_string,
+)
+
+SAMPLES = ["2h 35m", "55m", "1d 2h", "14h 5m", "3h", "23h 59m", "1day 6hours 3min"]
+
+
+def legacy_time_from_string(v: str):
+    # Previous implementation, kept for comparison
+    out = re.findall(r"((\d+)(\s?[a-z]+))", v)
+
+    args = {}
+    for group in out:
+        for key, val in PERIOD_MAPPING.items():
+            if group[-1].startswith(val):
+                args[key] = int(group[1])
+                break
+
+    return timedelta(**args)
+
+
+def main(n: int = 100_000):
+    values = [SAMPLES[i % len(SAMPLES)] for i in range(n)]
+
+    results = {
+        "legacy_time_from_string": timed(
+            lambda: legacy_time_from_string("2h 35m"), number=n
+        ),
+        "time_from_string_cached": timed(lambda: time_from_string("2h 35m"), number=n),
+        "time_from_string_uncached": timed(
+            lambda: time_from_string.__wrapped__("2h 35m"), number=n
+        ),
+        "minutes_from_string": timed(lambda: minutes_from_string("2h 35m"), number=n),
+    }
+
+    batch = timed(lambda: parse_durations(values), number=1)
+    batch["best_us"] /= n
+    batch["mean_us"] /= n
+    results[f"parse_durations (per item, n={n})"] = batch
+
+    for name, result in results.items():
+        report(name, result)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
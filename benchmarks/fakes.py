@@ -0,0 +1,124 @@
+"""
+In-process stand-ins for external services, so benchmarks run offline: an in-memory RabbitMQ broker implementing the
+parts of the pika BlockingChannel API used by utils.queue, and a MongoDB database (mongomock if installed, or a local
+mongod).
+"""
+
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from pymongo.database import Database
+
+
+class ConsumerStopped(BaseException):
+    """
+    Raised once a FakeBroker has no more messages and consuming is to stop. A BaseException so that it is not retried
+    by utils.queue.consume, which reconnects on any Exception.
+    """
+
+
+class FakeChannel:
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+        self.broker = connection.broker
+        self.is_open = True
+        self.consumers: list[tuple[str, Callable]] = []
+        self._transaction: Optional[list] = None
+        self.acked = 0
+
+    def queue_declare(self, queue: str, durable: bool = False, **kwargs):
+        self.broker.queues[queue]
+
+    def basic_qos(self, prefetch_count: int = 0, **kwargs):
+        pass
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None):
+        if self._transaction is not None:
+            self._transaction.append((routing_key, body))
+        else:
+            self.broker.queues[routing_key].append(body)
+
+    def tx_select(self):
+        self._transaction = []
+
+    def tx_commit(self):
+        for queue, body in self._transaction or ():
+            self.broker.queues[queue].append(body)
+        self._transaction = []
+
+    def tx_rollback(self):
+        self._transaction = []
+
+    def basic_consume(self, queue: str, on_message_callback: Callable, **kwargs):
+        self.consumers.append((queue, on_message_callback))
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        self.acked += 1
+
+    def start_consuming(self):
+        """Deliver every queued message to the consumers, then stop (see ConsumerStopped)."""
+        properties = SimpleNamespace(delivery_mode=2)
+        for queue, callback in self.consumers:
+            messages = self.broker.queues[queue]
+            tag = 0
+            while messages:
+                tag += 1
+                method = SimpleNamespace(delivery_tag=tag, routing_key=queue)
+                callback(self, method, properties, messages.popleft())
+
+        raise ConsumerStopped
+
+    def stop_consuming(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeConnection:
+    def __init__(self, broker: "FakeBroker"):
+        self.broker = broker
+
+    def channel(self) -> FakeChannel:
+        channel = FakeChannel(self)
+        self.broker.channels.append(channel)
+        return channel
+
+    def close(self):
+        pass
+
+
+class FakeBroker:
+    """
+    In-memory broker. Pass connect as the connection factory in place of utils.queue.open_pika_connection, e.g.:
+
+        broker = FakeBroker()
+        broker.connect().channel().basic_publish("", "requests", body)
+    """
+
+    def __init__(self):
+        self.queues: defaultdict[str, deque] = defaultdict(deque)
+        self.channels: list[FakeChannel] = []
+
+    def connect(self, url: Optional[str] = None) -> FakeConnection:
+        return FakeConnection(self)
+
+
+def mongo_db(local: bool = False, name: str = "benchmark") -> Optional[Database]:
+    """
+    Database for benchmarks: a scratch database on the configured MongoDB server if local (e.g. a local mongod),
+    otherwise an in-memory mongomock database. None if mongomock is not installed.
+    """
+    if local:
+        from packages.shared.mongodb.database import get_db
+
+        db = get_db()
+        return db.client[f"{db.name}_{name}"]
+
+    try:
+        import mongomock
+    except ImportError:
+        return None
+
+    return mongomock.MongoClient()[name]
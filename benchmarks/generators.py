@@ -0,0 +1,565 @@
+"""
+Synthetic data for benchmarks, deterministic for a given seed so results are comparable between runs. Simple payloads
+for microbenchmarks, and a Network with realistic distributions for load testing (see benchmarks.loadgen).
+"""
+
+import random
+import string
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from math import ceil, sqrt
+from typing import Optional
+
+from packages.shared.mongodb.geo import haversine
+
+AIRLINES = ["Turkish Airlines", "Lufthansa", "British Airways", "Pegasus", "KLM"]
+EPOCH = date(2030, 1, 1)
+
+
+def iata_codes(n: int, seed: int = 0) -> list[str]:
+    """n distinct three letter codes."""
+    rng = random.Random(seed)
+    codes = set()
+    while len(codes) < n:
+        codes.add("".join(rng.choices(string.ascii_uppercase, k=3)))
+
+    return sorted(codes)
+
+
+def airports(n: int, seed: int = 0) -> list[dict]:
+    """mongodb.schemas.Airport documents."""
+    rng = random.Random(seed)
+    return [
+        {
+            "iata_code": code,
+            "icao_code": f"X{code}",
+            "name": f"{code} International",
+            "country_code": rng.choice(["GB", "TR", "DE", "FR", "US"]),
+            "location": {
+                "type": "Point",
+                "coordinates": [rng.uniform(-180, 180), rng.uniform(-80, 80)],
+            },
+        }
+        for code in iata_codes(n, seed)
+    ]
+
+
+def request_creates(n: int, ports: list[str], seed: int = 0) -> list[dict]:
+    """sql.schemas.RequestCreate payloads, departing from tomorrow onwards."""
+    rng = random.Random(seed)
+    start = date.today() + timedelta(days=1)
+
+    requests = []
+    for _ in range(n):
+        dep_port, arr_port = rng.sample(ports, 2)
+        dep_date = start + timedelta(days=rng.randrange(180))
+        ret_date = (
+            dep_date + timedelta(days=rng.randrange(1, 15))
+            if rng.random() < 0.7
+            else None
+        )
+        requests.append(
+            {
+                "dep_port": dep_port,
+                "arr_port": arr_port,
+                "dep_date": dep_date,
+                "ret_date": ret_date,
+                "flex_option": rng.choice([0, 0, 1, 2, 3]),
+                "sorted_by": rng.choice(["bestflight", "price", "duration"]),
+                "direct": rng.random() < 0.2,
+            }
+        )
+
+    return requests
+
+
+def _time(minutes: int) -> str:
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def flight(rng: random.Random, dep_port: str, arr_port: str, dep_minutes: int) -> dict:
+    """sql.schemas.FlightBase payload."""
+    duration = rng.randrange(45, 720, 5)
+    airline = "".join(rng.choices(string.ascii_uppercase, k=2))
+    return {
+        "number": f"{airline}{rng.randrange(1, 9999)}",
+        "duration": duration,
+        "dep_time": _time(dep_minutes),
+        "dep_port": dep_port,
+        "arr_time": _time(dep_minutes + duration),
+        "arr_port": arr_port,
+    }
+
+
+def journey(
+    rng: random.Random,
+    dep_port: str,
+    arr_port: str,
+    day: date,
+    ports: list[str],
+    max_stops: int = 2,
+) -> dict:
+    """sql.schemas.JourneyBase payload, with flights."""
+    stops = rng.randrange(max_stops + 1)
+    path = [dep_port, *rng.sample(ports, stops), arr_port]
+
+    start = minutes = rng.randrange(0, 24 * 60, 5)
+    flights = []
+    for dep, arr in zip(path, path[1:]):
+        if flights:
+            # Connection time
+            minutes += rng.randrange(60, 300, 5)
+        flights.append(flight(rng, dep, arr, minutes))
+        minutes += flights[-1]["duration"]
+
+    duration = minutes - start
+    return {
+        "date": day,
+        "day": (day.weekday() + 1) % 7,
+        "duration": duration,
+        "dep_port": dep_port,
+        "dep_time": flights[0]["dep_time"],
+        "arr_port": arr_port,
+        "arr_time": flights[-1]["arr_time"],
+        "arr_day_offset": minutes // (24 * 60),
+        "airline": rng.choice(AIRLINES),
+        "stops": stops,
+        "stop_city": path[1] if stops else None,
+        "flights": flights,
+    }
+
+
+def trips(
+    n: int,
+    dep_port: str = "LHR",
+    arr_port: str = "IST",
+    dep_date: date = EPOCH,
+    ret_date: Optional[date] = None,
+    seed: int = 0,
+) -> list[dict]:
+    """sql.schemas.TripBase payloads, i.e. scrape results of one request."""
+    rng = random.Random(seed)
+    ports = [p for p in iata_codes(50, seed) if p not in (dep_port, arr_port)]
+
+    results = []
+    for _ in range(n):
+        journey_1 = journey(rng, dep_port, arr_port, dep_date, ports)
+        journey_2 = (
+            journey(rng, arr_port, dep_port, ret_date, ports)
+            if ret_date is not None
+            else None
+        )
+        results.append(
+            {
+                "price": rng.randrange(50, 1500),
+                "currency": "USD",
+                "journey_1": journey_1,
+                "journey_2": journey_2,
+            }
+        )
+
+    return results
+
+
+def request_output_rows(n_results: int, seed: int = 0) -> dict:
+    """sql.schemas.RequestOutput shaped dict with ids, as read from the database."""
+    results = trips(n_results, ret_date=EPOCH + timedelta(days=7), seed=seed)
+
+    ids = iter(range(1, 10 * n_results + 1))
+    for n, result in enumerate(results, start=1):
+        result["id"] = n
+        result["request_id"] = 1
+        for i in (1, 2):
+            journey_ = result[f"journey_{i}"]
+            journey_["id"] = result[f"journey_id_{i}"] = next(ids)
+            for flight_ in journey_["flights"]:
+                flight_["id"] = next(ids)
+
+    return {
+        "id": 1,
+        "status": "finished",
+        "timestamp": datetime(2029, 12, 1, 12),
+        "dep_port": "LHR",
+        "arr_port": "IST",
+        "dep_date": EPOCH,
+        "ret_date": EPOCH + timedelta(days=7),
+        "flex_option": 0,
+        "sorted_by": "price",
+        "direct": False,
+        "results": results,
+    }
+
+
+SYLLABLES = [
+    "ka",
+    "ro",
+    "va",
+    "mi",
+    "len",
+    "tor",
+    "sa",
+    "bel",
+    "du",
+    "ran",
+    "ost",
+    "ne",
+    "li",
+    "gar",
+    "zu",
+]
+COUNTRIES = ["GB", "TR", "DE", "FR", "US", "ES", "IT", "NL", "AE", "JP", "BR", "IN"]
+AIRCRAFT = ["A320", "A321", "B738", "B38M", "A359", "B789", "E190"]
+# Days of operation (0 is Sunday) of non daily flights
+WEEKLY_SCHEDULES = [[1, 3, 5], [0, 2, 4, 6], [1, 2, 3, 4, 5], [0, 5], [0, 1, 3, 5, 6]]
+# Currencies results are quoted in, weights and approximate units per USD
+CURRENCIES = {
+    "USD": (0.6, 1.0),
+    "EUR": (0.2, 0.92),
+    "GBP": (0.15, 0.79),
+    "TRY": (0.05, 32.0),
+}
+# Nights stayed on return trips (None for one way) and their weights
+STAYS = {None: 25, 2: 10, 3: 12, 4: 8, 7: 20, 10: 8, 14: 10, 21: 7}
+FLEX_WEIGHTS = [60, 15, 15, 10]
+MIN_CONNECTION = 50
+
+
+def _city(rng: random.Random) -> str:
+    return "".join(rng.choices(SYLLABLES, k=rng.randrange(2, 4))).capitalize()
+
+
+class Network:
+    """
+    Synthetic airport network for load testing, deterministic for a given seed. A few hub airports take most of the
+    traffic and are connected to each other, other airports are served from their regional hub (and some other hubs),
+    and every route has scheduled flights. Results follow the schedule, so the same flights recur across results and
+    requests as they do in scraped data, with prices by distance, stops and day of the week.
+
+    Parameters
+    ----------
+    n_airports: Number of airports
+    n_hubs: Number of hub airports
+    seed: Random seed
+    """
+
+    def __init__(self, n_airports: int = 500, n_hubs: int = 25, seed: int = 0):
+        if not 2 <= n_hubs <= n_airports:
+            raise ValueError(
+                "Network needs at least two hubs and no more hubs than airports"
+            )
+
+        rng = random.Random(f"{seed}-network")
+        self.seed = seed
+
+        codes = iata_codes(n_airports, seed)
+        rng.shuffle(codes)
+        self.hubs = codes[:n_hubs]
+        self.region: dict[str, str] = {}
+        self.cities: dict[str, str] = {}
+        self.coordinates: dict[str, tuple[float, float]] = {}
+        self.airports: list[dict] = []
+
+        for i, code in enumerate(codes):
+            if i < n_hubs:
+                hub = code
+                lon, lat = rng.uniform(-150, 150), rng.uniform(-40, 60)
+            else:
+                hub = rng.choice(self.hubs)
+                hub_lon, hub_lat = self.coordinates[hub]
+                lon = max(-180.0, min(180.0, rng.gauss(hub_lon, 5)))
+                lat = max(-80.0, min(80.0, rng.gauss(hub_lat, 4)))
+
+            self.region[code] = hub
+            self.cities[code] = _city(rng)
+            self.coordinates[code] = (lon, lat)
+            self.airports.append(
+                {
+                    "iata_code": code,
+                    "icao_code": f"X{code}",
+                    "name": f"{self.cities[code]} {'International' if code == hub else 'Airport'}",
+                    "country_code": rng.choice(COUNTRIES),
+                    "location": {"type": "Point", "coordinates": [lon, lat]},
+                }
+            )
+
+        # Traffic weights for picking request airports, hubs by (Zipf distributed) rank
+        self.weights = [
+            10 / (rank + 1) ** 0.8 if rank < n_hubs else rng.paretovariate(2) * 0.2
+            for rank in range(n_airports)
+        ]
+        self.codes = codes
+        self._cum_weights = list(accumulate(self.weights))
+
+        # Carrier based at each hub: (IATA, ICAO, name)
+        self.carriers: dict[str, tuple[str, str, str]] = {}
+        designators = iter(iata_codes(n_hubs + 10, seed + 1))
+        for hub in self.hubs:
+            designator = next(designators)
+            self.carriers[hub] = (
+                designator[:2],
+                designator,
+                f"{self.cities[hub]} Airways",
+            )
+
+        # Flights by route, each (flight, days of operation, carrier, price in USD, departure minutes)
+        self.schedule: dict[tuple[str, str], list[tuple]] = {}
+        self._numbers = {carrier[0]: 100 for carrier in self.carriers.values()}
+        for i, dep in enumerate(self.hubs):
+            for arr in self.hubs[i + 1 :]:
+                self._add_route(rng, dep, arr, rng.randrange(1, 5))
+
+        for code in codes[n_hubs:]:
+            self._add_route(rng, code, self.region[code], rng.randrange(1, 4))
+            for hub in rng.sample(self.hubs, min(len(self.hubs), rng.randrange(3))):
+                if hub != self.region[code]:
+                    self._add_route(rng, code, hub, 1)
+
+        self._paths: dict[tuple[str, str], list[tuple[str, ...]]] = {}
+
+    def distance(self, dep_port: str, arr_port: str) -> float:
+        """Great circle distance in km."""
+        return (
+            haversine(*self.coordinates[dep_port], *self.coordinates[arr_port]) / 1000
+        )
+
+    def _add_route(self, rng: random.Random, dep: str, arr: str, frequency: int):
+        """Add flights both ways between two airports, by the carriers based at either end."""
+        km = self.distance(dep, arr)
+        duration = int(30 + km / 13.5) // 5 * 5
+        carriers = {self.carriers[self.region[dep]], self.carriers[self.region[arr]]}
+
+        for carrier in sorted(carriers):
+            for _ in range(frequency):
+                days = (
+                    frozenset(range(7))
+                    if dep in self.carriers or rng.random() < 0.4
+                    else frozenset(rng.choice(WEEKLY_SCHEDULES))
+                )
+                price = (40 + 0.06 * km) * rng.uniform(0.8, 1.25)
+                for origin, destination in ((dep, arr), (arr, dep)):
+                    self._numbers[carrier[0]] += 1
+                    minutes = rng.randrange(6 * 60, 23 * 60, 5)
+                    flight_ = {
+                        "number": f"{carrier[0]}{self._numbers[carrier[0]]}",
+                        "duration": duration,
+                        "dep_time": _time(minutes),
+                        "dep_port": origin,
+                        "arr_time": _time(minutes + duration),
+                        "arr_port": destination,
+                    }
+                    self.schedule.setdefault((origin, destination), []).append(
+                        (flight_, days, carrier, price, minutes)
+                    )
+
+    def routes(self):
+        """mongodb.schemas.Route documents for the scheduled flights."""
+        rng = random.Random(f"{self.seed}-routes")
+        for (dep, arr), flights in self.schedule.items():
+            for flight_, days, carrier, *_ in flights:
+                number = flight_["number"][len(carrier[0]) :]
+                yield {
+                    "airline_iata": carrier[0],
+                    "airline_icao": carrier[1],
+                    "flight_number": number,
+                    "flight_iata": flight_["number"],
+                    "flight_icao": f"{carrier[1]}{number}",
+                    "dep_iata": dep,
+                    "dep_icao": f"X{dep}",
+                    "dep_time": flight_["dep_time"],
+                    "arr_iata": arr,
+                    "arr_icao": f"X{arr}",
+                    "arr_time": flight_["arr_time"],
+                    "duration": flight_["duration"],
+                    "days": sorted(days),
+                    "aircraft_icao": rng.choice(AIRCRAFT),
+                }
+
+    def paths(self, dep_port: str, arr_port: str) -> list[tuple[str, ...]]:
+        """Airports flown through from dep_port to arr_port: direct, via one hub, or via both regional hubs."""
+        key = (dep_port, arr_port)
+        if key not in self._paths:
+            paths = []
+            if key in self.schedule:
+                paths.append(key)
+
+            for hub in self.hubs:
+                if (dep_port, hub) in self.schedule and (
+                    hub,
+                    arr_port,
+                ) in self.schedule:
+                    paths.append((dep_port, hub, arr_port))
+
+            via = (dep_port, self.region[dep_port], self.region[arr_port], arr_port)
+            if not paths and all(leg in self.schedule for leg in zip(via, via[1:])):
+                paths.append(via)
+
+            self._paths[key] = paths
+
+        return self._paths[key]
+
+    def journey(
+        self,
+        rng: random.Random,
+        dep_port: str,
+        arr_port: str,
+        day: date,
+        direct: bool = False,
+    ) -> Optional[tuple[dict, float]]:
+        """
+        A sql.schemas.JourneyBase payload (with flights) flying on a given day, and its price in USD. None if no
+        scheduled flights fly the route that day.
+        """
+        paths = self.paths(dep_port, arr_port)
+        if direct:
+            paths = [path for path in paths if len(path) == 2]
+        if not paths:
+            return None
+
+        path = rng.choice(paths)
+        weekday = (day.weekday() + 1) % 7
+        first = [f for f in self.schedule[path[0], path[1]] if weekday in f[1]]
+        if not first:
+            return None
+
+        legs = [rng.choice(first)]
+        start = minutes = legs[0][4]
+        minutes += legs[0][0]["duration"]
+        for leg in zip(path[1:], path[2:]):
+            earliest = minutes + MIN_CONNECTION
+            # Departures of each connecting flight after the connection time, mostly taking the first
+            departures = sorted(
+                (f[4] - (f[4] - earliest) // (24 * 60) * 24 * 60, i)
+                for i, f in enumerate(self.schedule[leg])
+            )
+            departs, i = departures[0] if rng.random() < 0.7 else rng.choice(departures)
+            legs.append(self.schedule[leg][i])
+            minutes = departs + legs[-1][0]["duration"]
+
+        stops = len(legs) - 1
+        carriers = {leg[2] for leg in legs}
+        journey_ = {
+            "date": day,
+            "day": weekday,
+            "duration": minutes - start,
+            "dep_port": dep_port,
+            "dep_time": legs[0][0]["dep_time"],
+            "arr_port": arr_port,
+            "arr_time": legs[-1][0]["arr_time"],
+            "arr_day_offset": minutes // (24 * 60),
+            "airline": legs[0][2][2] if len(carriers) == 1 else "Multiple airlines",
+            "stops": stops,
+            "stop_city": self.cities[path[1]] if stops else None,
+            "flights": [dict(leg[0]) for leg in legs],
+        }
+        # Connections are discounted
+        price = sum(leg[3] for leg in legs) * (0.85 if stops else 1.0)
+
+        return journey_, price
+
+    def request(self, rng: random.Random, start: date) -> dict:
+        """sql.schemas.RequestCreate payload for a route weighted by traffic, departing on or after start."""
+        dep_port, arr_port = rng.choices(self.codes, cum_weights=self._cum_weights, k=2)
+        while arr_port == dep_port:
+            arr_port = rng.choices(self.codes, cum_weights=self._cum_weights)[0]
+
+        # Most searches are a few weeks to a few months ahead
+        dep_date = start + timedelta(days=min(330, int(rng.expovariate(1 / 45))))
+        stay = rng.choices(list(STAYS), weights=list(STAYS.values()))[0]
+
+        return {
+            "dep_port": dep_port,
+            "arr_port": arr_port,
+            "dep_date": dep_date,
+            "ret_date": None if stay is None else dep_date + timedelta(days=stay),
+            "flex_option": rng.choices(range(4), weights=FLEX_WEIGHTS)[0],
+            "sorted_by": rng.choice(["bestflight", "price", "duration"]),
+            "direct": rng.random() < 0.15,
+        }
+
+    def requests(self, n: int, start: Optional[date] = None, seed: int = 0):
+        """
+        n sql.schemas.RequestCreate payloads, departing from start (default tomorrow, so they validate as
+        RequestCreate) onwards.
+        """
+        rng = random.Random(f"{self.seed}-requests-{seed}")
+        start = start or date.today() + timedelta(days=1)
+        for _ in range(n):
+            yield self.request(rng, start)
+
+    def results(self, request: dict, n: int, seed: int = 0) -> list[dict]:
+        """
+        Up to n sql.schemas.TripBase payloads for a request (RequestCreate fields), as scraped: departures (and
+        returns) spread over the flexible dates, round trips pairing a set of outbound journeys with a set of return
+        journeys, quoted in one currency. Fewer if the route has fewer flights.
+        """
+        rng = random.Random(f"{self.seed}-results-{seed}")
+        currency = rng.choices(
+            list(CURRENCIES), weights=[w for w, _ in CURRENCIES.values()]
+        )[0]
+        rate = CURRENCIES[currency][1]
+        flex = request.get("flex_option") or 0
+        direct = bool(request.get("direct"))
+        dep_port, arr_port = request["dep_port"], request["arr_port"]
+        ret_date = request.get("ret_date")
+
+        def journeys(origin, destination, day, k):
+            out = {}
+            for _ in range(3 * k):
+                offset = rng.randint(-flex, flex)
+                found = self.journey(
+                    rng, origin, destination, day + timedelta(days=offset), direct
+                )
+                if found is not None:
+                    key = (
+                        found[0]["date"],
+                        *(f["number"] for f in found[0]["flights"]),
+                    )
+                    out.setdefault(key, found)
+                    if len(out) == k:
+                        break
+
+            return list(out.values())
+
+        if ret_date is None:
+            pairs = [
+                (j, None) for j in journeys(dep_port, arr_port, request["dep_date"], n)
+            ]
+        else:
+            k = max(1, ceil(sqrt(n)))
+            outbound = journeys(dep_port, arr_port, request["dep_date"], k)
+            inbound = journeys(arr_port, dep_port, ret_date, k)
+            pairs = [
+                (j1, j2)
+                for j1 in outbound
+                for j2 in inbound
+                if j2[0]["date"] >= j1[0]["date"]
+            ]
+            rng.shuffle(pairs)
+            pairs = pairs[:n]
+
+        weekday = request["dep_date"].weekday()
+        # Fridays and Sundays cost more
+        demand = 1.15 if weekday in (4, 6) else 1.0
+
+        results = []
+        for j1, j2 in pairs:
+            usd = (j1[1] + (j2[1] if j2 else 0)) * demand * rng.lognormvariate(0, 0.15)
+            results.append(
+                {
+                    "price": max(1, round(usd * rate)),
+                    "currency": currency,
+                    # Copies, as a journey can be in more than one result
+                    "journey_1": {
+                        **j1[0],
+                        "flights": [dict(f) for f in j1[0]["flights"]],
+                    },
+                    "journey_2": (
+                        None
+                        if j2 is None
+                        else {**j2[0], "flights": [dict(f) for f in j2[0]["flights"]]}
+                    ),
+                }
+            )
+
+        return results
@@ -0,0 +1,97 @@
+"""
+Nearest airport microbenchmark, run with: python -m packages.shared.benchmarks.geo
+
+The $geoNear comparison requires a running MongoDB (mongodb.database), pass --mongo to include it. It runs against
+a scratch database (see benchmarks.fakes.mongo_db), dropped afterwards.
+"""
+
+import random
+import sys
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.benchmarks.fakes import mongo_db
+from packages.shared.mongodb.geo import (
+    AirportTree,
+    ensure_geo_index,
+    haversine,
+    nearest_airports,
+)
+
+
+def random_airports(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "iata_code": f"A{i:04d}",
+            "name": f"Airport {i}",
+            "location": {
+                "type": "Point",
+                "coordinates": [rng.uniform(-180, 180), rng.uniform(-60, 70)],
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def brute_force(airports: list[dict], lon: float, lat: float, k: int) -> list[float]:
+    return sorted(
+        haversine(lon, lat, *port["location"]["coordinates"]) for port in airports
+    )[:k]
+
+
+def main(n: int = 10_000, k: int = 10, radius: float = 250_000, mongo: bool = False):
+    airports = random_airports(n)
+    rng = random.Random(1)
+    points = [(rng.uniform(-180, 180), rng.uniform(-60, 70)) for _ in range(100)]
+
+    def cycle():
+        point = points[cycle.i % len(points)]
+        cycle.i += 1
+        return point
+
+    cycle.i = 0
+
+    tree = AirportTree(airports)
+    results = {
+        f"AirportTree build (n={n})": timed(lambda: AirportTree(airports), number=1),
+        f"AirportTree.nearest (k={k})": timed(
+            lambda: tree.nearest(*cycle(), k=k), number=1000
+        ),
+        f"AirportTree.within ({radius / 1000:.0f}km)": timed(
+            lambda: tree.within(*cycle(), radius), number=1000
+        ),
+        f"brute force haversine (k={k})": timed(
+            lambda: brute_force(airports, *cycle(), k), number=10
+        ),
+    }
+
+    # Tree results must match a brute force scan
+    for lon, lat in points[:10]:
+        found = [port.dist.calculated for port in tree.nearest(lon, lat, k=k)]
+        expected = brute_force(airports, lon, lat, k)
+        assert all(abs(a - b) < 1e-6 for a, b in zip(found, expected)), (lon, lat)
+
+    if mongo:
+        db = mongo_db(local=True, name="geo")
+        db.airports.delete_many({})
+        db.airports.insert_many([dict(port) for port in airports])
+        ensure_geo_index(db)
+
+        try:
+            results[f"$geoNear (k={k})"] = timed(
+                lambda: nearest_airports(db, *cycle(), limit=k), number=1000
+            )
+            results["AirportTree.from_db"] = timed(
+                lambda: AirportTree.from_db(db), number=1
+            )
+        finally:
+            db.client.drop_database(db.name)
+
+    for name, result in results.items():
+        report(name, result)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(mongo="--mongo" in sys.argv)
@@ -0,0 +1,108 @@
+"""
+Import time budget, run with: python -m packages.shared.benchmarks.imports
+
+Imports each module in a fresh interpreter with -X importtime, and exits non-zero if one takes longer than its budget
+or imports a dependency it should not need, e.g. FastAPI for the core schemas or a database driver for utils.dates.
+Budgets are generous, to catch new heavy imports rather than noise.
+"""
+
+import subprocess
+import sys
+
+from packages.shared.benchmarks import report
+
+# Not needed without the API, a queue or a database connection
+HEAVY = ("fastapi", "starlette", "pika", "pymongo", "sqlalchemy", "psycopg2")
+
+# Module: (budget in ms, top level packages it must not import)
+BUDGETS = {
+    "packages.shared": (25, HEAVY + ("pydantic",)),
+    "packages.shared.utils.dates": (25, HEAVY + ("pydantic",)),
+    "packages.shared.utils.context": (25, HEAVY + ("pydantic",)),
+    "packages.shared.utils.log": (50, HEAVY + ("pydantic",)),
+    "packages.shared.sql.schemas": (250, HEAVY),
+    "packages.shared.mongodb.schemas": (250, HEAVY),
+    "packages.shared.combined_schemas": (300, HEAVY),
+    "packages.shared.itineraries": (300, HEAVY),
+}
+
+
+def import_times(statement: str) -> list[tuple[int, int, str]]:
+    """
+    Imports made running a statement in a fresh interpreter.
+
+    Returns
+    -------
+    (nesting depth, cumulative microseconds, module name) of each import, in the order -X importtime reports them
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((depth, int(cumulative), name.strip()))
+
+    return imports
+
+
+def measure(module: str, startup: set[str]) -> tuple[float, set[str]]:
+    """Milliseconds importing a module took (excluding interpreter startup) and the modules it imported."""
+    imports = [i for i in import_times(f"import {module}") if i[2] not in startup]
+    total = sum(cumulative for depth, cumulative, _ in imports if depth == 0)
+
+    return total / 1000, {name for _, _, name in imports}
+
+
+def over_budget(results: dict) -> list[str]:
+    """Modules over their time budget or importing forbidden packages, from main's results."""
+    violations = []
+    for name, result in results.items():
+        if result["best_us"] > result["budget_us"]:
+            violations.append(
+                f"{name} took {result['best_us'] / 1000:.0f} ms, budget {result['budget_us'] / 1000:.0f} ms"
+            )
+        for package in result["forbidden"]:
+            violations.append(f"{name} imports {package}")
+
+    return violations
+
+
+def main(repeat: int = 3) -> dict:
+    startup = {name for _, _, name in import_times("pass")}
+
+    results = {}
+    for module, (budget, forbidden) in BUDGETS.items():
+        # First import compiles bytecode, not counted
+        measure(module, startup)
+        runs = [measure(module, startup) for _ in range(repeat)]
+        times = [ms for ms, _ in runs]
+        imported = {name.split(".")[0] for name in runs[0][1]}
+
+        name = f"import {module}"
+        results[name] = {
+            "number": 1,
+            "repeat": repeat,
+            "best_us": min(times) * 1000,
+            "mean_us": sum(times) / len(times) * 1000,
+            "budget_us": budget * 1000,
+            "forbidden": sorted(imported.intersection(forbidden)),
+        }
+        report(name, results[name])
+
+    for violation in over_budget(results):
+        print(violation)
+
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(1 if over_budget(main()) else 0)
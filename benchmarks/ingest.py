@@ -0,0 +1,206 @@
+"""
+Database ingest benchmarks, run with: python -m packages.shared.benchmarks.ingest
+
+Times adding requests (post_request_to_db, post_requests_to_db), a Job's lifecycle (create, status updates, success)
+and adding results with get_or_add against dedup.add_trips. Needs a scratch PostgreSQL database, given by the
+BENCHMARK_DATABASE_URL environment variable, which must also be the database configured for the package
+(packages.config), as jobs write through the package's engine. Rows added are deleted afterwards.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete, func, make_url, select
+from sqlalchemy.orm import Session
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.benchmarks.generators import iata_codes, request_creates, trips
+from packages.shared.sql import schemas
+from packages.shared.sql.database import DATABASE_URI, Base, engine, get_or_add
+
+
+def check_database() -> Optional[str]:
+    """Why the benchmarks cannot run against the configured database, None if they can."""
+    url = os.environ.get("BENCHMARK_DATABASE_URL")
+    if not url:
+        return "Set BENCHMARK_DATABASE_URL to a scratch PostgreSQL database"
+
+    scratch, configured = make_url(url), make_url(DATABASE_URI)
+    if (scratch.host, scratch.port or 5432, scratch.database) != (
+        configured.host,
+        configured.port or 5432,
+        configured.database,
+    ):
+        return (
+            f"BENCHMARK_DATABASE_URL ({scratch.render_as_string()}) is not the database configured for the package "
+            f"({configured.render_as_string()}), configure the package to use the scratch database"
+        )
+
+    return None
+
+
+class Cleanup:
+    """
+    Deletes rows added since it was created: requests, journeys and flights with greater ids, and rows of any table
+    referring to those (results, cached requests, price history and journey flights). Rows already in the database
+    are kept, even if results added by the benchmarks reuse them.
+    """
+
+    def __init__(self):
+        from packages.shared.sql import models
+
+        self.tables = (models.Request, models.Journey, models.Flight)
+        with Session(engine) as session:
+            self.max_ids = {
+                model.__table__: session.scalar(
+                    select(func.coalesce(func.max(model.id), 0))
+                )
+                for model in self.tables
+            }
+
+    def delete(self):
+        with Session(engine) as session:
+            # Referring tables first
+            for table in reversed(Base.metadata.sorted_tables):
+                if table in self.max_ids:
+                    new = table.c.id > self.max_ids[table]
+                    session.execute(delete(table).where(new))
+                    continue
+
+                for key in table.foreign_keys:
+                    referred = key.column.table
+                    if referred in self.max_ids:
+                        session.execute(
+                            delete(table).where(key.parent > self.max_ids[referred])
+                        )
+            session.commit()
+
+
+def ingest_get_or_add(request_id: int, results: list[dict]):
+    from packages.shared.sql import models
+
+    # Row by row, as results were previously added
+    with Session(engine) as session:
+        for result in results:
+            journeys = []
+            for journey in (result["journey_1"], result["journey_2"]):
+                if journey is None:
+                    journeys.append(None)
+                    continue
+
+                fields = {k: v for k, v in journey.items() if k != "flights"}
+                journey_db = get_or_add(session, models.Journey, commit=False, **fields)
+                for flight in journey["flights"]:
+                    flight_db = get_or_add(
+                        session, models.Flight, commit=False, **flight
+                    )
+                    if flight_db not in journey_db.flights:
+                        journey_db.flights.append(flight_db)
+                session.flush()
+                journeys.append(journey_db)
+
+            session.add(
+                models.RequestJourney(
+                    request_id=request_id,
+                    price=result["price"],
+                    currency=result["currency"],
+                    journey_id_1=journeys[0].id,
+                    journey_id_2=journeys[1].id if journeys[1] else None,
+                )
+            )
+
+        session.commit()
+
+
+def ingest_add_trips(request_id: int, results: list[dict]):
+    from packages.shared.dedup import add_trips
+
+    with Session(engine) as session:
+        add_trips(session, request_id, results)
+
+
+def main(n_requests: int = 1000, n_results: int = 500):
+    problem = check_database()
+    if problem:
+        print(problem)
+        return {}
+
+    # Importing models creates the tables, only once the database is known to be a scratch one
+    from packages.shared.job import Job, post_request_to_db, post_requests_to_db
+
+    requests = [
+        schemas.RequestCreate(**payload)
+        for payload in request_creates(n_requests, iata_codes(100))
+    ]
+    batch_requests = requests[:100]
+    # Different results for every run, so each ingests new journeys rather than finding those of the previous run
+    request = requests[0]
+    batches = iter(
+        [
+            trips(
+                n_results,
+                request.dep_port,
+                request.arr_port,
+                request.dep_date,
+                request.ret_date,
+                seed=seed,
+            )
+            for seed in range(6)
+        ]
+    )
+
+    cleanup = Cleanup()
+    save_dir = Path(tempfile.mkdtemp())
+    requests_iter = itertools.cycle(requests)
+
+    def post_one():
+        post_request_to_db(next(requests_iter))
+
+    def post_batch():
+        post_requests_to_db(batch_requests)
+
+    def job_lifecycle():
+        request_db = post_request_to_db(request)
+
+        job = Job(request_db, save_path=save_dir / str(request_db.id))
+        job.update_status("running")
+        job.success()
+        job.remove_path()
+
+    def ingest(func):
+        def run():
+            func(post_request_to_db(request).id, next(batches))
+
+        return run
+
+    try:
+        out = {
+            "post_request_to_db": timed(
+                post_one, number=max(1, n_requests // 10), repeat=5
+            ),
+            f"post_requests_to_db (n={len(batch_requests)})": timed(
+                post_batch, number=1, repeat=5
+            ),
+            "Job lifecycle": timed(job_lifecycle, number=20, repeat=3),
+            f"results via get_or_add (n={n_results})": timed(
+                ingest(ingest_get_or_add), number=1, repeat=3
+            ),
+            f"results via add_trips (n={n_results})": timed(
+                ingest(ingest_add_trips), number=1, repeat=3
+            ),
+        }
+    finally:
+        cleanup.delete()
+
+    for name, result in out.items():
+        report(name, result)
+
+    return out
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
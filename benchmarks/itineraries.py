@@ -0,0 +1,72 @@
+"""
+Itinerary ranking benchmark, run with: python -m packages.shared.benchmarks.itineraries
+
+Compares filtering and ranking results as TripBase models with the same operations on an ItineraryBatch, including
+building each from result rows (dicts, as read from the database). Results converted from ORM-shaped rows are
+checked against those from dicts.
+"""
+
+import sys
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.benchmarks.schemas import as_rows, request_output_payload
+from packages.shared.itineraries import ItineraryBatch, minutes_from_time
+from packages.shared.sql import schemas
+
+
+def rank_models(rows: list[dict], k: int) -> list[schemas.TripOutput]:
+    trips = [schemas.TripBase(**row) for row in rows]
+    trips = [
+        trip
+        for trip in trips
+        if max(trip.journey_1.stops, trip.journey_2.stops if trip.journey_2 else 0) <= 1
+        and 360 <= minutes_from_time(trip.journey_1.dep_time) <= 720
+    ]
+    trips.sort(key=lambda trip: trip.price)
+    return [schemas.TripOutput.model_validate(trip) for trip in trips[:k]]
+
+
+def rank_batch(rows: list[dict], k: int) -> list[schemas.TripOutput]:
+    batch = ItineraryBatch(rows)
+    return batch.filter(max_stops=1, dep_window=("06:00", "12:00")).top(k).to_trips()
+
+
+def main(n_results: int = 5000, k: int = 20):
+    rows = request_output_payload(n_results)["results"]
+    for i, row in enumerate(rows):
+        row["journey_1"]["dep_time"] = f"{i % 24:02d}:{i % 60:02d}"
+        row["journey_1"]["stops"] = i % 3
+
+    results = {
+        f"TripBase filter/sort (n={n_results})": timed(
+            lambda: rank_models(rows, k), number=3, repeat=3
+        ),
+        f"ItineraryBatch filter/top (n={n_results})": timed(
+            lambda: rank_batch(rows, k), number=3, repeat=3
+        ),
+    }
+
+    batch = ItineraryBatch(rows)
+    results[f"ItineraryBatch filter/top, built (n={n_results})"] = timed(
+        lambda: batch.filter(max_stops=1, dep_window=("06:00", "12:00")).top(k),
+        number=10,
+        repeat=3,
+    )
+
+    # Attribute objects standing in for RequestJourney rows (ItineraryBatch(request_db.results))
+    orm_rows = as_rows(rows)
+    results[f"ItineraryBatch filter/top, ORM rows (n={n_results})"] = timed(
+        lambda: rank_batch(orm_rows, k), number=3, repeat=3
+    )
+    expected = rank_batch(rows, k)
+    assert rank_batch(orm_rows, k) == expected, "ORM rows ranked differently to dicts"
+    assert ItineraryBatch(orm_rows).dedup().to_trips(), "No trips from ORM rows"
+
+    for name, result in results.items():
+        report(name, result)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,430 @@
+"""
+Load test data, run with: python -m packages.shared.benchmarks.loadgen [options]
+
+Generates a synthetic airport network (benchmarks.generators.Network) with requests and their results, and streams
+it to JSON lines files (--output, gzipped if the names end in .gz), or loads it directly: airports and routes into
+MongoDB (--mongo) and requests with their results into PostgreSQL (--postgres). Both databases are those configured
+for the package (packages.config), which should be local scratch databases. For example, 10,000 requests of 200
+results each (two million results):
+
+    python -m packages.shared.benchmarks.loadgen --requests 10000 --results 200 --postgres --mongo
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+from sqlalchemy import Engine, func, select
+
+from packages.shared.benchmarks.generators import Network
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+REQUEST_COLUMNS = (
+    "id",
+    "status",
+    "dep_date",
+    "ret_date",
+    "dep_port",
+    "arr_port",
+    "flex_option",
+    "sorted_by",
+    "direct",
+    "timestamp",
+)
+JOURNEY_COLUMNS = (
+    "id",
+    "date",
+    "day",
+    "duration",
+    "dep_port",
+    "dep_time",
+    "arr_port",
+    "arr_time",
+    "arr_day_offset",
+    "stops",
+    "stop_city",
+    "airline",
+    "hash",
+)
+FLIGHT_COLUMNS = (
+    "id",
+    "number",
+    "duration",
+    "dep_port",
+    "dep_time",
+    "arr_port",
+    "arr_time",
+)
+RESULT_COLUMNS = (
+    "id",
+    "timestamp",
+    "request_id",
+    "journey_id_1",
+    "journey_id_2",
+    "price",
+    "currency",
+)
+
+
+def _open(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "wt")
+
+    return path.open("w")
+
+
+def write_jsonl(path: Path, records: Iterable[dict]) -> int:
+    """
+    Write records to a JSON lines file, gzipped if the file name ends in .gz.
+
+    Returns
+    -------
+    Number of records written
+    """
+    n = 0
+    with _open(path) as f:
+        for record in records:
+            f.write(json.dumps(record, default=str))
+            f.write("\n")
+            n += 1
+
+    return n
+
+
+def history(
+    network: Network, n_requests: int, days: int = 365, seed: int = 0
+) -> Iterable[tuple[int, datetime, dict]]:
+    """
+    n_requests requests made over the last days, oldest first, as (index, timestamp, RequestCreate fields). Each
+    departs after it was made, so most have departed and no longer validate as RequestCreate.
+    """
+    rng = random.Random(f"{network.seed}-history-{seed}")
+    end = datetime.now().replace(microsecond=0)
+    step = timedelta(days=days) / max(1, n_requests)
+    for i in range(n_requests):
+        timestamp = end - timedelta(days=days) + i * step
+        yield i, timestamp, network.request(rng, timestamp.date() + timedelta(days=1))
+
+
+def write_dataset(
+    network: Network,
+    directory: Path,
+    n_requests: int,
+    n_results: int,
+    days: int = 365,
+    seed: int = 0,
+    suffix: str = ".jsonl",
+) -> dict[str, int]:
+    """
+    Write a network's airports and routes, and the requests made over the last days with their results, to JSON lines
+    files in a directory: airports, routes, requests (with id and timestamp) and results (with request_id).
+
+    Parameters
+    ----------
+    network: Network to generate data from
+    directory: Output directory, created if missing
+    n_requests: Number of requests
+    n_results: Results per request (at most, routes with few flights have fewer)
+    days: Period over which requests were made
+    seed: Random seed for requests and results
+    suffix: File suffix, ".jsonl.gz" to gzip files
+
+    Returns
+    -------
+    Records written to each file
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    requests = list(history(network, n_requests, days, seed))
+
+    def request_records():
+        for i, timestamp, request in requests:
+            yield {"id": i + 1, "timestamp": timestamp, **request}
+
+    def result_records():
+        for i, _, request in requests:
+            for result in network.results(
+                request, n_results, seed=seed * n_requests + i
+            ):
+                yield {"request_id": i + 1, **result}
+
+    return {
+        name: write_jsonl(directory / f"{name}{suffix}", records)
+        for name, records in (
+            ("airports", network.airports),
+            ("routes", network.routes()),
+            ("requests", request_records()),
+            ("results", result_records()),
+        )
+    }
+
+
+def load_mongo(db: Database, network: Network, batch_size: int = 10_000) -> dict:
+    """
+    Load a network's airports (updating those with the same iata_code) and routes (see mongodb.route_loader) into a
+    database.
+
+    Returns
+    -------
+    Airports written and the route LoadResult
+    """
+    from packages.shared.mongodb.route_loader import load_routes
+
+    airports = 0
+    for start in range(0, len(network.airports), batch_size):
+        batch = network.airports[start : start + batch_size]
+        db.airports.bulk_write(
+            [
+                UpdateOne({"iata_code": port["iata_code"]}, {"$set": port}, upsert=True)
+                for port in batch
+            ],
+            ordered=False,
+        )
+        airports += len(batch)
+
+    return {
+        "airports": airports,
+        "routes": load_routes(db, network.routes(), batch_size),
+    }
+
+
+class CopyBuffer:
+    """CSV rows for a table, written to the database with COPY."""
+
+    def __init__(self, table: str, columns: tuple[str, ...]):
+        self.table = table
+        self.columns = columns
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.rows = 0
+
+    def add(self, row: Iterable):
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def copy(self, cursor) -> int:
+        n, self.rows = self.rows, 0
+        self.buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+            self.buffer,
+        )
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+        return n
+
+
+def load_postgres(
+    engine: Engine,
+    network: Network,
+    n_requests: int,
+    n_results: int,
+    days: int = 365,
+    seed: int = 0,
+    batch_size: int = BATCH_SIZE,
+) -> dict[str, int]:
+    """
+    Load requests made over the last days, with their results, into the database with COPY, batch_size requests at a
+    time. Requests are loaded as finished. Ids are assigned after the largest existing ids (sequences are advanced
+    afterwards, see sync_sequences), so this adds to an existing database, though not one being written to meanwhile.
+    Journeys repeated within a request's results (round trips pairing each outbound with each return journey) are
+    added once with their hash (see dedup), and identical flights are added once per load. Results have no price_usd,
+    run fx.fill_price_usd afterwards if needed.
+
+    Parameters
+    ----------
+    engine: PostgreSQL engine
+    network: Network to generate data from
+    n_requests: Number of requests
+    n_results: Results per request (at most, routes with few flights have fewer)
+    days: Period over which requests were made
+    seed: Random seed for requests and results
+    batch_size: Requests added per transaction
+
+    Returns
+    -------
+    Rows added to each table
+    """
+    from packages.shared.dedup import flight_key, journey_hash
+    from packages.shared.sql import models, partitions
+    from packages.shared.sql.database import Base, sync_sequences
+    from packages.shared.sql.leases import FINISHED_STATUS
+
+    requests = history(network, n_requests, days, seed)
+    partitions.ensure_partitions(
+        engine,
+        models.RequestJourney.__table__,
+        start=date.today() - timedelta(days=days),
+    )
+
+    with engine.connect() as conn:
+        next_ids = {
+            model: conn.scalar(select(func.coalesce(func.max(model.id), 0))) + 1
+            for model in (
+                models.Request,
+                models.Journey,
+                models.Flight,
+                models.RequestJourney,
+            )
+        }
+
+    buffers = {
+        "request": CopyBuffer("request", REQUEST_COLUMNS),
+        "journey": CopyBuffer("journey", JOURNEY_COLUMNS),
+        "flight": CopyBuffer("flight", FLIGHT_COLUMNS),
+        "journey_flight": CopyBuffer("journey_flight", ("journey_id", "flight_id")),
+        "request_journey": CopyBuffer("request_journey", RESULT_COLUMNS),
+    }
+    counts = dict.fromkeys(buffers, 0)
+    flight_ids: dict[tuple, int] = {}
+    start = time.perf_counter()
+
+    def add_journey(journey: dict, journey_ids: dict[str, int]) -> int:
+        key = journey_hash(journey)
+        if key in journey_ids:
+            return journey_ids[key]
+
+        journey_id = journey_ids[key] = next_ids[models.Journey]
+        next_ids[models.Journey] += 1
+        buffers["journey"].add(
+            [journey_id, *(journey[c] for c in JOURNEY_COLUMNS[1:-1]), key]
+        )
+
+        for flight in journey["flights"]:
+            fkey = flight_key(flight)
+            if fkey not in flight_ids:
+                flight_ids[fkey] = next_ids[models.Flight]
+                next_ids[models.Flight] += 1
+                buffers["flight"].add(
+                    [flight_ids[fkey], *(flight[c] for c in FLIGHT_COLUMNS[1:])]
+                )
+
+            buffers["journey_flight"].add([journey_id, flight_ids[fkey]])
+
+        return journey_id
+
+    def flush():
+        # Referenced tables first
+        with engine.begin() as conn:
+            cursor = conn.connection.cursor()
+            for name, buffer in buffers.items():
+                counts[name] += buffer.copy(cursor)
+
+        elapsed = time.perf_counter() - start
+        LOGGER.info(
+            "Loaded %s requests, %s results (%.0f/s)",
+            counts["request"],
+            counts["request_journey"],
+            counts["request_journey"] / elapsed,
+        )
+
+    for i, timestamp, request in requests:
+        request_id = next_ids[models.Request]
+        next_ids[models.Request] += 1
+        buffers["request"].add(
+            [
+                request_id,
+                FINISHED_STATUS,
+                *(request[c] for c in REQUEST_COLUMNS[2:-1]),
+                timestamp,
+            ]
+        )
+
+        journey_ids: dict[str, int] = {}
+        for result in network.results(request, n_results, seed=seed * n_requests + i):
+            journey_id_1 = add_journey(result["journey_1"], journey_ids)
+            journey_id_2 = (
+                None
+                if result["journey_2"] is None
+                else add_journey(result["journey_2"], journey_ids)
+            )
+            buffers["request_journey"].add(
+                [
+                    next_ids[models.RequestJourney],
+                    timestamp,
+                    request_id,
+                    journey_id_1,
+                    journey_id_2,
+                    result["price"],
+                    result["currency"],
+                ]
+            )
+            next_ids[models.RequestJourney] += 1
+
+        if (i + 1) % batch_size == 0:
+            flush()
+
+    flush()
+    sync_sequences(engine, Base.metadata)
+
+    return counts
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="python -m packages.shared.benchmarks.loadgen"
+    )
+    parser.add_argument("--requests", type=int, default=1000, help="Number of requests")
+    parser.add_argument("--results", type=int, default=100, help="Results per request")
+    parser.add_argument("--airports", type=int, default=500, help="Number of airports")
+    parser.add_argument("--hubs", type=int, default=25, help="Number of hub airports")
+    parser.add_argument(
+        "--days", type=int, default=365, help="Days requests are spread over"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--output", type=Path, help="Directory to write JSON lines files to"
+    )
+    parser.add_argument("--gzip", action="store_true", help="Gzip output files")
+    parser.add_argument("--postgres", action="store_true", help="Load into PostgreSQL")
+    parser.add_argument("--mongo", action="store_true", help="Load into MongoDB")
+    args = parser.parse_args(argv)
+
+    if not (args.output or args.postgres or args.mongo):
+        parser.error("Pass at least one of --output, --postgres or --mongo")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    network = Network(args.airports, args.hubs, seed=args.seed)
+
+    if args.output is not None:
+        suffix = ".jsonl.gz" if args.gzip else ".jsonl"
+        counts = write_dataset(
+            network,
+            args.output,
+            args.requests,
+            args.results,
+            args.days,
+            args.seed,
+            suffix,
+        )
+        LOGGER.info("Wrote %s to %s", counts, args.output)
+
+    if args.mongo:
+        from packages.shared.mongodb.database import get_db
+
+        LOGGER.info("Loaded %s into MongoDB", load_mongo(get_db(), network))
+
+    if args.postgres:
+        from packages.shared.sql.database import engine
+
+        counts = load_postgres(
+            engine, network, args.requests, args.results, args.days, args.seed
+        )
+        LOGGER.info("Loaded %s into PostgreSQL", counts)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
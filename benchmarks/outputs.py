@@ -0,0 +1,90 @@
+"""
+Request output benchmark, run with: python -m packages.shared.benchmarks.outputs
+
+Times resolving airports in FlightOutput (through combined_schemas.airport_cache, cold and warm) and validating and
+serialising a combined RequestOutput. Airports are read from an in-memory mongomock database, pass --mongo to use a
+scratch database on the configured MongoDB server instead.
+"""
+
+import sys
+
+from packages.shared import combined_schemas
+from packages.shared.benchmarks import report, timed
+from packages.shared.benchmarks.fakes import mongo_db
+from packages.shared.benchmarks.generators import airports, request_output_rows
+from packages.shared.mongodb.cache import DocumentCache
+
+
+def main(n_results: int = 500, mongo: bool = False):
+    db = mongo_db(local=mongo)
+    if db is None:
+        print("Install mongomock, or pass --mongo to use a running MongoDB")
+        return {}
+
+    payload = request_output_rows(n_results)
+    ports = {
+        flight[port]
+        for result in payload["results"]
+        for i in (1, 2)
+        for flight in result[f"journey_{i}"]["flights"]
+        for port in ("dep_port", "arr_port")
+    }
+    documents = [
+        {**airport, "iata_code": code}
+        for airport, code in zip(airports(len(ports)), sorted(ports))
+    ]
+    db.airports.delete_many({})
+    db.airports.insert_many(documents)
+
+    flights = [
+        flight
+        for result in payload["results"]
+        for flight in result["journey_1"]["flights"]
+    ]
+
+    cache = DocumentCache(db, "airports", "iata_code")
+    # Not combined_schemas.airport_cache, which would create the real cache (connecting to MongoDB) if not yet created
+    previous = combined_schemas.__dict__.get("airport_cache")
+    combined_schemas.airport_cache = cache
+
+    def cold():
+        cache.clear()
+        for flight in flights:
+            combined_schemas.FlightOutput.model_validate(flight)
+
+    def warm():
+        for flight in flights:
+            combined_schemas.FlightOutput.model_validate(flight)
+
+    def request_output():
+        output = combined_schemas.RequestOutput.model_validate(payload)
+        return output.model_dump_json()
+
+    try:
+        results = {
+            f"FlightOutput, cold cache (n={len(flights)})": timed(
+                cold, number=3, repeat=3
+            ),
+            f"FlightOutput, warm cache (n={len(flights)})": timed(
+                warm, number=3, repeat=3
+            ),
+            f"RequestOutput validate/dump (n={n_results})": timed(
+                request_output, number=3, repeat=3
+            ),
+        }
+    finally:
+        if previous is None:
+            del combined_schemas.airport_cache
+        else:
+            combined_schemas.airport_cache = previous
+        if mongo:
+            db.client.drop_database(db.name)
+
+    for name, result in results.items():
+        report(name, result)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(mongo="--mongo" in sys.argv)
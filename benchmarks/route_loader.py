@@ -0,0 +1,88 @@
+"""
+Route bulk load microbenchmark, run with: python -m packages.shared.benchmarks.route_loader
+
+Compares per record Route validation with batch validation (mongodb.route_loader.prepare_routes). Pass --mongo to
+also time a full load into a running MongoDB (mongodb.database), writing to a scratch database.
+"""
+
+import random
+import sys
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.mongodb.route_loader import load_routes, prepare_routes
+from packages.shared.mongodb.schemas import DAY_MAPPING, Route
+
+SCHEDULES = [
+    list(DAY_MAPPING),
+    ["mon", "wed", "fri"],
+    ["sat", "sun"],
+    ["tue", "thu"],
+    ["mon", "tue", "wed", "thu", "fri"],
+]
+
+
+def route_records(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    airports = [f"A{i:02d}" for i in range(100)]
+    records = []
+    for i in range(n):
+        dep, arr = rng.sample(airports, 2)
+        hour, minute = rng.randrange(24), rng.randrange(0, 60, 5)
+        duration = rng.randrange(45, 720, 5)
+        records.append(
+            {
+                "airline_iata": "XX",
+                "flight_number": str(i),
+                "flight_iata": f"XX{i}",
+                "dep_iata": dep,
+                "dep_time": f"{hour:02d}:{minute:02d}",
+                "arr_iata": arr,
+                "arr_time": f"{(hour + duration // 60) % 24:02d}:{minute:02d}",
+                "duration": duration,
+                "days": rng.choice(SCHEDULES),
+            }
+        )
+
+    return records
+
+
+def main(n: int = 100_000, mongo: bool = False):
+    records = route_records(n)
+
+    results = {
+        f"Route per record (n={n})": timed(
+            lambda: [Route(**record) for record in records], number=1, repeat=3
+        ),
+        f"prepare_routes (n={n})": timed(
+            lambda: prepare_routes(records), number=1, repeat=3
+        ),
+    }
+    for result in results.values():
+        result["routes_per_s"] = n / result["best_us"] * 1e6
+
+    if mongo:
+        from packages.shared.mongodb.database import get_db
+
+        db = get_db()
+        scratch = db.client[f"{db.name}_benchmark"]
+        db.client.drop_database(scratch.name)
+
+        load = load_routes(scratch, records)
+        results[f"load_routes (n={n})"] = {
+            "number": 1,
+            "repeat": 1,
+            "best_us": load.seconds * 1e6,
+            "mean_us": load.seconds * 1e6,
+            "routes_per_s": load.rate,
+        }
+        db.client.drop_database(scratch.name)
+
+    for name, result in results.items():
+        report(name, result)
+        print(f"{'':<40} {result['routes_per_s']:,.0f} routes/s")
+
+    return results
+
+
+if __name__ == "__main__":
+    main(mongo="--mongo" in sys.argv)
@@ -0,0 +1,121 @@
+"""
+RequestOutput construction benchmark, run with: python -m packages.shared.benchmarks.schemas
+"""
+
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.sql import schemas
+from packages.shared.utils.construct import construct_trusted
+
+
+def flight_payload(idx: int) -> dict:
+    return {
+        "id": idx,
+        "number": f"TK{1000 + idx % 900}",
+        "duration": 95 + idx % 120,
+        "dep_time": "10:05",
+        "dep_port": "LHR",
+        "arr_time": "14:40",
+        "arr_port": "IST",
+    }
+
+
+def journey_payload(idx: int, n_flights: int = 2) -> dict:
+    return {
+        "id": idx,
+        "date": date(2030, 1, 1) + timedelta(days=idx % 30),
+        "day": idx % 7,
+        "duration": 275,
+        "dep_port": "LHR",
+        "dep_time": "10:05",
+        "arr_port": "IST",
+        "arr_time": "17:40",
+        "arr_day_offset": 0,
+        "airline": "Turkish Airlines",
+        "stops": n_flights - 1,
+        "stop_city": "Frankfurt" if n_flights > 1 else None,
+        "flights": [flight_payload(idx * n_flights + i) for i in range(n_flights)],
+    }
+
+
+def request_output_payload(n_results: int = 500, return_trip: bool = True) -> dict:
+    """
+    RequestOutput shaped dict holding native (database) types, as read from ORM rows.
+    """
+    results = []
+    for i in range(n_results):
+        result = {
+            "id": i,
+            "request_id": 1,
+            "journey_id_1": 2 * i,
+            "journey_id_2": 2 * i + 1 if return_trip else None,
+            "price": 100 + i % 400,
+            "currency": "USD",
+            "journey_1": journey_payload(2 * i),
+            "journey_2": journey_payload(2 * i + 1) if return_trip else None,
+        }
+        results.append(result)
+
+    return {
+        "id": 1,
+        "status": "finished",
+        "timestamp": datetime(2029, 12, 1, 12),
+        "dep_port": "LHR",
+        "arr_port": "IST",
+        "dep_date": date(2030, 1, 1),
+        "ret_date": date(2030, 1, 8) if return_trip else None,
+        "flex_option": 0,
+        "sorted_by": "price",
+        "direct": False,
+        "results": results,
+    }
+
+
+def as_rows(value):
+    """Nested attribute objects standing in for ORM rows."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: as_rows(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [as_rows(v) for v in value]
+
+    return value
+
+
+def count_objects(payload: dict) -> int:
+    count = 1
+    for result in payload["results"]:
+        count += 1
+        for journey in (result["journey_1"], result["journey_2"]):
+            if journey is not None:
+                count += 1 + len(journey["flights"])
+
+    return count
+
+
+def main(n_results: int = 500):
+    payload = request_output_payload(n_results)
+    rows = as_rows(payload)
+    n_objects = count_objects(payload)
+
+    results = {}
+    for source, obj in (("dicts", payload), ("rows", rows)):
+        for name, validate in (("validated", True), ("trusted", False)):
+            results[f"{name}, {source}"] = timed(
+                lambda obj=obj, validate=validate: construct_trusted(
+                    schemas.RequestOutput, obj, validate=validate
+                ),
+                number=5,
+            )
+
+    for name, result in results.items():
+        result["per_object_us"] = result["best_us"] / n_objects
+        report(f"RequestOutput {name} ({n_objects} objects)", result)
+        print(f"{'':<40} {result['per_object_us']:>10.3f} us/object")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+RequestOutput validation/serialization benchmark, run with: python -m packages.shared.benchmarks.serialization
+"""
+
+from pydantic import VERSION as PYDANTIC_VERSION
+
+from packages.shared.benchmarks import report, timed
+from packages.shared.benchmarks.schemas import (
+    as_rows,
+    count_objects,
+    request_output_payload,
+)
+from packages.shared.sql import schemas
+
+
+def main(n_results: int = 500):
+    payload = request_output_payload(n_results)
+    rows = as_rows(payload)
+    n_objects = count_objects(payload)
+
+    model = schemas.RequestOutput.model_validate(rows, from_attributes=True)
+
+    results = {
+        "validate (from attributes)": timed(
+            lambda: schemas.RequestOutput.model_validate(rows, from_attributes=True),
+            number=5,
+        ),
+        "dump json": timed(lambda: model.model_dump_json(), number=5),
+        "validate + dump json": timed(
+            lambda: schemas.RequestOutput.model_validate(
+                rows, from_attributes=True
+            ).model_dump_json(),
+            number=5,
+        ),
+    }
+
+    print(f"pydantic {PYDANTIC_VERSION}, {n_objects} objects per RequestOutput")
+    for name, result in results.items():
+        report(name, result)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
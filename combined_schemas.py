@@ -1,12 +1,54 @@
-from typing import Optional
+import threading
+from typing import TYPE_CHECKING, Optional
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ConfigDict, field_validator
 
 import packages.shared.mongodb.schemas as mdb_schemas
 import packages.shared.sql.schemas as sql_schemas
-from packages.shared.mongodb.database import get_db
 
-db = get_db()
+if TYPE_CHECKING:
+    from pymongo.database import Database
+
+    from packages.shared.mongodb.cache import DocumentCache
+
+    db: Database
+    # Reference data, kept up to date by a ChangeWatcher on airports (see mongodb.cache) started with the cache
+    airport_cache: DocumentCache
+
+# Without change streams (no replica set) the watcher polls for updated values, which airports lack, so entries are
+# only refreshed on expiry
+AIRPORT_CACHE_TTL = 15 * 60
+
+_lock = threading.RLock()
+
+
+def __getattr__(name: str):
+    # db and airport_cache are created on first use, so importing the schemas does not connect to MongoDB. Either can
+    # be assigned instead, e.g. a cache on another database (which is then not watched).
+    if name not in ("db", "airport_cache"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    with _lock:
+        if name not in globals():
+            if name == "db":
+                from packages.shared.mongodb.database import get_db
+
+                globals()[name] = get_db()
+            else:
+                from packages.shared.mongodb.cache import ChangeWatcher, DocumentCache
+
+                cache = DocumentCache(
+                    _get("db"), "airports", "iata_code", ttl=AIRPORT_CACHE_TTL
+                )
+                ChangeWatcher(cache.db, "airports", [cache]).start()
+                globals()[name] = cache
+
+    return globals()[name]
+
+
+def _get(name: str):
+    """Module attribute, created by __getattr__ if not yet set (globals are not looked up through __getattr__)."""
+    return globals()[name] if name in globals() else __getattr__(name)
 
 
 class FlightOutput(BaseModel):
@@ -18,28 +60,26 @@ class FlightOutput(BaseModel):
     arr_time: str
     arr_port: mdb_schemas.AirportOutput
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
-    @validator("dep_port", "arr_port", pre=True)
+    @field_validator("dep_port", "arr_port", mode="before")
+    @classmethod
     def get_port(cls, value: str):
-        port = db.airports.find_one({"iata_code": value.upper()})
+        port = _get("airport_cache").get(value.upper())
         return mdb_schemas.AirportOutput(**port)
 
 
 class JourneyOutput(sql_schemas.Journey):
     flights: Optional[list[FlightOutput]] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RequestJourneyOutput(sql_schemas.RequestJourney):
     journey_1: JourneyOutput
     journey_2: Optional[JourneyOutput] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RequestOutput(sql_schemas.Request):
@@ -47,5 +87,45 @@ class RequestOutput(sql_schemas.Request):
         list[RequestJourneyOutput] | dict[str, list[RequestJourneyOutput]]
     ] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NormalisedRequestOutput(sql_schemas.Request):
+    """
+    RequestOutput with journeys listed once and results referring to them by journey_id_1/journey_id_2, rather than
+    repeating journeys in every result they appear in (e.g. each pairing of a round trip).
+    """
+
+    results: list[sql_schemas.RequestJourney] = []
+    journeys: list[JourneyOutput] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_output(cls, output: RequestOutput) -> "NormalisedRequestOutput":
+        results = output.results or []
+        if isinstance(results, dict):
+            results = [result for group in results.values() for result in group]
+
+        journeys: dict[int, JourneyOutput] = {}
+        for result in results:
+            for journey in (result.journey_1, result.journey_2):
+                if journey is not None:
+                    journeys.setdefault(journey.id, journey)
+
+        fields = {
+            name: getattr(output, name) for name in sql_schemas.Request.model_fields
+        }
+        return cls.model_construct(
+            **fields,
+            results=[
+                sql_schemas.RequestJourney.model_construct(
+                    **{
+                        name: getattr(result, name)
+                        for name in sql_schemas.RequestJourney.model_fields
+                    }
+                )
+                for result in results
+            ],
+            journeys=list(journeys.values()),
+        )
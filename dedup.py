@@ -0,0 +1,187 @@
+from hashlib import blake2b
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from packages.shared.sql import models
+from packages.shared.utils.construct import field_getter
+
+# Every column of a journey but its id and hash, as journeys (e.g. without flights) differing in any are distinct
+JOURNEY_FIELDS = tuple(
+    column.name
+    for column in models.Journey.__table__.columns
+    if column.name not in ("id", "hash")
+)
+FLIGHT_FIELDS = ("number", "dep_port", "dep_time", "arr_port", "arr_time", "duration")
+
+
+def flight_key(flight) -> tuple:
+    get = field_getter(flight)
+    return tuple(get(field) for field in FLIGHT_FIELDS)
+
+
+def journey_hash(journey) -> str:
+    """
+    Hash identifying a journey by all of its fields (see JOURNEY_FIELDS) and flights, the same for every result (and
+    request) it appears in, e.g. an outbound journey paired with each return journey of a round trip.
+
+    Parameters
+    ----------
+    journey: JourneyBase, Journey ORM instance or dict of the same fields
+
+    Returns
+    -------
+    32 character hex digest
+    """
+    get = field_getter(journey)
+    parts = [str(get(field)) for field in JOURNEY_FIELDS]
+    for flight in get("flights") or ():
+        parts.extend(str(value) for value in flight_key(flight))
+
+    return blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class NormalisedTrips:
+    """
+    Trips (e.g. scrape output) with each distinct journey held once, and results referring to journeys by hash.
+
+    Parameters
+    ----------
+    trips: TripBase instances or dicts of the same fields
+    """
+
+    def __init__(self, trips: Iterable):
+        # Journeys by hash, in order of first appearance
+        self.journeys: dict[str, Any] = {}
+        # (price, currency, journey_1 hash, journey_2 hash), identical results kept once
+        self.results: list[tuple[int, str, str, Optional[str]]] = []
+        self.n_trips = 0
+
+        seen = set()
+        for trip in trips:
+            self.n_trips += 1
+            get = field_getter(trip)
+
+            hashes = []
+            for journey in (get("journey_1"), get("journey_2")):
+                if journey is None:
+                    hashes.append(None)
+                    continue
+
+                key = journey_hash(journey)
+                self.journeys.setdefault(key, journey)
+                hashes.append(key)
+
+            result = (get("price"), get("currency") or "USD", *hashes)
+            if result not in seen:
+                seen.add(result)
+                self.results.append(result)
+
+    @property
+    def n_journeys(self) -> int:
+        """Journeys held, against up to two per trip before deduplication."""
+        return len(self.journeys)
+
+
+def _existing_journeys(session: Session, hashes: Iterable[str]) -> dict[str, int]:
+    stmt = (
+        select(models.Journey.hash, models.Journey.id)
+        .where(models.Journey.hash.in_(list(hashes)))
+        .order_by(models.Journey.id)
+    )
+    ids: dict[str, int] = {}
+    for key, journey_id in session.execute(stmt):
+        ids.setdefault(key, journey_id)
+
+    return ids
+
+
+def _existing_flights(
+    session: Session, flights: Iterable
+) -> dict[tuple, models.Flight]:
+    numbers = {field_getter(flight)("number") for flight in flights}
+    stmt = (
+        select(models.Flight)
+        .where(models.Flight.number.in_(numbers))
+        .order_by(models.Flight.id)
+    )
+    existing: dict[tuple, models.Flight] = {}
+    for flight in session.execute(stmt).scalars():
+        existing.setdefault(flight_key(flight), flight)
+
+    return existing
+
+
+def add_trips(
+    session: Session, request_id: int, trips: Iterable, commit: bool = True
+) -> list[models.RequestJourney]:
+    """
+    Add a request's results, inserting each distinct journey (and flight) once: journeys already stored (by hash, from
+    this or earlier requests) are referenced rather than inserted again, as are identical flights.
+
+    Parameters
+    ----------
+    session: Database session
+    request_id: Request the results belong to
+    trips: Results as TripBase instances or dicts of the same fields
+    commit: Whether to commit changes
+
+    Returns
+    -------
+    Results added
+    """
+    normalised = trips if isinstance(trips, NormalisedTrips) else NormalisedTrips(trips)
+
+    journey_ids = _existing_journeys(session, normalised.journeys)
+    new_journeys = {
+        key: journey
+        for key, journey in normalised.journeys.items()
+        if key not in journey_ids
+    }
+
+    flights = [
+        flight
+        for journey in new_journeys.values()
+        for flight in field_getter(journey)("flights") or ()
+    ]
+    flights_db = _existing_flights(session, flights) if flights else {}
+
+    journeys_db: dict[str, models.Journey] = {}
+    for key, journey in new_journeys.items():
+        get = field_getter(journey)
+        journey_flights = []
+        for flight in get("flights") or ():
+            fkey = flight_key(flight)
+            if fkey not in flights_db:
+                flights_db[fkey] = models.Flight(**dict(zip(FLIGHT_FIELDS, fkey)))
+            journey_flights.append(flights_db[fkey])
+
+        journeys_db[key] = models.Journey(
+            **{field: get(field) for field in JOURNEY_FIELDS},
+            hash=key,
+            flights=journey_flights,
+        )
+
+    session.add_all(journeys_db.values())
+    session.flush()
+    journey_ids.update((key, journey.id) for key, journey in journeys_db.items())
+
+    results = [
+        models.RequestJourney(
+            request_id=request_id,
+            price=price,
+            currency=currency,
+            journey_id_1=journey_ids[key_1],
+            journey_id_2=None if key_2 is None else journey_ids[key_2],
+        )
+        for price, currency, key_1, key_2 in normalised.results
+    ]
+    session.add_all(results)
+
+    if commit:
+        session.commit()
+    else:
+        session.flush()
+
+    return results
@@ -0,0 +1,307 @@
+import heapq
+from array import array
+from functools import lru_cache
+from itertools import compress
+from typing import Callable, Iterable, Optional
+
+from packages.shared.sql import schemas
+from packages.shared.utils.construct import construct_trusted, field_getter
+
+# Sort keys by SORT_OPTIONS value, as column names with tie breakers. "bestflight" is the order results were scraped
+# in (the site's own ranking)
+SORT_KEYS = {
+    "bestflight": ("order",),
+    "price": ("price", "duration", "order"),
+    "duration": ("duration", "price", "order"),
+}
+
+# Fields identifying a journey without flight details (see ItineraryBatch.dedup)
+JOURNEY_KEY_FIELDS = (
+    "date",
+    "airline",
+    "dep_port",
+    "dep_time",
+    "arr_port",
+    "arr_time",
+    "stops",
+)
+
+# Minutes from midnight of missing times (e.g. return times of one way trips)
+NO_TIME = -1
+
+
+@lru_cache(maxsize=4096)
+def minutes_from_time(value: Optional[str]) -> int:
+    """Minutes from midnight of a "HH:MM" time (optionally followed by AM/PM), NO_TIME if missing or unparsable."""
+    if not value:
+        return NO_TIME
+
+    value = value.strip().upper()
+    hours, _, rest = value.partition(":")
+    try:
+        minutes = int(hours) % 12 * 60 if rest[-2:] in ("AM", "PM") else int(hours) * 60
+        minutes += int(rest[:2])
+    except ValueError:
+        return NO_TIME
+
+    if rest.endswith("PM"):
+        minutes += 12 * 60
+
+    return minutes
+
+
+def _window(window) -> tuple[int, int]:
+    start, end = (
+        minutes_from_time(t) if isinstance(t, str) else int(t) for t in window
+    )
+    return start, end
+
+
+def _flight_numbers(journey) -> tuple:
+    flights = field_getter(journey)("flights") or ()
+    return tuple(field_getter(flight)("number") for flight in flights)
+
+
+class ItineraryBatch:
+    """
+    Columnar store of trips (price, journey_1 and optional journey_2) for ranking and filtering without building
+    models: each attribute used to filter or sort is held in a flat array, and filter/sort/top/dedup return batches
+    sharing those arrays, differing only in the rows selected. Trips are only converted to TripOutput by to_trips,
+    for the rows returned:
+
+        batch = ItineraryBatch(request_db.results)
+        batch.filter(max_stops=1, dep_window=("06:00", "12:00")).dedup().top(10, "price").to_trips()
+
+    Parameters
+    ----------
+    trips: Trips to hold, any mix of TripBase (e.g. scrape output), RequestJourney ORM rows or dicts of the same fields,
+        in the order scraped
+    """
+
+    __slots__ = (
+        "_trips",
+        "airlines",
+        "price",
+        "duration",
+        "stops",
+        "dep_1",
+        "arr_1",
+        "dep_2",
+        "arr_2",
+        "airline_1",
+        "airline_2",
+        "key",
+        "order",
+        "rows",
+    )
+
+    def __init__(self, trips: Iterable = ()):
+        self._trips = list(trips)
+        # Airline names by code, codes are indices into this list (-1 for no journey)
+        self.airlines: list[str] = []
+        airline_codes: dict[str, int] = {}
+
+        columns = {
+            name: array("l")
+            for name in (
+                "price",
+                "duration",
+                "stops",
+                "dep_1",
+                "arr_1",
+                "dep_2",
+                "arr_2",
+                "airline_1",
+                "airline_2",
+            )
+        }
+        # Itinerary identity of each row (see dedup), the tuples themselves so that no two itineraries share one
+        keys: list[tuple] = []
+
+        for trip in self._trips:
+            get = field_getter(trip)
+            journeys = get("journey_1"), get("journey_2")
+
+            columns["price"].append(get("price"))
+            duration = stops = 0
+            for i, journey in enumerate(journeys, start=1):
+                if journey is None:
+                    for name in ("dep", "arr"):
+                        columns[f"{name}_{i}"].append(NO_TIME)
+                    columns[f"airline_{i}"].append(-1)
+                    continue
+
+                get_journey = field_getter(journey)
+                duration += get_journey("duration")
+                stops = max(stops, get_journey("stops"))
+                columns[f"dep_{i}"].append(minutes_from_time(get_journey("dep_time")))
+                columns[f"arr_{i}"].append(minutes_from_time(get_journey("arr_time")))
+
+                airline = get_journey("airline")
+                code = airline_codes.get(airline)
+                if code is None:
+                    code = airline_codes[airline] = len(self.airlines)
+                    self.airlines.append(airline)
+                columns[f"airline_{i}"].append(code)
+
+            columns["duration"].append(duration)
+            columns["stops"].append(stops)
+            keys.append(tuple(self._journey_key(j) for j in journeys))
+
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+        self.key = keys
+        self.order = array("l", range(len(self._trips)))
+        self.rows = array("l", self.order)
+
+    @staticmethod
+    def _journey_key(journey) -> Optional[tuple]:
+        # Same flights on the same date, or (without flight details) same schedule (see JOURNEY_KEY_FIELDS)
+        if journey is None:
+            return None
+
+        get = field_getter(journey)
+        flights = _flight_numbers(journey)
+        if flights:
+            return get("date"), flights
+
+        return tuple(get(field) for field in JOURNEY_KEY_FIELDS)
+
+    def _select(self, rows: Iterable[int]) -> "ItineraryBatch":
+        batch = object.__new__(ItineraryBatch)
+        for name in self.__slots__:
+            setattr(batch, name, getattr(self, name))
+
+        batch.rows = array("l", rows)
+        return batch
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name: str) -> array:
+        """Values of a column (e.g. "price") for the rows held, in order."""
+        values = getattr(self, name)
+        return array(values.typecode, (values[i] for i in self.rows))
+
+    def filter(
+        self,
+        direct: Optional[bool] = None,
+        max_stops: Optional[int] = None,
+        max_price: Optional[int] = None,
+        max_duration: Optional[int] = None,
+        airlines: Optional[Iterable[str]] = None,
+        exclude_airlines: Optional[Iterable[str]] = None,
+        dep_window: Optional[tuple] = None,
+        arr_window: Optional[tuple] = None,
+        ret_dep_window: Optional[tuple] = None,
+        ret_arr_window: Optional[tuple] = None,
+    ) -> "ItineraryBatch":
+        """
+        Rows matching all the given conditions. Time windows are inclusive (start, end) pairs of "HH:MM" times or
+        minutes from midnight, on the outbound (dep/arr_window) or return (ret_dep/ret_arr_window) journey.
+
+        Parameters
+        ----------
+        direct: Only trips without stops (True) or with stops (False)
+        max_stops: Maximum stops on either journey
+        max_price: Maximum price
+        max_duration: Maximum total duration of both journeys in minutes
+        airlines: Only trips where every journey is with one of these airlines
+        exclude_airlines: Only trips where no journey is with one of these airlines
+        dep_window: Outbound departure time window
+        arr_window: Outbound arrival time window
+        ret_dep_window: Return departure time window, one way trips are excluded
+        ret_arr_window: Return arrival time window, one way trips are excluded
+
+        Returns
+        -------
+        Batch of matching rows, in the same order
+        """
+        rows = self.rows
+        conditions: list[tuple[array, Callable[[int], bool]]] = []
+
+        if direct is not None:
+            conditions.append((self.stops, (lambda v: v == 0) if direct else bool))
+        if max_stops is not None:
+            conditions.append((self.stops, lambda v: v <= max_stops))
+        if max_price is not None:
+            conditions.append((self.price, lambda v: v <= max_price))
+        if max_duration is not None:
+            conditions.append((self.duration, lambda v: v <= max_duration))
+
+        if airlines is not None or exclude_airlines is not None:
+            included = None if airlines is None else set(airlines)
+            allowed = {
+                i
+                for i, airline in enumerate(self.airlines)
+                if included is None or airline in included
+            }
+            if exclude_airlines is not None:
+                excluded = set(exclude_airlines)
+                allowed = {i for i in allowed if self.airlines[i] not in excluded}
+            allowed.add(-1)
+
+            conditions.append((self.airline_1, allowed.__contains__))
+            conditions.append((self.airline_2, allowed.__contains__))
+
+        for column, window in (
+            (self.dep_1, dep_window),
+            (self.arr_1, arr_window),
+            (self.dep_2, ret_dep_window),
+            (self.arr_2, ret_arr_window),
+        ):
+            if window is not None:
+                start, end = _window(window)
+                conditions.append((column, lambda v, s=start, e=end: s <= v <= e))
+
+        for column, condition in conditions:
+            rows = list(compress(rows, [condition(column[i]) for i in rows]))
+
+        return self._select(rows)
+
+    def _sort_key(self, by) -> Callable[[int], tuple]:
+        by = schemas.validate_mapping(schemas.SORT_OPTIONS, by)
+        columns = [getattr(self, name) for name in SORT_KEYS[by]]
+        if len(columns) == 1:
+            column = columns[0]
+            return column.__getitem__
+
+        return lambda i: tuple(column[i] for column in columns)
+
+    def sort(
+        self, by=schemas.SORT_OPTIONS[0], reverse: bool = False
+    ) -> "ItineraryBatch":
+        """
+        Rows sorted by a SORT_OPTIONS key or value (e.g. 1 or "price"), ties broken by the other of price and duration
+        then scraped order.
+        """
+        return self._select(sorted(self.rows, key=self._sort_key(by), reverse=reverse))
+
+    def top(self, k: int, by=schemas.SORT_OPTIONS[1]) -> "ItineraryBatch":
+        """First k rows as sorted by sort(by), without sorting all rows."""
+        return self._select(heapq.nsmallest(k, self.rows, key=self._sort_key(by)))
+
+    def dedup(self) -> "ItineraryBatch":
+        """
+        Rows with the first occurrence (in the current order) of each itinerary, i.e. the same flights on the same
+        dates, so sorting first (e.g. by price) keeps the best of each.
+        """
+        seen = set()
+        rows = []
+        for i in self.rows:
+            key = self.key[i]
+            if key not in seen:
+                seen.add(key)
+                rows.append(i)
+
+        return self._select(rows)
+
+    def trips(self) -> list:
+        """Trips of the rows held, as given."""
+        return [self._trips[i] for i in self.rows]
+
+    def to_trips(self) -> list[schemas.TripOutput]:
+        return [
+            construct_trusted(schemas.TripOutput, self._trips[i]) for i in self.rows
+        ]
@@ -1,16 +1,24 @@
 import json
 import logging
+from contextlib import contextmanager
+from datetime import timedelta
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from sqlalchemy.sql.expression import func
 
-from packages.shared.sql import models, schemas
+from packages.shared.sql import leases, models, request_cache, schemas
 from packages.shared.sql.database import engine
+from packages.shared.sql.price_history import record_price_history
+from packages.shared.utils.construct import construct_trusted
+from packages.shared.utils.context import phase_context, request_context
 from packages.shared.utils.paths import rmdir
 
+if TYPE_CHECKING:
+    from pika.adapters.blocking_connection import BlockingChannel
+
 # TODO: Should have a generic Job class (move to utils) and create a subclass for ETL related functionality
 # TODO: Should static methods be abstracted? And should methods such as update_status/get_status be static/abstracted
 #  also?
@@ -26,12 +34,19 @@ class Job:
         request: schemas.Request | schemas.RequestCreate,
         reset: bool = False,
         save_path: Optional[Path] = None,
+        pull: bool = True,
     ):
         if isinstance(request, schemas.RequestCreate):
             self.request = post_request_to_db(request)
-        else:
+        elif pull:
             # Make sure request is up-to-date
             self.request = self._pull_request(request.id)
+        else:
+            self.request = request
+
+        # Set for jobs claimed with a lease (see Job.claim)
+        self.lease_owner: Optional[str] = None
+        self.lease = leases.LEASE_DURATION
 
         if save_path is None:
             save_path = self.request.get_save_path()
@@ -46,29 +61,95 @@ class Job:
 
         self.setup_path()
 
+    @classmethod
+    def claim(
+        cls,
+        owner: Optional[str] = None,
+        n: int = 1,
+        lease: timedelta = leases.LEASE_DURATION,
+        **kwargs,
+    ) -> list["Job"]:
+        """
+        Claim up to n queued requests (see submit_requests) as jobs, which are held until finished, failed or the lease
+        expires without a heartbeat (see leases.claim_requests).
+
+        Parameters
+        ----------
+        owner: Identifier of the claiming worker, default host and process id
+        n: Maximum number of jobs to claim
+        lease: Time jobs are held for without a heartbeat
+        kwargs: Passed to Job
+
+        Returns
+        -------
+        Claimed jobs, empty if there are no queued requests
+        """
+        if owner is None:
+            owner = leases.default_owner()
+
+        jobs = []
+        for request in leases.claim_requests(owner, n=n, lease=lease):
+            # Claiming returns the up-to-date request
+            job = cls(request, pull=False, **kwargs)
+            job.lease_owner = owner
+            job.lease = lease
+            jobs.append(job)
+
+        return jobs
+
+    def heartbeat(self) -> bool:
+        """Extend the lease on a claimed job, returns False if the lease has been lost."""
+        if self.lease_owner is None:
+            raise ValueError("Job was not claimed")
+
+        return leases.heartbeat(self.request.id, self.lease_owner, self.lease)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Attribute work in the block (logs, see utils.log, and database statements) to this job's request and a phase,
+        e.g. "scrape" or "ingest".
+        """
+        with request_context(self.request.id), phase_context(name):
+            yield self
+
     @staticmethod
     def _pull_request(request_id):
-        with Session(engine) as session:
+        with request_context(request_id), Session(engine) as session:
             request_db = session.query(models.Request).filter_by(id=request_id).first()
             if request_db is None:
                 raise ValueError(
                     f"No job found for request id: {request_id}, ensure job has been created"
                 )
 
-        return schemas.Request(**request_db.__dict__)
+        return construct_trusted(schemas.Request, request_db)
 
     def setup_path(self):
-        self.save_path.mkdir(exist_ok=True, parents=True)
-        (self.save_path / self.completed_dir).mkdir(exist_ok=True)
-        (self.save_path / self.failed_dir).mkdir(exist_ok=True)
+        self.create_dir(self.request, self.save_path)
+
+    @classmethod
+    def create_dir(
+        cls, request: schemas.Request, save_path: Optional[Path] = None
+    ) -> Path:
+        """
+        Create the job directory for a request (with request file), without pulling the request from the database.
+        """
+        if save_path is None:
+            save_path = request.get_save_path()
+
+        save_path.mkdir(exist_ok=True, parents=True)
+        (save_path / cls.completed_dir).mkdir(exist_ok=True)
+        (save_path / cls.failed_dir).mkdir(exist_ok=True)
 
-        request_path = self.save_path / self.request_file
+        request_path = save_path / cls.request_file
 
         if not request_path.exists():
-            self.save(request_path)
+            write_request(request, request_path)
+
+        return save_path
 
     def get_status(self):
-        with Session(engine) as session:
+        with request_context(self.request.id), Session(engine) as session:
             status = (
                 session.query(models.Request.status)
                 .filter_by(id=self.request.id)
@@ -78,24 +159,55 @@ class Job:
         return status
 
     def update_status(self, status: str):
-        with Session(engine) as session:
+        with request_context(self.request.id), Session(engine) as session:
             session.query(models.Request).filter_by(id=self.request.id).update(
                 {"status": status}
             )
             session.commit()
 
         self.request.status = status
-        self.logger.info(f"Status updated: {status.upper()}")
+        self.logger.info("Status updated: %s", status.upper())
+
+    def finish(self, status: str) -> bool:
+        """Set the final status, releasing the lease of a claimed job. Returns False if the lease had been lost."""
+        if self.lease_owner is None:
+            self.update_status(status)
+        elif leases.release(self.request.id, self.lease_owner, status):
+            self.lease_owner = None
+            self.request.status = status
+            self.logger.info("Status updated: %s", status.upper())
+        else:
+            self.logger.warning("Lease lost, status not updated: %s", status.upper())
+            return False
+
+        return True
+
+    def fail(self) -> bool:
+        return self.finish(leases.FAILED_STATUS)
+
+    def success(self) -> bool:
+        if not self.finish(leases.FINISHED_STATUS):
+            return False
+
+        # The request is finished either way, its price history can be recorded later (record_price_history can rerun)
+        try:
+            self.record_prices()
+        except Exception:
+            self.logger.exception("Price history not recorded")
 
-    def fail(self):
-        self.update_status("failed")
+        return True
 
-    def success(self):
-        self.update_status("finished")
+    def record_prices(self):
+        """Add the request's results to the price history (see price_history.record_price_history)."""
+        with request_context(self.request.id), Session(engine) as session:
+            n = record_price_history(session, self.request.id)
+            session.commit()
+
+        self.logger.info("Price history rows recorded: %s", n)
 
     def get_request_from_file(self):
         with Path.open(self.save_path / self.request_file, "r") as f:
-            request = schemas.Request(**json.load(f))
+            request = construct_trusted(schemas.Request, json.load(f))
 
         return request
 
@@ -103,8 +215,7 @@ class Job:
         if path is None:
             path = self.save_path
 
-        with Path.open(path, "w") as f:
-            json.dump(self.request.dict(), f, indent=2, default=str)
+        write_request(self.request, path)
 
     def remove_path(self):
         if self.save_path.exists():
@@ -118,41 +229,147 @@ class Job:
     def from_dir(path: Path, *args, **kwargs):
         request_id = Job.id_from_dir(path)
 
-        with Session(engine) as session:
+        with request_context(request_id), Session(engine) as session:
             request_db = session.query(models.Request).filter_by(id=request_id).first()
 
         if request_db is not None:
-            request = schemas.Request(**request_db.__dict__)
+            request = construct_trusted(schemas.Request, request_db)
             # Passing save_path as directory path to ensure saving to input directory
             return Job(request=request, save_path=path, *args, **kwargs)
 
 
-def post_request_to_db(request: schemas.RequestCreate):
-    with Session(engine) as session:
-        request_db = models.Request(**request.dict())
+def write_request(request: schemas.Request, path: Path):
+    with Path.open(path, "w") as f:
+        json.dump(request.model_dump(), f, indent=2, default=str)
 
-        try:
-            session.add(request_db)
-            session.commit()
-            session.refresh(request_db)
 
-        except IntegrityError:
-            session.rollback()
+def post_request_to_db(request: schemas.RequestCreate) -> schemas.Request:
+    return post_requests_to_db([request])[0]
 
-            # Should not have to do this, but workaround for (sqlalchemy) bug that tries to insert from pk=1 again
-            last_id = session.query(func.max(models.Request.id)).first()
-            if last_id is not None:
-                request_db.id = last_id[0] + 1
 
-                session.add(request_db)
-                session.commit()
-                session.refresh(request_db)
+def post_requests_to_db(
+    requests: list[schemas.RequestCreate],
+    status: Optional[str] = None,
+) -> list[schemas.Request]:
+    """
+    Add requests in a single transaction. Requests with an idempotency_key that has already been submitted are not
+    added again, the existing request is returned in their place.
 
-    return schemas.Request(**request_db.__dict__)
+    Parameters
+    ----------
+    requests: Requests to add
+    status: Initial status of added requests e.g. leases.QUEUED_STATUS
 
+    Returns
+    -------
+    Added (or existing) requests, in the order given
+    """
+    table = models.Request.__table__
+    rows = [{**request.model_dump(), "status": status} for request in requests]
+    keyed = [row for row in rows if row["idempotency_key"] is not None]
+    unkeyed = [row for row in rows if row["idempotency_key"] is None]
 
-def update_request_status(request: models.Request, status: str):
     with Session(engine) as session:
+        created = []
+        if unkeyed:
+            stmt = insert(table).returning(*table.c, sort_by_parameter_order=True)
+            created = list(session.execute(stmt, unkeyed).mappings())
+
+        by_key = {}
+        if keyed:
+            stmt = (
+                insert(table)
+                .on_conflict_do_nothing(index_elements=[table.c.idempotency_key])
+                .returning(*table.c)
+            )
+            by_key = {
+                row["idempotency_key"]: row
+                for row in session.execute(stmt, keyed).mappings()
+            }
+
+            # Previously submitted keys (or repeated within requests) were not inserted
+            missing = {row["idempotency_key"] for row in keyed} - by_key.keys()
+            if missing:
+                existing = select(table).where(table.c.idempotency_key.in_(missing))
+                by_key.update(
+                    (row["idempotency_key"], row)
+                    for row in session.execute(existing).mappings()
+                )
+
+        session.commit()
+
+    created = iter(created)
+    out = []
+    for row in rows:
+        key = row["idempotency_key"]
+        request_db = next(created) if key is None else by_key[key]
+        out.append(construct_trusted(schemas.Request, request_db))
+
+    return out
+
+
+def submit_requests(
+    requests: list[schemas.RequestCreate],
+    channel: Optional["BlockingChannel"] = None,
+    queue: Optional[str] = None,
+    claimable: bool = False,
+    shared: bool = False,
+) -> list[schemas.Request]:
+    """
+    Submit a batch of requests (e.g. a sweep of dates for one route): requests are added in a single statement (see
+    post_requests_to_db), job directories created, and either all requests published to the queue in one transaction
+    (see utils.queue.publish_batch), if a channel is given, or queued to be claimed by workers (see Job.claim).
+    Requests resubmitted with an existing idempotency_key are published again, consumers should check their status.
+
+    Shared requests are instead added one at a time (see request_cache.submit_request), and any with the same
+    parameters as a recent request (including one earlier in the batch) are not added: the existing request is
+    returned in their place, and not published again.
+
+    Parameters
+    ----------
+    requests: Requests to submit
+    channel: Channel to publish requests on, default not published
+    queue: Queue to publish requests to, required with channel
+    claimable: Queue requests to be claimed by workers, rather than publishing them. Only these requests are claimed,
+        so a request is never both consumed from the queue and claimed
+    shared: Share results between requests with the same parameters, requests must not have an idempotency_key (the
+        existing request is returned for resubmissions anyway)
+
+    Returns
+    -------
+    Submitted requests, in the order given
+    """
+    if channel is not None and queue is None:
+        raise ValueError("A queue must be specified to publish requests")
+    if channel is not None and claimable:
+        raise ValueError("Requests must either be published or claimable, not both")
+    if shared and any(request.idempotency_key is not None for request in requests):
+        raise ValueError("Shared requests must not have an idempotency_key")
+
+    status = leases.QUEUED_STATUS if claimable else None
+    if shared:
+        submissions = [
+            request_cache.submit_request(request, status=status) for request in requests
+        ]
+        submitted = [request for request, _ in submissions]
+        new = [request for request, created in submissions if created]
+    else:
+        submitted = new = post_requests_to_db(requests, status=status)
+
+    for request in new:
+        Job.create_dir(request)
+
+    if channel is not None:
+        # pika is only required when publishing
+        from packages.shared.utils.queue import publish_batch
+
+        publish_batch(channel, queue, (request.model_dump_json() for request in new))
+
+    return submitted
+
+
+def update_request_status(request: models.Request, status: str):
+    with request_context(request.id), Session(engine) as session:
         session.query(models.Request).filter_by(id=request.id).update(
             {"status": status.upper()}
         )
@@ -0,0 +1,342 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from pymongo import DESCENDING
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, PyMongoError
+
+LOGGER = logging.getLogger(__name__)
+
+# Server error codes for change streams being unavailable (no replica set) and the resume point having been lost
+CHANGE_STREAM_UNSUPPORTED = (40573, 40324)
+CHANGE_STREAM_HISTORY_LOST = 286
+
+POLL_INTERVAL = 30
+RETRY_INTERVAL = 5
+
+# Sentinel for keys not in the cache (None being a cached miss)
+_MISSING = object()
+
+
+class DocumentCache:
+    """
+    Thread safe cache of documents from a collection keyed by a (unique) field, e.g. airports by iata_code. Misses are
+    cached too, so unknown keys are not looked up repeatedly. Entries expire after ttl seconds, but with a
+    ChangeWatcher on the collection they are refreshed as the collection changes, so long TTLs do not serve stale
+    documents:
+
+        airport_cache = DocumentCache(db, "airports", "iata_code", ttl=24 * 60 * 60)
+        ChangeWatcher(db, "airports", [airport_cache]).start()
+
+    Parameters
+    ----------
+    db: Database
+    collection: Collection name
+    key: Field the documents are keyed by
+    ttl: Seconds entries are cached for, None to never expire
+    maxsize: Maximum number of entries (least recently used evicted first), None for no limit
+    projection: Projection applied to cached documents
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        collection: str,
+        key: str,
+        ttl: Optional[float] = None,
+        maxsize: Optional[int] = None,
+        projection: Optional[dict] = None,
+    ):
+        self.db = db
+        self.collection = collection
+        self.key = key
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.projection = projection
+
+        self._entries: OrderedDict[Any, tuple[Optional[dict], float]] = OrderedDict()
+        # Document _id to key, so deletes (which only carry the _id) can be applied
+        self._ids: dict[Any, Any] = {}
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def _expires(self) -> float:
+        return float("inf") if self.ttl is None else time.monotonic() + self.ttl
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+
+            document, expires = entry
+            if expires < time.monotonic():
+                self._pop(key)
+                return _MISSING
+
+            self._entries.move_to_end(key)
+            return document
+
+    def _pop(self, key):
+        document, _ = self._entries.pop(key, (None, 0))
+        if document is not None:
+            self._ids.pop(document.get("_id"), None)
+
+    def _set(self, key, document: Optional[dict]):
+        self._pop(key)
+        self._entries[key] = (self._project(document), self._expires())
+        if document is not None:
+            self._ids[document["_id"]] = key
+
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+
+    def _project(self, document: Optional[dict]) -> Optional[dict]:
+        # _id is kept for the _id to key mapping, and removed from returned documents
+        if document is None or not self.projection:
+            return document
+
+        include = [field for field, value in self.projection.items() if value]
+        if include:
+            return {f: document[f] for f in ("_id", *include) if f in document}
+
+        return {f: v for f, v in document.items() if self.projection.get(f, 1)}
+
+    @staticmethod
+    def _output(document: Optional[dict]) -> Optional[dict]:
+        if document is None:
+            return None
+
+        return {f: v for f, v in document.items() if f != "_id"}
+
+    def get(self, key) -> Optional[dict]:
+        """Cached document for key (without _id), loaded from the collection on a miss. None if there is none."""
+        document = self._lookup(key)
+        if document is not _MISSING:
+            self.hits += 1
+            return self._output(document)
+
+        self.misses += 1
+        document = self.db[self.collection].find_one({self.key: key})
+        with self._lock:
+            self._set(key, document)
+
+        return self._output(document)
+
+    def get_many(self, keys: Iterable) -> dict[Any, dict]:
+        """Cached documents for keys, with all misses loaded in one query. Keys without a document are omitted."""
+        out = {}
+        missing = []
+        for key in set(keys):
+            document = self._lookup(key)
+            if document is _MISSING:
+                missing.append(key)
+            elif document is not None:
+                out[key] = self._output(document)
+
+        self.hits += len(out)
+        self.misses += len(missing)
+        if missing:
+            found = {
+                document[self.key]: document
+                for document in self.db[self.collection].find(
+                    {self.key: {"$in": missing}}
+                )
+            }
+            with self._lock:
+                for key in missing:
+                    self._set(key, found.get(key))
+
+            out.update((key, self._output(document)) for key, document in found.items())
+
+        return out
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+
+    def apply_change(self, operation: str, document_id, document: Optional[dict]):
+        """
+        Apply a change to the collection: cached entries for changed documents are refreshed, deleted documents are
+        removed. Documents not already cached are not added.
+
+        Parameters
+        ----------
+        operation: Change stream operation type e.g. "insert", "update", "delete"
+        document_id: _id of the changed document
+        document: Full document after the change, None for deletes
+        """
+        with self._lock:
+            old_key = self._ids.get(document_id)
+            if old_key is not None and (
+                document is None or document.get(self.key) != old_key
+            ):
+                self._pop(old_key)
+
+            if document is None:
+                return
+
+            # Existing entries (including cached misses, e.g. a newly inserted airport)
+            key = document.get(self.key)
+            if key in self._entries:
+                self._set(key, document)
+
+
+class ChangeWatcher:
+    """
+    Background thread applying changes to a collection to caches (any object with apply_change(operation,
+    document_id, document) and clear() methods, see DocumentCache).
+
+    Changes are read from a change stream, which requires a replica set. On deployments without one, the collection is
+    polled every poll_interval seconds for documents with a newer updated_field value (e.g. Route.updated); polling
+    cannot see deletes, which are left to cache expiry.
+
+    Parameters
+    ----------
+    db: Database
+    collection: Collection name
+    caches: Caches to keep up to date
+    poll_interval: Seconds between polls when change streams are unavailable
+    updated_field: Last modified field used for polling
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        collection: str,
+        caches: Iterable,
+        poll_interval: float = POLL_INTERVAL,
+        updated_field: str = "updated",
+    ):
+        self.db = db
+        self.collection = collection
+        self.caches = list(caches)
+        self.poll_interval = poll_interval
+        self.updated_field = updated_field
+
+        self.polling = False
+        self.resume_token = None
+        # Token of an invalidate event, after which a new stream is started (it can't be resumed after)
+        self.start_after = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ChangeWatcher":
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name=f"{self.collection}-watcher", daemon=True
+        )
+        self._thread.start()
+
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def dispatch(self, operation: str, document_id, document: Optional[dict]):
+        for cache in self.caches:
+            cache.apply_change(operation, document_id, document)
+
+    def reset(self):
+        for cache in self.caches:
+            cache.clear()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                if self.polling:
+                    self._poll()
+                else:
+                    self._watch()
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAM_UNSUPPORTED:
+                    LOGGER.info(
+                        "Change streams unavailable for %s, polling every %ss",
+                        self.collection,
+                        self.poll_interval,
+                    )
+                    self.polling = True
+                elif e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Changes since the resume token are unknown, start again from empty caches
+                    LOGGER.warning(
+                        "Lost change stream position for %s, clearing caches",
+                        self.collection,
+                    )
+                    self.resume_token = self.start_after = None
+                    self.reset()
+                else:
+                    LOGGER.warning("Error watching %s: %s", self.collection, e)
+                    self._stop.wait(RETRY_INTERVAL)
+            except PyMongoError as e:
+                LOGGER.warning("Error watching %s: %s", self.collection, e)
+                self._stop.wait(RETRY_INTERVAL)
+
+    def _watch(self):
+        with self.db[self.collection].watch(
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            start_after=self.start_after,
+            max_await_time_ms=1000,
+        ) as stream:
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                self.resume_token, self.start_after = stream.resume_token, None
+                if change is None:
+                    continue
+
+                operation = change["operationType"]
+                if operation == "invalidate":
+                    # Follows a drop or rename, and closes the stream, start a new one after it
+                    self.resume_token, self.start_after = None, self.resume_token
+                    self.reset()
+                    return
+
+                if operation in ("drop", "rename", "dropDatabase"):
+                    self.reset()
+                    continue
+
+                document_id = change.get("documentKey", {}).get("_id")
+                if document_id is None:
+                    continue
+
+                # fullDocument is None for deletes, and updates to documents deleted since
+                self.dispatch(operation, document_id, change.get("fullDocument"))
+
+    def _latest(self):
+        latest = self.db[self.collection].find_one(
+            {self.updated_field: {"$ne": None}},
+            {self.updated_field: 1},
+            sort=[(self.updated_field, DESCENDING)],
+        )
+        return None if latest is None else latest[self.updated_field]
+
+    def _poll(self):
+        watermark = self._latest()
+        while not self._stop.wait(self.poll_interval):
+            query = {self.updated_field: {"$ne": None}}
+            if watermark is not None:
+                query = {self.updated_field: {"$gt": watermark}}
+
+            for document in self.db[self.collection].find(query):
+                self.dispatch("update", document["_id"], document)
+                if watermark is None or document[self.updated_field] > watermark:
+                    watermark = document[self.updated_field]
@@ -0,0 +1,260 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
+from uuid import uuid4
+
+from pymongo import DESCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from packages.shared.mongodb.cache import DocumentCache
+from packages.shared.mongodb.routes import Codes, codes_filter, get_routes
+from packages.shared.mongodb.schemas import (
+    Airport,
+    AirportOutput,
+    NumAirportConnectionsOutput,
+)
+
+COUNTS_COLLECTION = "airport_route_counts"
+# Refresh bookkeeping lives alongside the counts, airport documents are keyed by (3 letter) IATA code
+META_ID = "_meta"
+
+
+def _match(field: str, iata: Optional[Codes]) -> list[dict]:
+    return [] if iata is None else [{"$match": {field: codes_filter(iata)}}]
+
+
+def _count_by(field: str) -> dict:
+    return {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+
+
+def airport_counts_pipeline(iata: Optional[Codes] = None) -> list[dict]:
+    """
+    Aggregation over routes returning one {_id: iata, num_dep, num_arr, routes_updated} document per airport.
+
+    Parameters
+    ----------
+    iata: Restrict to these airport(s), default all airports
+    """
+    one, zero = {"$literal": 1}, {"$literal": 0}
+    pairs = [
+        {"iata": "$dep_iata", "dep": one, "arr": zero},
+        {"iata": "$arr_iata", "dep": zero, "arr": one},
+    ]
+    pipeline = []
+    if iata is not None:
+        codes = codes_filter(iata)
+        pipeline.append({"$match": {"$or": [{"dep_iata": codes}, {"arr_iata": codes}]}})
+
+    pipeline += [
+        {"$project": {"_id": 0, "updated": 1, "pairs": pairs}},
+        {"$unwind": "$pairs"},
+        *_match("pairs.iata", iata),
+        {
+            "$group": {
+                "_id": "$pairs.iata",
+                "num_dep": {"$sum": "$pairs.dep"},
+                "num_arr": {"$sum": "$pairs.arr"},
+                "routes_updated": {"$max": "$updated"},
+            }
+        },
+    ]
+
+    return pipeline
+
+
+def airport_route_counts(
+    db: Database, iata: Optional[Codes] = None
+) -> dict[str, tuple[int, int]]:
+    """
+    Number of departing and arriving routes per airport, counted server side.
+
+    Returns
+    -------
+    {iata: (num_dep, num_arr)}
+    """
+    return {
+        doc["_id"]: (doc["num_dep"], doc["num_arr"])
+        for doc in get_routes(db).aggregate(airport_counts_pipeline(iata))
+    }
+
+
+def connection_counts(
+    db: Database, iata: str, airport_cache: Optional[DocumentCache] = None
+) -> list[NumAirportConnectionsOutput]:
+    """
+    Number of routes between an airport and each airport it is connected to, counted server side in a single $facet
+    aggregation. Connected airports are resolved in one further query (or from airport_cache, a DocumentCache of
+    airports by iata_code), airports missing from the airports collection are output by identifier (see
+    NumAirportConnectionsOutput).
+    """
+    iata = iata.upper()
+    pipeline = [
+        {"$match": {"$or": [{"dep_iata": iata}, {"arr_iata": iata}]}},
+        {
+            "$facet": {
+                "dep": [*_match("dep_iata", iata), _count_by("arr_iata")],
+                "arr": [*_match("arr_iata", iata), _count_by("dep_iata")],
+            }
+        },
+    ]
+    result = next(get_routes(db).aggregate(pipeline), {"dep": [], "arr": []})
+
+    counts: dict[str, list[int]] = {}
+    for direction, idx in (("dep", 0), ("arr", 1)):
+        for doc in result[direction]:
+            if doc["_id"] is None:
+                continue
+            counts.setdefault(doc["_id"], [0, 0])[idx] = doc["count"]
+
+    if airport_cache is None:
+        ports = db.airports.find({"iata_code": {"$in": list(counts)}}, {"_id": 0})
+    else:
+        ports = airport_cache.get_many(counts).values()
+
+    airports = {port["iata_code"]: Airport(**port) for port in ports}
+
+    return [
+        NumAirportConnectionsOutput(
+            num_dep_links=num_dep,
+            num_arr_links=num_arr,
+            connection=airports.get(code, code),
+        )
+        for code, (num_dep, num_arr) in counts.items()
+    ]
+
+
+def get_counts(db: Database) -> Collection:
+    return db[COUNTS_COLLECTION]
+
+
+def routes_updated(db: Database) -> Optional[str]:
+    """Latest Route.updated value in the routes collection (read from the updated index)."""
+    latest = get_routes(db).find_one(
+        {"updated": {"$ne": None}},
+        {"_id": 0, "updated": 1},
+        sort=[("updated", DESCENDING)],
+    )
+    return None if latest is None else latest["updated"]
+
+
+def counts_meta(db: Database) -> Optional[dict]:
+    """
+    State of the last refresh of the precomputed counts: when it ran (refreshed) and the Route.updated watermark it
+    counted routes up to (routes_updated, None if no route had an updated value). None if never refreshed.
+    """
+    return get_counts(db).find_one({"_id": META_ID})
+
+
+def counts_updated(db: Database) -> Optional[str]:
+    """Route.updated watermark the precomputed counts were last refreshed up to."""
+    meta = counts_meta(db)
+    return None if meta is None else meta.get("routes_updated")
+
+
+def _is_fresh(meta: Optional[dict], latest: Optional[str]) -> bool:
+    if meta is None:
+        return False
+
+    # Routes without updated values can only be recounted by a full refresh, they are taken as fresh after one
+    watermark = meta.get("routes_updated")
+    return latest is None or (watermark is not None and latest <= watermark)
+
+
+def counts_are_fresh(db: Database) -> bool:
+    return _is_fresh(counts_meta(db), routes_updated(db))
+
+
+def refresh_airport_counts(db: Database, full: bool = False) -> int:
+    """
+    Refresh the precomputed per-airport route counts, merged into the counts collection server side.
+    By default only airports with routes updated since the last refresh (by Route.updated) are recounted, a full
+    refresh is made if the counts were never refreshed or have no watermark. A full refresh also removes airports
+    which no longer have any routes, which incremental refreshes cannot detect.
+
+    Parameters
+    ----------
+    db: Database
+    full: Recount all airports
+
+    Returns
+    -------
+    Number of airports recounted
+    """
+    routes = get_routes(db)
+    counts = get_counts(db)
+    meta = None if full else counts_meta(db)
+    latest = routes_updated(db)
+
+    if meta is not None and _is_fresh(meta, latest):
+        return 0
+
+    watermark = None if meta is None else meta.get("routes_updated")
+    if watermark is None:
+        iata = None
+    else:
+        changed = {"updated": {"$gt": watermark}}
+        iata = set(routes.distinct("dep_iata", changed))
+        iata |= set(routes.distinct("arr_iata", changed))
+        iata.discard(None)
+
+    refresh_id = uuid4().hex
+    pipeline = airport_counts_pipeline(iata)
+    pipeline += [
+        {"$set": {"refresh_id": refresh_id, "refreshed": "$$NOW"}},
+        {
+            "$merge": {
+                "into": COUNTS_COLLECTION,
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+    routes.aggregate(pipeline)
+
+    if iata is None:
+        counts.delete_many({"_id": {"$ne": META_ID}, "refresh_id": {"$ne": refresh_id}})
+
+    counts.update_one(
+        {"_id": META_ID},
+        {
+            "$set": {
+                "routes_updated": latest,
+                "refreshed": datetime.now(timezone.utc),
+            }
+        },
+        upsert=True,
+    )
+
+    return counts.count_documents({"refresh_id": refresh_id})
+
+
+def get_airport_counts(
+    db: Database, iata: Codes, refresh: bool = True
+) -> dict[str, tuple[int, int]]:
+    """
+    Precomputed (num_dep, num_arr) per airport, refreshing stale counts first unless refresh is False.
+    """
+    if refresh and not counts_are_fresh(db):
+        refresh_airport_counts(db)
+
+    query: dict[str, Any] = {"_id": codes_filter(iata)}
+    return {
+        doc["_id"]: (doc["num_dep"], doc["num_arr"])
+        for doc in get_counts(db).find(query, {"num_dep": 1, "num_arr": 1})
+    }
+
+
+def with_route_counts(
+    db: Database, airports: list[AirportOutput], refresh: bool = True
+) -> list[AirportOutput]:
+    """
+    Fill in the derived num_dep/num_arr fields from the precomputed counts (0 for airports without routes).
+    """
+    codes = [airport.iata_code for airport in airports if airport.iata_code]
+    counts = get_airport_counts(db, codes, refresh=refresh) if codes else {}
+
+    for airport in airports:
+        airport.num_dep, airport.num_arr = counts.get(airport.iata_code, (0, 0))
+
+    return airports
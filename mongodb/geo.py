@@ -0,0 +1,196 @@
+import heapq
+from array import array
+from math import asin, cos, radians, sin, sqrt
+from typing import Iterable, Optional
+
+from pymongo import GEOSPHERE
+from pymongo.database import Database
+
+from packages.shared.mongodb.schemas import AirportDistOutput
+
+EARTH_RADIUS = 6_371_008.8  # metres, mean radius
+
+# Airports are small documents, but keep the ObjectId out of responses
+AIRPORT_PROJECTION = {"_id": 0}
+
+
+def ensure_geo_index(db: Database) -> str:
+    return db.airports.create_index([("location", GEOSPHERE)], name="location_2dsphere")
+
+
+def nearest_airports(
+    db: Database,
+    lon: float,
+    lat: float,
+    limit: int = 10,
+    max_distance: Optional[float] = None,
+    query: Optional[dict] = None,
+) -> list[AirportDistOutput]:
+    """
+    Airports nearest to a point, closest first, using $geoNear against the 2dsphere index (see ensure_geo_index).
+
+    Parameters
+    ----------
+    db: Database
+    lon, lat: Point to search from (degrees)
+    limit: Maximum number of airports returned
+    max_distance: Optional search radius in metres
+    query: Optional additional filter on airports e.g. {"country_code": "GB"}
+
+    Returns
+    -------
+    Airports with dist.calculated set to the distance in metres
+    """
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lon, lat]},
+        "distanceField": "dist.calculated",
+        "spherical": True,
+    }
+    if max_distance is not None:
+        geo_near["maxDistance"] = max_distance
+    if query:
+        geo_near["query"] = query
+
+    pipeline = [
+        {"$geoNear": geo_near},
+        {"$limit": limit},
+        {"$project": AIRPORT_PROJECTION},
+    ]
+
+    return [AirportDistOutput(**port) for port in db.airports.aggregate(pipeline)]
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Great circle distance between two points (degrees) in metres."""
+    lon1, lat1, lon2, lat2 = map(radians, (lon1, lat1, lon2, lat2))
+    a = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(a)))
+
+
+def _unit_vector(lon: float, lat: float) -> tuple[float, float, float]:
+    lon, lat = radians(lon), radians(lat)
+    return cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat)
+
+
+def _chord(distance: float) -> float:
+    """Straight line distance through the unit sphere equivalent to a great circle distance in metres."""
+    return 2 * sin(min(distance / EARTH_RADIUS, 3.141592653589793) / 2)
+
+
+class AirportTree:
+    """
+    In-process nearest airport index: a static KD-tree over airport locations as 3D unit vectors, in which straight
+    line (chord) distance orders points the same way as great circle distance, so there are no special cases at the
+    antimeridian or poles. Reported distances are haversine distances in metres.
+
+    The tree is implicit: points are reordered so the node for range [lo, hi) is its median, with children
+    [lo, median) and [median + 1, hi), split on axis depth % 3.
+    """
+
+    def __init__(self, airports: Iterable[dict]):
+        self.airports = [
+            port
+            for port in airports
+            if port.get("location") and port["location"].get("coordinates")
+        ]
+
+        points = [
+            _unit_vector(*port["location"]["coordinates"][:2]) for port in self.airports
+        ]
+        order = list(range(len(points)))
+        self._build(points, order, 0, len(order), 0)
+
+        self.order = array("l", order)
+        self.coords = [
+            array("d", (points[i][axis] for i in order)) for axis in range(3)
+        ]
+
+    @classmethod
+    def from_db(cls, db: Database) -> "AirportTree":
+        return cls(db.airports.find({"location": {"$ne": None}}, AIRPORT_PROJECTION))
+
+    def _build(self, points: list, order: list, lo: int, hi: int, depth: int):
+        # Iterative over the stack of ranges, sorting each range on its split axis and recursing either side of median
+        stack = [(lo, hi, depth)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+
+            axis = depth % 3
+            order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+    def __len__(self):
+        return len(self.order)
+
+    def _search(
+        self, point: tuple, k: int, max_chord: float
+    ) -> list[tuple[float, int]]:
+        """k nearest points within max_chord, as a (negated squared chord distance, tree position) max-heap."""
+        xs, ys, zs = self.coords
+        px, py, pz = point
+        best: list[tuple[float, int]] = []
+        bound = max_chord**2
+
+        stack = [(0, len(self.order), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+
+            mid = (lo + hi) // 2
+            d2 = (xs[mid] - px) ** 2 + (ys[mid] - py) ** 2 + (zs[mid] - pz) ** 2
+            if d2 <= bound:
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, mid))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, mid))
+                if len(best) == k:
+                    bound = min(bound, -best[0][0])
+
+            axis = depth % 3
+            diff = point[axis] - self.coords[axis][mid]
+            near, far = (
+                ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            )
+
+            # Far side pushed first so the near side is searched first, tightening the bound
+            if diff * diff <= bound:
+                stack.append((*far, depth + 1))
+            stack.append((*near, depth + 1))
+
+        return best
+
+    def _output(self, lon: float, lat: float, best: list) -> list[AirportDistOutput]:
+        out = []
+        for _, position in sorted(best, reverse=True):
+            port = self.airports[self.order[position]]
+            port_lon, port_lat = port["location"]["coordinates"][:2]
+            distance = haversine(lon, lat, port_lon, port_lat)
+            out.append(AirportDistOutput(**port, dist={"calculated": distance}))
+
+        return out
+
+    def nearest(
+        self, lon: float, lat: float, k: int = 10, max_distance: Optional[float] = None
+    ) -> list[AirportDistOutput]:
+        """k airports nearest to a point, closest first, optionally within max_distance metres."""
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+
+        max_chord = 2.0 if max_distance is None else _chord(max_distance)
+        best = self._search(_unit_vector(lon, lat), k, max_chord)
+
+        return self._output(lon, lat, best)
+
+    def within(self, lon: float, lat: float, radius: float) -> list[AirportDistOutput]:
+        """All airports within radius metres of a point, closest first."""
+        best = self._search(_unit_vector(lon, lat), len(self.order), _chord(radius))
+        return self._output(lon, lat, best)
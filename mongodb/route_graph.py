@@ -0,0 +1,330 @@
+import heapq
+from array import array
+from collections import deque
+from datetime import date
+from typing import Iterable, NamedTuple, Optional
+
+from pymongo.database import Database
+
+from packages.shared.mongodb.routes import get_routes
+from packages.shared.mongodb.schemas import DAY_MAPPING
+from packages.shared.utils.dates import ALL_WEEKDAYS, days_mask, weekday
+
+MINUTES_PER_DAY = 24 * 60
+MIN_CONNECTION = 60
+MAX_CONNECTION = 24 * 60
+
+GRAPH_PROJECTION = {
+    "_id": 0,
+    "flight_iata": 1,
+    "flight_icao": 1,
+    "dep_iata": 1,
+    "arr_iata": 1,
+    "dep_time": 1,
+    "dep_time_utc": 1,
+    "arr_time": 1,
+    "arr_time_utc": 1,
+    "duration": 1,
+    "days": 1,
+    "updated": 1,
+}
+
+
+class Leg(NamedTuple):
+    flight: str
+    dep_iata: str
+    arr_iata: str
+    # Minutes from midnight (UTC) at the start of the search day
+    dep: int
+    arr: int
+
+
+def _minutes(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+
+    hours, _, minutes = value.partition(":")
+    try:
+        return int(hours) * 60 + int(minutes[:2] or 0)
+    except ValueError:
+        return None
+
+
+def _edge(route: dict) -> Optional[tuple]:
+    flight = route.get("flight_iata") or route.get("flight_icao")
+    dep, arr = route.get("dep_iata"), route.get("arr_iata")
+
+    # UTC times where available so connections across time zones compare correctly, otherwise local times. Both from
+    # the same source, a duration from a local and a UTC time would be off by the time zone offset.
+    dep_minute = _minutes(route.get("dep_time_utc"))
+    if dep_minute is None:
+        dep_minute = _minutes(route.get("dep_time"))
+        arr_minute = _minutes(route.get("arr_time"))
+    else:
+        arr_minute = _minutes(route.get("arr_time_utc"))
+
+    duration = route.get("duration")
+    if not duration and dep_minute is not None and arr_minute is not None:
+        duration = (arr_minute - dep_minute) % MINUTES_PER_DAY
+
+    if not (flight and dep and arr) or dep_minute is None or not duration:
+        return None
+
+    days = route.get("days")
+    mask = (
+        days_mask(DAY_MAPPING.get(day, day) for day in days) if days else ALL_WEEKDAYS
+    )
+
+    return dep.upper(), arr.upper(), dep_minute, int(duration), mask, flight
+
+
+class RouteGraph:
+    """
+    In-memory graph of the routes collection for multi-stop connection search. Airports are nodes and every route an
+    edge, stored in compressed sparse row form: edges are sorted by departure airport (then departure time) into flat
+    arrays, with the edges of airport i in offsets[i]:offsets[i + 1].
+    Route days are treated as the (UTC) days of the week a route departs on.
+    """
+
+    def __init__(self, routes: Iterable[dict] = ()):
+        self._edges: dict[tuple, tuple] = {}
+        self.updated: Optional[str] = None
+        self._add(routes)
+        self._build()
+
+    @classmethod
+    def from_db(cls, db: Database) -> "RouteGraph":
+        return cls(get_routes(db).find({}, GRAPH_PROJECTION))
+
+    def refresh(self, db: Database) -> int:
+        """
+        Load routes updated (by Route.updated) since the graph was built or last refreshed.
+
+        Returns
+        -------
+        Number of routes added or replaced
+        """
+        query = {} if self.updated is None else {"updated": {"$gt": self.updated}}
+        n = self._add(get_routes(db).find(query, GRAPH_PROJECTION))
+        if n:
+            self._build()
+
+        return n
+
+    def _add(self, routes: Iterable[dict]) -> int:
+        n = 0
+        for route in routes:
+            edge = _edge(route)
+            if edge is None:
+                continue
+
+            dep, arr, *_, flight = edge
+            self._edges[(flight, dep, arr)] = edge
+            n += 1
+
+            updated = route.get("updated")
+            if updated is not None and (self.updated is None or updated > self.updated):
+                self.updated = updated
+
+        return n
+
+    def _build(self):
+        edges = sorted(self._edges.values(), key=lambda e: (e[0], e[2]))
+
+        self.airports: list[str] = sorted({e[0] for e in edges} | {e[1] for e in edges})
+        self.index = {iata: i for i, iata in enumerate(self.airports)}
+
+        self.offsets = array("l", [0] * (len(self.airports) + 1))
+        for edge in edges:
+            self.offsets[self.index[edge[0]] + 1] += 1
+        for i in range(len(self.airports)):
+            self.offsets[i + 1] += self.offsets[i]
+
+        self.sources = array("l", (self.index[e[0]] for e in edges))
+        self.targets = array("l", (self.index[e[1]] for e in edges))
+        self.dep_minutes = array("H", (e[2] for e in edges))
+        self.durations = array("H", (e[3] for e in edges))
+        self.days = array("B", (e[4] for e in edges))
+        self.flights = [e[5] for e in edges]
+
+        # Reverse adjacency (edges grouped by arrival airport) for pruning searches towards a destination
+        self.in_offsets = array("l", [0] * (len(self.airports) + 1))
+        for target in self.targets:
+            self.in_offsets[target + 1] += 1
+        for i in range(len(self.airports)):
+            self.in_offsets[i + 1] += self.in_offsets[i]
+        self.in_edges = array(
+            "l", sorted(range(len(edges)), key=self.targets.__getitem__)
+        )
+
+    def __len__(self):
+        return len(self.targets)
+
+    def routes_from(self, iata: str) -> range:
+        i = self.index.get(iata.upper())
+        if i is None:
+            return range(0)
+
+        return range(self.offsets[i], self.offsets[i + 1])
+
+    def reachable(self, origin: str, max_stops: int = 1) -> dict[str, int]:
+        """
+        Breadth first search ignoring timings: airports reachable from origin with the minimum number of stops.
+        """
+        start = self.index.get(origin.upper())
+        if start is None:
+            return {}
+
+        stops = {start: -1}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if stops[node] >= max_stops:
+                continue
+
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                target = self.targets[edge]
+                if target not in stops:
+                    stops[target] = stops[node] + 1
+                    queue.append(target)
+
+        del stops[start]
+        return {self.airports[node]: n for node, n in stops.items()}
+
+    def legs_to(self, destination: int, max_legs: int) -> dict[int, int]:
+        """
+        Reverse breadth first search: minimum number of legs from each airport (index) to destination, for airports
+        within max_legs.
+        """
+        legs = {destination: 0}
+        queue = deque([destination])
+        while queue:
+            node = queue.popleft()
+            if legs[node] >= max_legs:
+                continue
+
+            for i in range(self.in_offsets[node], self.in_offsets[node + 1]):
+                source = self.sources[self.in_edges[i]]
+                if source not in legs:
+                    legs[source] = legs[node] + 1
+                    queue.append(source)
+
+        return legs
+
+    def _next_departure(self, edge: int, ready: int, first_day: int, latest: int):
+        """Earliest departure of edge at or after ready (absolute minutes), None if later than latest."""
+        minute = self.dep_minutes[edge]
+        day = ready // MINUTES_PER_DAY
+        if day * MINUTES_PER_DAY + minute < ready:
+            day += 1
+
+        mask = self.days[edge]
+        for _ in range(7):
+            departure = day * MINUTES_PER_DAY + minute
+            if departure > latest:
+                return None
+            if mask >> ((first_day + day) % 7) & 1:
+                return departure
+            day += 1
+
+        return None
+
+    def connections(
+        self,
+        origin: str,
+        destination: str,
+        day: int | date,
+        earliest: int = 0,
+        max_stops: int = 1,
+        min_connection: int = MIN_CONNECTION,
+        max_connection: int = MAX_CONNECTION,
+        max_results: int = 10,
+    ) -> list[list[Leg]]:
+        """
+        Itineraries from origin to destination departing on the given day, earliest arrival first. A time dependent
+        Dijkstra search over (airport, arrival time) labels, each airport being settled at most max_results times.
+
+        Parameters
+        ----------
+        origin: Departure airport IATA code
+        destination: Arrival airport IATA code
+        day: Departure date, or day of the week (0 is Sunday)
+        earliest: Earliest departure, minutes after midnight (UTC)
+        max_stops: Maximum number of intermediate stops
+        min_connection: Minimum connection time in minutes
+        max_connection: Maximum connection time in minutes
+        max_results: Maximum number of itineraries returned
+
+        Returns
+        -------
+        Itineraries as lists of legs, leg times in minutes from midnight at the start of the departure day
+        """
+        start = self.index.get(origin.upper())
+        target = self.index.get(destination.upper())
+        if start is None or target is None:
+            return []
+
+        first_day = weekday(day) if isinstance(day, date) else day
+        max_legs = max_stops + 1
+        # Only airports that can still reach the destination within the remaining legs are expanded
+        legs_to = self.legs_to(target, max_legs)
+        if start not in legs_to:
+            return []
+
+        settled = [0] * len(self.airports)
+        results = []
+
+        # (arrival time, legs taken, node, legs as edge/departure pairs)
+        heap = [(earliest, 0, start, ())]
+        while heap and len(results) < max_results:
+            arrival, n_legs, node, legs = heapq.heappop(heap)
+
+            if node == target:
+                results.append(self._legs(legs))
+                continue
+            if settled[node] >= max_results:
+                continue
+            settled[node] += 1
+
+            visited = {start} | {self.targets[edge] for edge, _ in legs}
+            if legs:
+                ready, latest = arrival + min_connection, arrival + max_connection
+            else:
+                ready, latest = earliest, MINUTES_PER_DAY - 1
+
+            remaining = max_legs - n_legs - 1
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                next_node = self.targets[edge]
+                if legs_to.get(next_node, max_legs) > remaining or next_node in visited:
+                    continue
+
+                departure = self._next_departure(edge, ready, first_day, latest)
+                if departure is None:
+                    continue
+
+                heapq.heappush(
+                    heap,
+                    (
+                        departure + self.durations[edge],
+                        n_legs + 1,
+                        next_node,
+                        legs + ((edge, departure),),
+                    ),
+                )
+
+        return results
+
+    def _legs(self, legs: tuple) -> list[Leg]:
+        out = []
+        for edge, departure in legs:
+            out.append(
+                Leg(
+                    flight=self.flights[edge],
+                    dep_iata=self.airports[self.sources[edge]],
+                    arr_iata=self.airports[self.targets[edge]],
+                    dep=departure,
+                    arr=departure + self.durations[edge],
+                )
+            )
+
+        return out
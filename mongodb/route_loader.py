@@ -0,0 +1,183 @@
+import logging
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Iterable, Optional
+
+from pydantic import TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from pymongo.database import Database
+from typing_extensions import NotRequired, TypedDict
+
+from packages.shared.mongodb.routes import get_routes
+from packages.shared.mongodb.schemas import DAY_MAPPING, Route
+from packages.shared.utils.dates import days_mask
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000
+# Written alongside the Route fields, a bitmask of days (bit n set for day n, 0 is Sunday) for $bitsAnySet
+DAYS_MASK_FIELD = "days_mask"
+
+
+class LoadResult:
+    def __init__(self):
+        self.read = 0
+        self.rejected = 0
+        self.upserted = 0
+        self.modified = 0
+        self.matched = 0
+        self.seconds = 0.0
+
+    @property
+    def written(self) -> int:
+        return self.read - self.rejected
+
+    @property
+    def rate(self) -> float:
+        """Routes written per second"""
+        return self.written / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (
+            f"LoadResult(read={self.read}, rejected={self.rejected}, upserted={self.upserted}, "
+            f"modified={self.modified}, seconds={self.seconds:.2f}, rate={self.rate:.0f}/s)"
+        )
+
+
+@lru_cache(maxsize=1024)
+def parse_days(days: tuple) -> tuple[list[int], int]:
+    """
+    Route days (day names e.g. "mon" or day numbers, 0 is Sunday) as day numbers and a bitmask. Schedules repeat a
+    small number of day combinations, so each is only converted once.
+    """
+    values = [day if isinstance(day, int) else DAY_MAPPING[day] for day in days]
+    return values, days_mask(values)
+
+
+@lru_cache
+def _records_adapter() -> TypeAdapter:
+    # Route fields without the Route validators (applied per batch in prepare_routes), days are converted separately
+    fields = {
+        name: NotRequired[Any if name == "days" else field.annotation]
+        for name, field in Route.model_fields.items()
+    }
+    return TypeAdapter(list[TypedDict("RouteRecord", fields)])
+
+
+def prepare_routes(
+    records: list[dict], updated: Optional[str] = None
+) -> tuple[list[dict], int]:
+    """
+    Validate a batch of route records, equivalent to validating each record with Route but in a single validation
+    call, with day names converted once per distinct set of days (see parse_days).
+
+    Parameters
+    ----------
+    records: Raw route records (dicts)
+    updated: Value for Route.updated where records do not have one
+
+    Returns
+    -------
+    Valid routes as documents (with days as day numbers and days_mask set), number of records rejected
+    """
+    n = len(records)
+    adapter = _records_adapter()
+    try:
+        validated = adapter.validate_python(records)
+    except ValidationError as e:
+        # Drop the invalid records and validate the rest of the batch
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+        records = [record for i, record in enumerate(records) if i not in invalid]
+        validated = adapter.validate_python(records)
+
+    defaults = dict.fromkeys(Route.model_fields)
+    routes = []
+    for record in validated:
+        # Route.root_validate
+        if not (record.get("flight_iata") or record.get("flight_icao")):
+            continue
+
+        route = {**defaults, **record}
+        if route["days"] is not None:
+            try:
+                route["days"], route[DAYS_MASK_FIELD] = parse_days(tuple(route["days"]))
+            except (KeyError, TypeError):
+                continue
+        else:
+            route[DAYS_MASK_FIELD] = None
+
+        if updated is not None and not route["updated"]:
+            route["updated"] = updated
+
+        routes.append(route)
+
+    return routes, n - len(routes)
+
+
+def route_key(route: dict) -> dict:
+    """
+    Upsert filter for a route: the flight number (IATA, else ICAO) and departure airport, as a flight number can cover
+    more than one leg.
+    """
+    field = "flight_iata" if route.get("flight_iata") else "flight_icao"
+    return {field: route[field], "dep_iata": route.get("dep_iata")}
+
+
+def load_routes(
+    db: Database,
+    records: Iterable[dict],
+    batch_size: int = BATCH_SIZE,
+    updated: Optional[str] = None,
+) -> LoadResult:
+    """
+    Bulk load route records (e.g. an airline schedule) into the routes collection, validated in batches (see
+    prepare_routes) and upserted with unordered bulk writes. Invalid records are skipped and counted as rejected.
+    Upserts are keyed by route_key, backed by the flight number indexes in ROUTE_INDEXES.
+
+    Parameters
+    ----------
+    db: Database
+    records: Route records, consumed batch_size at a time
+    batch_size: Records validated and written per bulk write
+    updated: Route.updated value for records without one, default the load start time (UTC ISO format)
+
+    Returns
+    -------
+    Load counts and throughput
+    """
+    if updated is None:
+        updated = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    collection = get_routes(db)
+    result = LoadResult()
+    start = time.perf_counter()
+
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        routes, rejected = prepare_routes(batch, updated=updated)
+        result.read += len(batch)
+        result.rejected += rejected
+
+        if routes:
+            write = collection.bulk_write(
+                [
+                    UpdateOne(route_key(route), {"$set": route}, upsert=True)
+                    for route in routes
+                ],
+                ordered=False,
+            )
+            result.upserted += write.upserted_count
+            result.modified += write.modified_count
+            result.matched += write.matched_count
+
+        result.seconds = time.perf_counter() - start
+        LOGGER.info(
+            "Loaded %s routes (%.0f/s), %s rejected",
+            result.read,
+            result.rate,
+            result.rejected,
+        )
+
+    return result
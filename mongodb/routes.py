@@ -0,0 +1,190 @@
+from typing import Any, Iterable, Literal, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.collection import Collection
+from pymongo.cursor import Cursor
+from pymongo.database import Database
+
+from packages.shared.mongodb.schemas import Route
+from packages.shared.utils.dates import days_filter, days_mask
+
+ROUTES_COLLECTION = "routes"
+
+ROUTE_INDEXES = [
+    IndexModel(
+        [("dep_iata", ASCENDING), ("arr_iata", ASCENDING), ("days", ASCENDING)],
+        name="dep_iata_arr_iata_days",
+    ),
+    # arr_iata prefix for arrival lookups, dep_iata included so arrival link queries are covered
+    IndexModel(
+        [("arr_iata", ASCENDING), ("dep_iata", ASCENDING)], name="arr_iata_dep_iata"
+    ),
+    IndexModel([("airline_iata", ASCENDING)], name="airline_iata"),
+    # Freshness tracking of derived data (see mongodb.connections)
+    IndexModel([("updated", DESCENDING)], name="updated"),
+    # Bulk load upsert keys (see mongodb.route_loader)
+    IndexModel(
+        [("flight_iata", ASCENDING), ("dep_iata", ASCENDING)],
+        name="flight_iata_dep_iata",
+    ),
+    IndexModel(
+        [("flight_icao", ASCENDING), ("dep_iata", ASCENDING)],
+        name="flight_icao_dep_iata",
+    ),
+]
+
+# Route documents without the ObjectId, which Route does not model
+ROUTE_PROJECTION = {"_id": 0}
+# Only indexed (non-array) fields, so link queries are answered from the index alone
+LINK_PROJECTION = {"_id": 0, "dep_iata": 1, "arr_iata": 1}
+
+Direction = Literal["dep", "arr"]
+Codes = str | Iterable[str]
+
+
+def get_routes(db: Database) -> Collection:
+    return db[ROUTES_COLLECTION]
+
+
+def ensure_route_indexes(db: Database) -> list[str]:
+    """
+    Create the route indexes if they do not already exist (no-op for existing indexes).
+
+    Returns
+    -------
+    Names of the route indexes
+    """
+    return get_routes(db).create_indexes(ROUTE_INDEXES)
+
+
+def missing_route_indexes(db: Database) -> list[str]:
+    existing = set(get_routes(db).index_information())
+    return [
+        index.document["name"]
+        for index in ROUTE_INDEXES
+        if index.document["name"] not in existing
+    ]
+
+
+def codes_filter(value: Codes):
+    if isinstance(value, str):
+        return value.upper()
+
+    return {"$in": [code.upper() for code in value]}
+
+
+def route_filter(
+    dep_iata: Optional[Codes] = None,
+    arr_iata: Optional[Codes] = None,
+    days: Optional[Iterable[int]] = None,
+    airline_iata: Optional[Codes] = None,
+) -> dict[str, Any]:
+    """
+    Build a routes query restricted to indexed fields, fields left as None are not filtered on.
+
+    Parameters
+    ----------
+    dep_iata: Departure airport IATA code(s)
+    arr_iata: Arrival airport IATA code(s)
+    days: Days of the week (0 is Sunday), matching routes operating on any of them
+    airline_iata: Airline IATA code(s)
+
+    Returns
+    -------
+    MongoDB filter document
+    """
+    query = {}
+    if dep_iata is not None:
+        query["dep_iata"] = codes_filter(dep_iata)
+    if arr_iata is not None:
+        query["arr_iata"] = codes_filter(arr_iata)
+    if days is not None:
+        query.update(days_filter(days_mask(days)))
+    if airline_iata is not None:
+        query["airline_iata"] = codes_filter(airline_iata)
+
+    return query
+
+
+def find_routes(
+    db: Database,
+    dep_iata: Optional[Codes] = None,
+    arr_iata: Optional[Codes] = None,
+    days: Optional[Iterable[int]] = None,
+    airline_iata: Optional[Codes] = None,
+    sort_by: Optional[str] = None,
+    sort_order: int = ASCENDING,
+    limit: int = 0,
+    page: int = 0,
+) -> list[Route]:
+    query = route_filter(dep_iata, arr_iata, days, airline_iata)
+    if not query:
+        raise ValueError("At least one route filter must be specified")
+
+    cursor = get_routes(db).find(query, ROUTE_PROJECTION)
+    if sort_by is not None:
+        cursor = cursor.sort(sort_by, sort_order)
+    if limit:
+        cursor = cursor.skip(page * limit).limit(limit)
+
+    return [Route(**route) for route in cursor]
+
+
+def count_routes(
+    db: Database,
+    dep_iata: Optional[Codes] = None,
+    arr_iata: Optional[Codes] = None,
+    days: Optional[Iterable[int]] = None,
+    airline_iata: Optional[Codes] = None,
+) -> int:
+    return get_routes(db).count_documents(
+        route_filter(dep_iata, arr_iata, days, airline_iata)
+    )
+
+
+def find_links(db: Database, iata: Codes, direction: Direction = "dep") -> Cursor:
+    """
+    Covered query for the (dep_iata, arr_iata) pairs departing from (direction="dep") or arriving at
+    (direction="arr") the given airport(s).
+    """
+    field = "dep_iata" if direction == "dep" else "arr_iata"
+    return get_routes(db).find({field: codes_filter(iata)}, LINK_PROJECTION)
+
+
+def connected_airports(
+    db: Database, iata: Codes, direction: Direction = "dep"
+) -> list[str]:
+    """
+    Distinct airports reachable from (direction="dep") or flying into (direction="arr") the given airport(s),
+    read from the index.
+    """
+    field, other = (
+        ("dep_iata", "arr_iata") if direction == "dep" else ("arr_iata", "dep_iata")
+    )
+    return get_routes(db).distinct(other, {field: codes_filter(iata)})
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def plan_stages(cursor: Cursor) -> list[str]:
+    """
+    Stages of the winning query plan for the cursor, e.g. ["PROJECTION_COVERED", "IXSCAN"].
+    """
+    winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+    return [stage for stage in _plan_stages(winning_plan) if stage is not None]
+
+
+def is_collection_scan(cursor: Cursor) -> bool:
+    return "COLLSCAN" in plan_stages(cursor)
+
+
+def is_covered(cursor: Cursor) -> bool:
+    stages = plan_stages(cursor)
+    return "FETCH" not in stages and "COLLSCAN" not in stages
@@ -1,38 +1,45 @@
 from typing import Optional, Union
 
-from pydantic import BaseModel, root_validator, validator
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator
+
+DAY_MAPPING = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
 
 
 class TotalRoutes(BaseModel):
     num_flights: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Route(BaseModel):
-    airline_iata: Optional[str]
-    airline_icao: Optional[str]
-    flight_number: Optional[str]
-    flight_iata: Optional[str]
-    flight_icao: Optional[str]
-    dep_iata: Optional[str]
-    dep_icao: Optional[str]
-    dep_time_utc: Optional[str]
-    dep_time: Optional[str]
-    arr_iata: Optional[str]
-    arr_icao: Optional[str]
-    arr_time_utc: Optional[str]
-    arr_time: Optional[str]
-    duration: Optional[int]
-    days: Optional[list[int]]
-    aircraft_icao: Optional[str]
-    updated: Optional[str]
-
-    @root_validator(pre=True)
+    airline_iata: Optional[str] = None
+    airline_icao: Optional[str] = None
+    flight_number: Optional[str] = None
+    flight_iata: Optional[str] = None
+    flight_icao: Optional[str] = None
+    dep_iata: Optional[str] = None
+    dep_icao: Optional[str] = None
+    dep_time_utc: Optional[str] = None
+    dep_time: Optional[str] = None
+    arr_iata: Optional[str] = None
+    arr_icao: Optional[str] = None
+    arr_time_utc: Optional[str] = None
+    arr_time: Optional[str] = None
+    duration: Optional[int] = None
+    days: Optional[list[int]] = None
+    aircraft_icao: Optional[str] = None
+    updated: Optional[str] = None
+
+    @model_validator(mode="before")
+    @classmethod
     def root_validate(cls, values):
-        icao = values.get("flight_icao")
-        iata = values.get("flight_iata")
+        if isinstance(values, dict):
+            icao = values.get("flight_icao")
+            iata = values.get("flight_iata")
+        else:
+            # Validating from attributes (or a model instance)
+            icao = getattr(values, "flight_icao", None)
+            iata = getattr(values, "flight_iata", None)
 
         if not any((icao, iata)):
             raise ValueError(
@@ -41,10 +48,13 @@ class Route(BaseModel):
 
         return values
 
-    @validator("days", pre=True)
+    @field_validator("days", mode="before")
+    @classmethod
     def days_validate(cls, values):
-        mapping = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
-        return [mapping[val] if not isinstance(val, int) else val for val in values]
+        if values is None:
+            return values
+
+        return [DAY_MAPPING[val] if not isinstance(val, int) else val for val in values]
 
 
 class Location(BaseModel):
@@ -57,16 +67,22 @@ class Distance(BaseModel):
 
 
 class Airport(BaseModel):
-    iata_code: Optional[str]
-    icao_code: Optional[str]
-    name: Optional[str]
-    country_code: Optional[str]
-    location: Optional[Location]
-
-    @root_validator(pre=True)
+    iata_code: Optional[str] = None
+    icao_code: Optional[str] = None
+    name: Optional[str] = None
+    country_code: Optional[str] = None
+    location: Optional[Location] = None
+
+    @model_validator(mode="before")
+    @classmethod
     def root_validate(cls, values):
-        icao = values.get("icao_code")
-        iata = values.get("iata_code")
+        if isinstance(values, dict):
+            icao = values.get("icao_code")
+            iata = values.get("iata_code")
+        else:
+            # Validating from attributes (or a model instance)
+            icao = getattr(values, "icao_code", None)
+            iata = getattr(values, "iata_code", None)
 
         if not any((icao, iata)):
             raise ValueError(
@@ -81,15 +97,13 @@ class AirportOutput(Airport):
     num_dep: Optional[int] = None
     num_arr: Optional[int] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AirportDistOutput(AirportOutput):
     dist: Distance
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class NumAirportConnectionsOutput(BaseModel):
@@ -99,13 +113,11 @@ class NumAirportConnectionsOutput(BaseModel):
         Airport, str
     ]  # If airport not found in database, output identifier instead
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AirportConnectionsOutput(AirportOutput):
     dep_links: list[Route]
     arr_links: list[Route]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
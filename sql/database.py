@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
-from sqlalchemy_utils import create_database, database_exists
+from sqlalchemy.schema import CreateColumn
 
 from packages.config import global_settings
 
@@ -9,10 +10,8 @@ DATABASE_URI = (
     f"@{global_settings.db_host}:{global_settings.db_port}/{global_settings.db_name}"
 )
 
-# create the postgres database engine
+# create the postgres database engine, which connects on first use (the database and tables are created by models)
 engine = create_engine(DATABASE_URI)
-if not database_exists(engine.url):
-    create_database(engine.url)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -58,3 +57,82 @@ def get_or_add(session: Session, model, commit: bool = True, **kwargs):
             session.commit()
 
         return instance
+
+
+def add_missing_columns(engine: Engine, metadata: MetaData):
+    """
+    Add columns (and indexes) defined on existing tables since they were created, which create_all does not do.
+    Columns are added as defined, so new columns must be nullable or have a server default.
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    definition = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN IF NOT EXISTS {definition}"
+                        )
+                    )
+
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def sync_sequences(engine: Engine, metadata: MetaData):
+    """
+    Advance serial primary key sequences past the largest id in each table, e.g. after rows were inserted with
+    explicit ids. Sequences are never moved backwards. Sequences are first checked without locking, only tables whose
+    sequence is behind are locked against writes (reads continue) while it is set, so ids issued by concurrent inserts
+    are not handed out again. Usually none are, so workers importing models at startup do not block each other.
+    """
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as conn:
+        behind = []
+        for table in metadata.sorted_tables:
+            column = table.autoincrement_column
+            if column is None:
+                continue
+
+            sequence = conn.execute(
+                text("SELECT pg_get_serial_sequence(:table, :column)"),
+                {"table": table.name, "column": column.name},
+            ).scalar()
+            if sequence is None:
+                continue
+
+            max_id = f"SELECT COALESCE(MAX({preparer.quote(column.name)}), 0) FROM {preparer.format_table(table)}"
+            if conn.execute(
+                text(
+                    f"SELECT ({max_id}) > "
+                    f"COALESCE(pg_sequence_last_value(CAST(:sequence AS regclass)), 0)"
+                ),
+                {"sequence": sequence},
+            ).scalar():
+                behind.append((table, sequence, max_id))
+
+        if not behind:
+            return
+
+        # EXCLUSIVE conflicts with the ROW EXCLUSIVE lock inserts take before drawing ids from a sequence, so none can
+        # draw one between reading last_value and setval below. Locked in one statement, in a fixed order.
+        tables = ", ".join(preparer.format_table(table) for table, _, _ in behind)
+        conn.execute(text(f"LOCK TABLE {tables} IN EXCLUSIVE MODE"))
+
+        for table, sequence, max_id in behind:
+            # Rechecked under the lock, ids may have been drawn since
+            conn.execute(
+                text(
+                    f"SELECT setval(:sequence, GREATEST(({max_id}), "
+                    f"COALESCE(pg_sequence_last_value(CAST(:sequence AS regclass)), 0), 1))"
+                ),
+                {"sequence": sequence},
+            )
@@ -0,0 +1,235 @@
+import csv
+import json
+import logging
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+from sqlalchemy import Integer, case, cast, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from packages.shared.sql import models
+
+LOGGER = logging.getLogger(__name__)
+
+BASE_CURRENCY = "USD"
+# Seconds the converter's rates are cached for before being reloaded from the database
+RATES_TTL = 60 * 60
+
+
+class FxConverter:
+    """
+    In memory lookup of FX rates (units of currency per US dollar) by currency and date, using the latest rate on or
+    before the date.
+
+    Parameters
+    ----------
+    rates: Rates by currency, as (date, rate) pairs in any order
+    """
+
+    def __init__(self, rates: dict[str, Iterable[tuple[date, float]]]):
+        self._dates: dict[str, list[date]] = {}
+        self._rates: dict[str, list[float]] = {}
+        for currency, pairs in rates.items():
+            pairs = sorted(pairs)
+            self._dates[currency] = [d for d, _ in pairs]
+            self._rates[currency] = [r for _, r in pairs]
+
+        self.loaded = time.monotonic()
+        self._unknown: set[str] = set()
+
+    @classmethod
+    def from_db(cls, conn: Connection | Session) -> "FxConverter":
+        table = models.FxRate.__table__
+        rates: dict[str, list[tuple[date, float]]] = {}
+        for currency, day, rate in conn.execute(
+            select(table.c.currency, table.c.date, table.c.rate)
+        ):
+            rates.setdefault(currency, []).append((day, rate))
+
+        return cls(rates)
+
+    def rate(self, currency: str, on: Optional[date] = None) -> Optional[float]:
+        """Units of currency per US dollar on a date (default today), None if there is no rate on or before it."""
+        currency = currency.upper()
+        if currency == BASE_CURRENCY:
+            return 1.0
+
+        dates = self._dates.get(currency)
+        if dates is None:
+            if currency not in self._unknown:
+                self._unknown.add(currency)
+                LOGGER.warning("No FX rates for currency: %s", currency)
+            return None
+
+        if on is None:
+            on = date.today()
+        elif isinstance(on, datetime):
+            on = on.date()
+
+        i = bisect_right(dates, on)
+        return self._rates[currency][i - 1] if i else None
+
+    def to_usd(
+        self, price: Optional[int], currency: str, on: Optional[date] = None
+    ) -> Optional[int]:
+        """Price in US dollars (rounded), None if the price or rate is unknown."""
+        rate = self.rate(currency, on)
+        if price is None or rate is None:
+            return None
+
+        return round(price / rate)
+
+
+_converter: Optional[FxConverter] = None
+_converter_lock = threading.Lock()
+
+
+def converter(conn: Connection | Session) -> FxConverter:
+    """Shared FxConverter, reloaded from the database (through conn) every RATES_TTL seconds."""
+    global _converter
+
+    with _converter_lock:
+        if _converter is None or time.monotonic() - _converter.loaded > RATES_TTL:
+            _converter = FxConverter.from_db(conn)
+
+        return _converter
+
+
+def clear_converter():
+    """Reload the shared converter on next use, e.g. after rates are loaded."""
+    global _converter
+
+    with _converter_lock:
+        _converter = None
+
+
+def read_rates(path: Path) -> list[dict]:
+    """
+    Read FX rates from a file, either:
+        - CSV with header date,currency,rate
+        - JSON object (or list of objects) {"date": "2024-01-31", "base": "USD", "rates": {"EUR": 0.92, ...}}, as
+          published by most FX rate services. Rates in another base currency are converted to US dollars, which must
+          then be included in the rates.
+
+    Rates are units of currency per US dollar.
+
+    Returns
+    -------
+    Rates as dicts of currency, date and rate
+    """
+    if path.suffix.lower() == ".csv":
+        with Path.open(path, newline="") as f:
+            return [
+                {
+                    "currency": row["currency"].strip().upper(),
+                    "date": date.fromisoformat(row["date"].strip()),
+                    "rate": float(row["rate"]),
+                }
+                for row in csv.DictReader(f)
+            ]
+
+    with Path.open(path) as f:
+        data = json.load(f)
+
+    rows = []
+    for day in data if isinstance(data, list) else [data]:
+        rates = {currency.upper(): rate for currency, rate in day["rates"].items()}
+        base = day.get("base", BASE_CURRENCY).upper()
+        if base != BASE_CURRENCY:
+            if BASE_CURRENCY not in rates:
+                raise ValueError(
+                    f"{path}: rates in {base} do not include {BASE_CURRENCY}"
+                )
+            usd = rates.pop(BASE_CURRENCY)
+            rates = {currency: rate / usd for currency, rate in rates.items()}
+            rates[base] = 1 / usd
+
+        on = date.fromisoformat(day["date"])
+        rows.extend(
+            {"currency": currency, "date": on, "rate": float(rate)}
+            for currency, rate in rates.items()
+            if currency != BASE_CURRENCY
+        )
+
+    return rows
+
+
+def load_rates(session: Session, paths: Iterable[Path]) -> int:
+    """
+    Load FX rates from files (see read_rates) into fx_rate, replacing existing rates for the same currency and date,
+    and commit. The shared converter is reloaded on next use.
+
+    Returns
+    -------
+    Number of rates loaded
+    """
+    # Later files take precedence, an upsert can not update the same row twice
+    rows = {
+        (row["currency"], row["date"]): row
+        for path in paths
+        for row in read_rates(path)
+    }
+    rows = list(rows.values())
+    if not rows:
+        return 0
+
+    table = models.FxRate.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.currency, table.c.date],
+        set_={"rate": stmt.excluded.rate},
+    )
+    session.execute(stmt, rows)
+    session.commit()
+    clear_converter()
+
+    LOGGER.info("Loaded %s FX rates", len(rows))
+    return len(rows)
+
+
+def fill_price_usd(session: Session, request_id: Optional[int] = None) -> int:
+    """
+    Convert prices of results without price_usd (inserted without a rate available, or outside the ORM) in SQL, using
+    the latest rate on or before each result's timestamp. Changes are not committed.
+
+    Parameters
+    ----------
+    session: Database session
+    request_id: Only convert results of this request, default all
+
+    Returns
+    -------
+    Number of results updated
+    """
+    result = models.RequestJourney.__table__
+    fx_rate = models.FxRate.__table__
+
+    rate = (
+        select(fx_rate.c.rate)
+        .where(
+            fx_rate.c.currency == func.upper(result.c.currency),
+            fx_rate.c.date <= cast(result.c.timestamp, fx_rate.c.date.type),
+        )
+        .order_by(fx_rate.c.date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    price_usd = case(
+        (func.upper(result.c.currency) == BASE_CURRENCY, result.c.price),
+        else_=cast(func.round(result.c.price / rate), Integer),
+    )
+    stmt = (
+        update(result)
+        .where(result.c.price_usd.is_(None), price_usd.is_not(None))
+        .values(price_usd=price_usd)
+    )
+    if request_id is not None:
+        stmt = stmt.where(result.c.request_id == request_id)
+
+    return session.execute(stmt).rowcount
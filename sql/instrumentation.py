@@ -0,0 +1,236 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from packages.shared.sql.database import engine as default_engine
+from packages.shared.utils import context
+
+LOGGER = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD = 0.5  # seconds
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+class QueryStats:
+    """Running statement totals for a single request (or for unattributed work, keyed by None)."""
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+        self.rows = 0
+
+    def add(self, duration: float, rows: int):
+        self.statements += 1
+        self.duration += duration
+        self.rows += rows
+
+    def __repr__(self):
+        return f"QueryStats(statements={self.statements}, duration={self.duration:.4f}s, rows={self.rows})"
+
+
+class SlowQuery:
+    def __init__(
+        self,
+        request_id: Optional[int],
+        statement: str,
+        parameters,
+        duration: float,
+        plan: Optional[list[str]] = None,
+    ):
+        self.request_id = request_id
+        self.statement = statement
+        self.parameters = parameters
+        self.duration = duration
+        self.plan = plan
+
+    def __repr__(self):
+        return f"SlowQuery(request_id={self.request_id}, duration={self.duration:.4f}s, statement={self.statement!r})"
+
+
+class QueryRecorder:
+    """
+    Opt-in SQLAlchemy cursor hooks recording statement counts, time spent and rows returned per request.
+    Work is attributed to the request id set via utils.context.request_context (as done by Job), statements executed
+    outside any request context are recorded under None.
+
+    Parameters
+    ----------
+    slow_threshold: Statements taking at least this long (seconds) are added to the slow query log
+    explain: Whether to capture the (non-analyzed) EXPLAIN plan of slow statements
+    max_slow: Maximum number of slow queries retained, oldest are discarded first
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float = SLOW_QUERY_THRESHOLD,
+        explain: bool = True,
+        max_slow: int = 100,
+    ):
+        self.slow_threshold = slow_threshold
+        self.explain = explain
+        self.stats: defaultdict[Optional[int], QueryStats] = defaultdict(QueryStats)
+        self.slow_queries: deque[SlowQuery] = deque(maxlen=max_slow)
+        self.engine: Optional[Engine] = None
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine = default_engine):
+        if self.engine is not None:
+            raise RuntimeError("Recorder is already attached to an engine")
+
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        self.engine = engine
+
+        return self
+
+    def detach(self):
+        if self.engine is None:
+            return
+
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(self.engine, "handle_error", self._handle_error)
+        self.engine = None
+
+    def get(self, request_id: Optional[int] = None) -> QueryStats:
+        with self._lock:
+            return self.stats[request_id]
+
+    def total(self) -> QueryStats:
+        total = QueryStats()
+        with self._lock:
+            for stats in self.stats.values():
+                total.statements += stats.statements
+                total.duration += stats.duration
+                total.rows += stats.rows
+
+        return total
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.slow_queries.clear()
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context_, executemany
+    ):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context_, executemany
+    ):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        request_id = context.request_id.get()
+        # DBAPI rowcount is -1 where not determinable, for SELECTs psycopg2 reports the number of rows returned
+        rows = max(cursor.rowcount, 0)
+
+        with self._lock:
+            self.stats[request_id].add(duration, rows)
+
+        if duration >= self.slow_threshold:
+            plan = None
+            if self.explain and not executemany:
+                plan = self._explain(cursor, statement, parameters)
+
+            with self._lock:
+                self.slow_queries.append(
+                    SlowQuery(request_id, statement, parameters, duration, plan)
+                )
+
+            LOGGER.warning(
+                "Slow query (%.3fs) [Request: %s]: %s", duration, request_id, statement
+            )
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+    @staticmethod
+    def _explain(cursor, statement: str, parameters) -> Optional[list[str]]:
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return None
+
+        # Run inside a savepoint so a failing EXPLAIN cannot abort the caller's transaction
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute("SAVEPOINT query_explain")
+            try:
+                explain_cursor.execute(f"EXPLAIN {statement}", parameters)
+                plan = [row[0] for row in explain_cursor.fetchall()]
+            except Exception:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT query_explain")
+                raise
+            finally:
+                explain_cursor.execute("RELEASE SAVEPOINT query_explain")
+        except Exception as e:
+            LOGGER.debug("Unable to explain slow query: %s", e)
+            plan = None
+        finally:
+            explain_cursor.close()
+
+        return plan
+
+
+@contextmanager
+def record_queries(engine: Engine = default_engine, **kwargs):
+    """
+    Attach a QueryRecorder to the engine for the duration of the block.
+
+    Parameters
+    ----------
+    engine: Engine to instrument (default package engine)
+    kwargs: Passed to QueryRecorder
+
+    Returns
+    -------
+    recorder: attached QueryRecorder, still readable after the block exits
+    """
+    recorder = QueryRecorder(**kwargs).attach(engine)
+    try:
+        yield recorder
+    finally:
+        recorder.detach()
+
+
+@contextmanager
+def assert_query_budget(
+    max_statements: int,
+    max_duration: Optional[float] = None,
+    request_id: Optional[int] = None,
+    engine: Engine = default_engine,
+):
+    """
+    Test helper asserting the statements executed within the block stay within budget, e.g.
+
+        with assert_query_budget(3):
+            job.update_status("finished")
+
+    Parameters
+    ----------
+    max_statements: Maximum number of statements allowed
+    max_duration: Optional maximum total database time (seconds)
+    request_id: Only count statements attributed to this request (default counts all statements)
+    engine: Engine to instrument (default package engine)
+    """
+    with record_queries(engine, slow_threshold=float("inf"), explain=False) as recorder:
+        yield recorder
+
+    stats = recorder.total() if request_id is None else recorder.get(request_id)
+
+    if stats.statements > max_statements:
+        raise AssertionError(
+            f"Query budget exceeded: {stats.statements} statements executed, budget {max_statements}"
+        )
+
+    if max_duration is not None and stats.duration > max_duration:
+        raise AssertionError(
+            f"Query budget exceeded: {stats.duration:.4f}s database time, budget {max_duration}s"
+        )
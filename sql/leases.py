@@ -0,0 +1,167 @@
+from datetime import timedelta
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from packages.shared.sql import models, schemas
+from packages.shared.sql.database import engine
+from packages.shared.utils.construct import construct_trusted
+from packages.shared.utils.context import default_worker_id
+
+LEASE_DURATION = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+# Requests submitted to be claimed (see job.submit_requests), others (e.g. published to a queue) are never claimed
+QUEUED_STATUS = "queued"
+RUNNING_STATUS = "running"
+FINISHED_STATUS = "finished"
+FAILED_STATUS = "failed"
+
+
+def default_owner() -> str:
+    return default_worker_id()
+
+
+def _claimable(max_attempts: int):
+    request = models.Request.__table__
+    expired = (request.c.status == RUNNING_STATUS) & (
+        request.c.lease_expires < func.now()
+    )
+    return ((request.c.status == QUEUED_STATUS) | expired) & (
+        request.c.attempts < max_attempts
+    )
+
+
+def claim_requests(
+    owner: str,
+    n: int = 1,
+    lease: timedelta = LEASE_DURATION,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> list[schemas.Request]:
+    """
+    Claim up to n queued requests (or requests whose lease has expired), oldest first. Rows locked by other claimants
+    are skipped rather than waited on, so any number of workers can claim concurrently without claiming the same
+    request twice.
+
+    Parameters
+    ----------
+    owner: Identifier of the claiming worker e.g. default_owner()
+    n: Maximum number of requests to claim
+    lease: Time the requests are held for without a heartbeat
+    max_attempts: Requests claimed this many times already are not claimed again
+
+    Returns
+    -------
+    Claimed requests, with status "running"
+    """
+    request = models.Request.__table__
+    candidates = (
+        select(request.c.id)
+        .where(_claimable(max_attempts))
+        .order_by(request.c.id)
+        .limit(n)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(request)
+        .where(request.c.id.in_(candidates.scalar_subquery()))
+        .values(
+            status=RUNNING_STATUS,
+            lease_owner=owner,
+            lease_expires=func.now() + lease,
+            heartbeat=func.now(),
+            attempts=request.c.attempts + 1,
+        )
+        .returning(*request.c)
+    )
+
+    with Session(engine) as session:
+        rows = session.execute(stmt).mappings().all()
+        session.commit()
+
+    requests = [construct_trusted(schemas.Request, row) for row in rows]
+    return sorted(requests, key=lambda r: r.id)
+
+
+def heartbeat(request_id: int, owner: str, lease: timedelta = LEASE_DURATION) -> bool:
+    """
+    Extend a lease.
+
+    Returns
+    -------
+    Whether the lease is still held, False if it expired and the request was requeued or claimed by another worker
+    """
+    request = models.Request.__table__
+    stmt = (
+        update(request)
+        .where(
+            request.c.id == request_id,
+            request.c.lease_owner == owner,
+            request.c.status == RUNNING_STATUS,
+        )
+        .values(lease_expires=func.now() + lease, heartbeat=func.now())
+        .returning(request.c.id)
+    )
+
+    with Session(engine) as session:
+        held = session.execute(stmt).scalar_one_or_none() is not None
+        session.commit()
+
+    return held
+
+
+def release(request_id: int, owner: str, status: str) -> bool:
+    """
+    Release a lease, setting the final status of the request e.g. "finished" (or QUEUED_STATUS to return it to the
+    queue).
+
+    Returns
+    -------
+    Whether the lease was still held (otherwise the status is not updated)
+    """
+    request = models.Request.__table__
+    stmt = (
+        update(request)
+        .where(request.c.id == request_id, request.c.lease_owner == owner)
+        .values(status=status, lease_owner=None, lease_expires=None)
+        .returning(request.c.id)
+    )
+
+    with Session(engine) as session:
+        held = session.execute(stmt).scalar_one_or_none() is not None
+        session.commit()
+
+    return held
+
+
+def requeue_expired(max_attempts: int = MAX_ATTEMPTS) -> int:
+    """
+    Return requests with expired leases (e.g. from crashed workers) to the queue, or mark them failed once they have
+    been attempted max_attempts times. Claiming also picks up expired leases, this clears them eagerly.
+
+    Returns
+    -------
+    Number of requests requeued or failed
+    """
+    request = models.Request.__table__
+    stmt = (
+        update(request)
+        .where(
+            request.c.status == RUNNING_STATUS,
+            request.c.lease_expires < func.now(),
+        )
+        .values(
+            status=case(
+                (request.c.attempts >= max_attempts, FAILED_STATUS),
+                else_=QUEUED_STATUS,
+            ),
+            lease_owner=None,
+            lease_expires=None,
+        )
+    )
+
+    with Session(engine) as session:
+        n = session.execute(stmt).rowcount
+        session.commit()
+
+    return n
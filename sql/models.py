@@ -1,8 +1,17 @@
+from datetime import date
+
 import sqlalchemy as sql
 from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql.expression import func
+from sqlalchemy_utils import create_database, database_exists
 
-from packages.shared.sql.database import Base, engine
+from packages.shared.sql.database import (
+    Base,
+    add_missing_columns,
+    engine,
+    sync_sequences,
+)
+from packages.shared.sql.partitions import ensure_partitions
 
 
 def truncate_string(*fields):
@@ -32,6 +41,26 @@ class Request(Base):
     sorted_by = sql.Column(sql.String(30))
     direct = sql.Column(sql.Boolean)
     timestamp = sql.Column(sql.TIMESTAMP(timezone=False), server_default=func.now())
+    # Client supplied, so retried submissions of the same request are only added once
+    idempotency_key = sql.Column(
+        sql.String(100), nullable=True, unique=True, index=True
+    )
+    # Worker leases (see leases)
+    lease_owner = sql.Column(sql.String(100), nullable=True)
+    lease_expires = sql.Column(sql.TIMESTAMP(timezone=False), nullable=True)
+    heartbeat = sql.Column(sql.TIMESTAMP(timezone=False), nullable=True)
+    attempts = sql.Column(sql.Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        # Only requests which can be claimed, so claiming does not scan finished requests
+        sql.Index(
+            "ix_request_claimable",
+            "id",
+            postgresql_where=sql.text("status IN ('queued', 'running')"),
+        ),
+        # Requests are appended in timestamp order, so a block range index is enough for time window queries
+        sql.Index("ix_request_timestamp", "timestamp", postgresql_using="brin"),
+    )
 
     results = relationship("RequestJourney", back_populates="request", lazy="joined")
 
@@ -51,6 +80,8 @@ class Journey(Base):
     stops = sql.Column(sql.Integer)
     stop_city = sql.Column(sql.String(30), nullable=True)
     airline = sql.Column(sql.String(40))
+    # Identifies the same journey across results and requests (see dedup.journey_hash)
+    hash = sql.Column(sql.String(32), nullable=True, index=True)
 
     flights = relationship("Flight", secondary="journey_flight", lazy="joined")
 
@@ -58,7 +89,12 @@ class Journey(Base):
 class RequestJourney(Base):
     __tablename__ = "request_journey"
 
-    id = sql.Column(sql.Integer, primary_key=True)
+    # Partitioned by month of timestamp (see partitions), which must be part of the primary key. Rows are therefore
+    # looked up by (id, timestamp), e.g. session.get(RequestJourney, (id, timestamp)), or queried by id.
+    id = sql.Column(sql.Integer, primary_key=True, autoincrement=True)
+    timestamp = sql.Column(
+        sql.TIMESTAMP(timezone=False), primary_key=True, server_default=func.now()
+    )
     # TODO: Unique constraint?
     request_id = sql.Column(sql.ForeignKey("request.id"))
     journey_id_1 = sql.Column(sql.ForeignKey("journey.id"))
@@ -66,11 +102,97 @@ class RequestJourney(Base):
 
     price = sql.Column(sql.Integer)
     currency = sql.Column(sql.String(3), default="USD")
+    # Price converted at the rate on the day of the result (see fx), None where no rate was available
+    price_usd = sql.Column(sql.Integer, nullable=True)
 
     request = relationship("Request", back_populates="results")
     journey_1 = relationship("Journey", foreign_keys=[journey_id_1], lazy="joined")
     journey_2 = relationship("Journey", foreign_keys=[journey_id_2], lazy="joined")
 
+    __table_args__ = (
+        sql.Index("ix_request_journey_request_id", "request_id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+@sql.event.listens_for(RequestJourney, "before_insert")
+def request_journey_timestamp(mapper, connection, target: RequestJourney):
+    # Results share the timestamp of their request where it is loaded, otherwise default to the time of insert, so
+    # result timestamps are never earlier than their request's
+    request = target.__dict__.get("request")
+    if target.timestamp is None and request is not None:
+        target.timestamp = request.timestamp
+
+
+@sql.event.listens_for(RequestJourney, "before_insert")
+def request_journey_price_usd(mapper, connection, target: RequestJourney):
+    from packages.shared.sql import fx
+
+    if target.price_usd is None and target.price is not None:
+        # Column defaults are only applied after this, currency defaults to USD
+        currency = target.currency or fx.BASE_CURRENCY
+        target.price_usd = fx.converter(connection).to_usd(
+            target.price, currency, target.timestamp
+        )
+
+
+class FxRate(Base):
+    __tablename__ = "fx_rate"
+
+    # Units of currency per US dollar from date (see fx.load_rates)
+    currency = sql.Column(sql.String(3), primary_key=True)
+    date = sql.Column(sql.Date, primary_key=True)
+    rate = sql.Column(sql.Float, nullable=False)
+
+
+class RequestCache(Base):
+    __tablename__ = "request_cache"
+
+    # Canonical request parameters (see request_cache.request_key)
+    key = sql.Column(sql.String(200), primary_key=True)
+    request_id = sql.Column(sql.ForeignKey("request.id"))
+    created = sql.Column(sql.TIMESTAMP(timezone=False), server_default=func.now())
+
+
+class PriceHistory(Base):
+    __tablename__ = "price_history"
+
+    # Price summary (in US dollars) of one request's results per travel dates (see price_history)
+    id = sql.Column(sql.Integer, primary_key=True)
+    request_id = sql.Column(sql.ForeignKey("request.id"))
+    dep_port = sql.Column(sql.String(20))
+    arr_port = sql.Column(sql.String(20))
+    dep_date = sql.Column(sql.Date)
+    ret_date = sql.Column(sql.Date, nullable=True)
+    observed_at = sql.Column(sql.TIMESTAMP(timezone=False))
+    currency = sql.Column(sql.String(3))
+    min_price = sql.Column(sql.Integer)
+    median_price = sql.Column(sql.Integer)
+    p90_price = sql.Column(sql.Integer)
+    n_results = sql.Column(sql.Integer)
+
+    __table_args__ = (
+        # Each request is only recorded once. One way trips (no ret_date) are compared by a placeholder date, as NULLs
+        # are distinct in unique indexes (NULLS NOT DISTINCT requires PostgreSQL 15)
+        sql.Index(
+            "uq_price_history_request",
+            "request_id",
+            "dep_date",
+            func.coalesce(ret_date, date.min),
+            "currency",
+            unique=True,
+        ),
+        # Newest first within route and travel dates, for latest price and trend lookups
+        sql.Index(
+            "ix_price_history_route",
+            "dep_port",
+            "arr_port",
+            "dep_date",
+            "ret_date",
+            observed_at.desc(),
+        ),
+    )
+
 
 # Not currently in use since get_or_add will see non-truncated schemas as new model entries.
 # class Flight(Base, truncate_string("number", "dep_port", "arr_port")):
@@ -95,7 +217,13 @@ class JourneyFlight(Base):
     flight_id = sql.Column(sql.ForeignKey("flight.id"), primary_key=True)
 
 
+if not database_exists(engine.url):
+    create_database(engine.url)
+
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, Base.metadata)
+sync_sequences(engine, Base.metadata)
+ensure_partitions(engine, RequestJourney.__table__)
 
 """
 class BestPrice(Base):
@@ -0,0 +1,306 @@
+import gzip
+import logging
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import Table, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Select
+
+LOGGER = logging.getLogger(__name__)
+
+# Partitions are created this many months ahead of the current month
+MONTHS_AHEAD = 2
+# Partitions older than this many months are archived by archive_partitions
+RETENTION_MONTHS = 24
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: Table, month: date) -> str:
+    return f"{table.name}_{month:%Y_%m}"
+
+
+def is_partitioned(conn: Connection, table: Table) -> bool:
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table.name},
+    ).scalar()
+    return kind == "p"
+
+
+def list_partitions(conn: Connection, table: Table) -> dict[date, str]:
+    """Monthly partitions of a table, by month start (parsed from partition_name)."""
+    names = conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": table.name},
+    ).scalars()
+
+    partitions = {}
+    for name in names:
+        try:
+            month = datetime.strptime(name[len(table.name) + 1 :], "%Y_%m").date()
+        except ValueError:
+            continue
+        partitions[month] = name
+
+    return partitions
+
+
+def default_partition_name(table: Table) -> str:
+    return f"{table.name}_default"
+
+
+def _exists(conn: Connection, name: str) -> bool:
+    return (
+        conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        is not None
+    )
+
+
+def create_default_partition(conn: Connection, table: Table) -> str:
+    """Partition for rows outside every monthly partition, so their inserts do not fail (see create_partition)."""
+    name = default_partition_name(table)
+    conn.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table.name} DEFAULT")
+    )
+    return name
+
+
+def create_partition(conn: Connection, table: Table, month: date) -> str:
+    """
+    Create the partition of a month if missing, moving the month's rows out of the default partition (if any) into
+    it, which PostgreSQL requires before attaching it.
+    """
+    name = partition_name(table, month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+
+    # Serialises workers creating the same partition
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+    if _exists(conn, name):
+        return name
+
+    default = default_partition_name(table)
+    if not _exists(conn, default):
+        conn.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF {table.name} "
+                f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+            )
+        )
+        return name
+
+    in_month = "timestamp >= :start AND timestamp < :end"
+    # Stops inserts into the default partition until the month's partition is attached
+    conn.execute(text(f"LOCK TABLE {default} IN EXCLUSIVE MODE"))
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table.name} INCLUDING DEFAULTS)"))
+    conn.execute(
+        text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}"), bounds
+    )
+    moved = conn.execute(text(f"DELETE FROM {default} WHERE {in_month}"), bounds)
+    conn.execute(
+        text(
+            f"ALTER TABLE {table.name} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+        )
+    )
+    if moved.rowcount:
+        LOGGER.info("Moved %s rows from %s to %s", moved.rowcount, default, name)
+
+    return name
+
+
+def ensure_partitions(
+    engine: Engine,
+    table: Table,
+    start: Optional[date] = None,
+    months_ahead: int = MONTHS_AHEAD,
+) -> list[str]:
+    """
+    Create any missing monthly partitions of a table partitioned by range of timestamp, from start (default the
+    current month) to months_ahead months from now, and its default partition. No-op for tables which are not
+    partitioned (see partition_table to convert existing tables).
+
+    Rows outside the monthly partitions, e.g. of a long running worker past the last month created, or results of a
+    request made before the first, go to the default partition. Run this regularly (e.g. monthly, with
+    archive_partitions) to create the coming months' partitions and move such rows into them.
+
+    Returns
+    -------
+    Names of the monthly partitions covering the range
+    """
+    today = date.today()
+    month = month_start(start or today)
+    end = add_months(month_start(today), months_ahead)
+
+    names = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn, table):
+            return names
+
+        create_default_partition(conn, table)
+        while month <= end:
+            names.append(create_partition(conn, table, month))
+            month = add_months(month, 1)
+
+    return names
+
+
+def partition_table(engine: Engine, table: Table, timestamps: str):
+    """
+    One-off migration of an existing (unpartitioned) table to a table partitioned by month of timestamp: the table is
+    recreated partitioned and its rows copied across, with timestamps taken from the timestamps query, which must
+    return (id, timestamp) for the table's rows (rows without a timestamp are copied with the current time), e.g. for
+    request_journey the timestamp of each result's request:
+
+        partition_table(
+            engine,
+            RequestJourney.__table__,
+            "SELECT request_journey.id, request.timestamp FROM request_journey "
+            "JOIN request ON request.id = request_journey.request_id",
+        )
+
+    Runs in a single transaction, holding an exclusive lock on the table throughout, which is rolled back (keeping the
+    original table) if any row is not copied.
+    """
+    legacy = f"{table.name}_legacy"
+
+    with engine.begin() as conn:
+        if is_partitioned(conn, table):
+            return
+
+        conn.execute(text(f"LOCK TABLE {table.name} IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(
+            text(
+                f"CREATE TEMPORARY TABLE partition_timestamps ON COMMIT DROP AS {timestamps}"
+            )
+        )
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy}"))
+        # Index (and primary key) names are schema wide, free them for the new table
+        conn.execute(
+            text(
+                f"ALTER TABLE {legacy} RENAME CONSTRAINT {table.name}_pkey TO {legacy}_pkey"
+            )
+        )
+        for index in table.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+        table.create(conn)
+
+        first = conn.execute(
+            text("SELECT min(timestamp) FROM partition_timestamps")
+        ).scalar()
+        month = month_start(first or date.today())
+        while month <= month_start(date.today()):
+            create_partition(conn, table, month)
+            month = add_months(month, 1)
+        create_default_partition(conn, table)
+
+        columns = [c.name for c in table.columns if c.name != "timestamp"]
+        copied = conn.execute(
+            text(
+                f"INSERT INTO {table.name} ({', '.join(columns)}, timestamp) "
+                f"SELECT {', '.join(f'{legacy}.{c}' for c in columns)}, "
+                "COALESCE(t.timestamp, now()) "
+                f"FROM {legacy} LEFT JOIN partition_timestamps t ON t.id = {legacy}.id"
+            )
+        ).rowcount
+        total = conn.execute(text(f"SELECT count(*) FROM {legacy}")).scalar()
+        if copied != total:
+            # Raising rolls back the migration, keeping the original table
+            raise RuntimeError(
+                f"Copied {copied} of {total} rows of {table.name}, not partitioned"
+            )
+        # Continue ids from the copied rows
+        conn.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}), false)"
+            )
+        )
+        conn.execute(text(f"DROP TABLE {legacy}"))
+
+    LOGGER.info("Partitioned %s", table.name)
+
+
+def archive_partitions(
+    engine: Engine,
+    table: Table,
+    archive_path: Path,
+    retention_months: int = RETENTION_MONTHS,
+) -> list[Path]:
+    """
+    Retention job: copy monthly partitions older than retention_months to gzipped CSV files (with header) in
+    archive_path, then detach and drop them. Each partition is only dropped once its archive has been written.
+
+    Returns
+    -------
+    Paths of the archives written
+    """
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    archive_path.mkdir(parents=True, exist_ok=True)
+
+    with engine.connect() as conn:
+        partitions = list_partitions(conn, table)
+
+    archives = []
+    for month, name in sorted(partitions.items()):
+        if month >= cutoff:
+            break
+
+        path = archive_path / f"{name}.csv.gz"
+        tmp_path = path.with_suffix(".tmp")
+
+        with engine.begin() as conn:
+            # Stop writes to the partition while it is copied
+            conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+
+            cursor = conn.connection.cursor()
+            with gzip.open(tmp_path, "wb") as f:
+                cursor.copy_expert(
+                    f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f
+                )
+            tmp_path.rename(path)
+
+            conn.execute(text(f"ALTER TABLE {table.name} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+
+        LOGGER.info("Archived %s to %s", name, path)
+        archives.append(path)
+
+    return archives
+
+
+def since(stmt: Select, table: Table, start: datetime) -> Select:
+    """
+    Restrict a query to rows of a partitioned table from start onwards, so only the partitions from the month of start
+    are scanned. Filters on other (unpartitioned) timestamps do not prune partitions, so should be combined with this,
+    e.g. results of requests made since start:
+
+        since(select(...).where(Request.timestamp >= start), RequestJourney.__table__, start)
+
+    (result timestamps are never earlier than their request's).
+    """
+    return stmt.where(table.c.timestamp >= start)
+
+
+def recent_results(table: Table, requests: Table, start: datetime) -> Select:
+    """Results (rows of the partitioned results table) of requests made since start, with the request timestamp."""
+    stmt = (
+        select(table, requests.c.timestamp.label("request_timestamp"))
+        .join(requests, requests.c.id == table.c.request_id)
+        .where(requests.c.timestamp >= start)
+    )
+    return since(stmt, table, start)
@@ -0,0 +1,275 @@
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import Integer, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from packages.shared.sql import fx, models, schemas
+from packages.shared.sql.partitions import add_months, month_start
+from packages.shared.utils.construct import construct_trusted
+
+# Percentiles of observed minimum prices reported by price_bands
+BAND_PERCENTILES = (0.1, 0.5, 0.9)
+
+
+def _percentile(fraction: float, column):
+    return cast(
+        func.round(func.percentile_cont(fraction).within_group(column)), Integer
+    )
+
+
+def record_price_history(session: Session, request_id: int) -> int:
+    """
+    Summarise a request's results into price_history, one row per travel dates (which differ between results of
+    flexible requests), in US dollars (see fx). Results without a rate for their currency are left out. Rows already
+    recorded for the request are updated, so this can be rerun e.g. after results are added or rates become available.
+    Changes are not committed.
+
+    Parameters
+    ----------
+    session: Database session
+    request_id: Request whose results to record
+
+    Returns
+    -------
+    Number of rows added or updated
+    """
+    request = models.Request.__table__
+    result = models.RequestJourney.__table__
+    journey_1 = models.Journey.__table__.alias("journey_1")
+    journey_2 = models.Journey.__table__.alias("journey_2")
+    history = models.PriceHistory.__table__
+
+    summary = (
+        select(
+            request.c.id,
+            func.upper(request.c.dep_port),
+            func.upper(request.c.arr_port),
+            journey_1.c.date,
+            journey_2.c.date,
+            request.c.timestamp,
+            literal(fx.BASE_CURRENCY),
+            func.min(result.c.price_usd),
+            _percentile(0.5, result.c.price_usd),
+            _percentile(0.9, result.c.price_usd),
+            func.count(),
+        )
+        .select_from(result)
+        .join(request, request.c.id == result.c.request_id)
+        .join(journey_1, journey_1.c.id == result.c.journey_id_1)
+        .outerjoin(journey_2, journey_2.c.id == result.c.journey_id_2)
+        .where(result.c.request_id == request_id, result.c.price_usd.is_not(None))
+        .group_by(request.c.id, journey_1.c.date, journey_2.c.date)
+    )
+    stmt = insert(history).from_select(
+        [
+            history.c.request_id,
+            history.c.dep_port,
+            history.c.arr_port,
+            history.c.dep_date,
+            history.c.ret_date,
+            history.c.observed_at,
+            history.c.currency,
+            history.c.min_price,
+            history.c.median_price,
+            history.c.p90_price,
+            history.c.n_results,
+        ],
+        summary,
+    )
+    # Recorded request and travel dates (see models.PriceHistory)
+    unique = next(i for i in history.indexes if i.name == "uq_price_history_request")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=unique.expressions,
+        set_={
+            column: stmt.excluded[column]
+            for column in ("min_price", "median_price", "p90_price", "n_results")
+        },
+    )
+
+    # Results inserted without a rate available may have one now
+    fx.fill_price_usd(session, request_id)
+
+    return session.execute(stmt).rowcount
+
+
+def _route(dep_port: str, arr_port: str):
+    history = models.PriceHistory.__table__
+    return (history.c.dep_port == dep_port.upper()) & (
+        history.c.arr_port == arr_port.upper()
+    )
+
+
+def _ret_date(ret_date: Optional[date]):
+    history = models.PriceHistory.__table__
+    return (
+        history.c.ret_date.is_(None)
+        if ret_date is None
+        else history.c.ret_date == ret_date
+    )
+
+
+def price_trend(
+    session: Session,
+    dep_port: str,
+    arr_port: str,
+    dep_date: date,
+    ret_date: Optional[date] = None,
+    start: Optional[datetime] = None,
+) -> list[schemas.PricePoint]:
+    """
+    Price observations over time for a route and travel dates, oldest first.
+
+    Parameters
+    ----------
+    session: Database session
+    dep_port: Departure airport (or city) code, as requested
+    arr_port: Arrival airport (or city) code, as requested
+    dep_date: Departure date
+    ret_date: Return date, None for one way trips
+    start: Only observations from this time onwards
+
+    Returns
+    -------
+    Minimum, median and 90th percentile price of each observation
+    """
+    history = models.PriceHistory.__table__
+    stmt = (
+        select(
+            history.c.observed_at,
+            history.c.min_price,
+            history.c.median_price,
+            history.c.p90_price,
+            history.c.currency,
+        )
+        .where(
+            _route(dep_port, arr_port),
+            history.c.dep_date == dep_date,
+            _ret_date(ret_date),
+        )
+        .order_by(history.c.observed_at)
+    )
+    if start is not None:
+        stmt = stmt.where(history.c.observed_at >= start)
+
+    return [
+        construct_trusted(schemas.PricePoint, row)
+        for row in session.execute(stmt).mappings()
+    ]
+
+
+def cheapest_dates(
+    session: Session,
+    dep_port: str,
+    arr_port: str,
+    month: date,
+    stay: Optional[int] = None,
+    start: Optional[datetime] = None,
+) -> list[schemas.CheapestDate]:
+    """
+    Latest observed minimum price for each departure date in a month, e.g. for a fare calendar.
+
+    Parameters
+    ----------
+    session: Database session
+    dep_port: Departure airport (or city) code, as requested
+    arr_port: Arrival airport (or city) code, as requested
+    month: Any date in the month of departure
+    stay: Only return trips of this many days (0 for same day returns), None for all one way and return trips
+    start: Ignore observations before this time e.g. to exclude outdated prices
+
+    Returns
+    -------
+    Prices by departure and return date, one per date pair observed
+    """
+    history = models.PriceHistory.__table__
+    first = month_start(month)
+    stmt = (
+        select(
+            history.c.dep_date,
+            history.c.ret_date,
+            history.c.min_price,
+            history.c.currency,
+            history.c.observed_at,
+        )
+        .where(
+            _route(dep_port, arr_port),
+            history.c.dep_date >= first,
+            history.c.dep_date < add_months(first, 1),
+        )
+        .distinct(history.c.dep_date, history.c.ret_date)
+        .order_by(
+            history.c.dep_date,
+            history.c.ret_date,
+            history.c.observed_at.desc(),
+        )
+    )
+    if stay is not None:
+        stmt = stmt.where(history.c.ret_date - history.c.dep_date == stay)
+    if start is not None:
+        stmt = stmt.where(history.c.observed_at >= start)
+
+    return [
+        construct_trusted(schemas.CheapestDate, row)
+        for row in session.execute(stmt).mappings()
+    ]
+
+
+def price_bands(
+    session: Session,
+    dep_port: str,
+    arr_port: str,
+    dep_date: Optional[date] = None,
+    ret_date: Optional[date] = None,
+    period: str = "day",
+    start: Optional[datetime] = None,
+) -> list[schemas.PriceBand]:
+    """
+    Spread of observed minimum prices for a route per period of observation (BAND_PERCENTILES as low, median and
+    high), e.g. to show whether a current price is typical.
+
+    Parameters
+    ----------
+    session: Database session
+    dep_port: Departure airport (or city) code, as requested
+    arr_port: Arrival airport (or city) code, as requested
+    dep_date: Departure date, None for all departure dates
+    ret_date: Return date, None for one way trips (ignored if dep_date is None)
+    period: Observation period to summarise over, any PostgreSQL date_trunc field e.g. "day", "week"
+    start: Only observations from this time onwards
+
+    Returns
+    -------
+    Price bands by period, oldest first
+    """
+    history = models.PriceHistory.__table__
+    # Rendered inline, so the grouped and selected expressions match
+    bucket = func.date_trunc(
+        literal(period, literal_execute=True), history.c.observed_at
+    )
+    low, median, high = (
+        _percentile(fraction, history.c.min_price) for fraction in BAND_PERCENTILES
+    )
+    stmt = (
+        select(
+            bucket.label("period"),
+            low.label("low"),
+            median.label("median"),
+            high.label("high"),
+            history.c.currency,
+            func.count().label("n"),
+        )
+        .where(_route(dep_port, arr_port))
+        .group_by(bucket, history.c.currency)
+        .order_by(bucket)
+    )
+    if dep_date is not None:
+        stmt = stmt.where(history.c.dep_date == dep_date, _ret_date(ret_date))
+    if start is not None:
+        stmt = stmt.where(history.c.observed_at >= start)
+
+    return [
+        construct_trusted(schemas.PriceBand, row)
+        for row in session.execute(stmt).mappings()
+    ]
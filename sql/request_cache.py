@@ -0,0 +1,121 @@
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import delete, exists, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, lazyload
+
+from packages.shared.sql import models, schemas
+from packages.shared.sql.database import engine
+from packages.shared.sql.leases import FAILED_STATUS
+from packages.shared.utils.construct import construct_trusted
+
+# Requests for the same parameters within MAX_AGE share results
+MAX_AGE = timedelta(hours=6)
+
+
+def request_key(request: schemas.RequestBase) -> str:
+    """Canonical key for a request's search parameters: its URL with airport codes normalised."""
+    ports = {
+        field: getattr(request, field).strip().upper()
+        for field in ("dep_port", "arr_port")
+    }
+    return request.model_copy(update=ports).get_url()
+
+
+def _stale(max_age: timedelta):
+    """Cache entries older than max_age, or pointing to a failed request, can be replaced."""
+    cache = models.RequestCache.__table__
+    request = models.Request.__table__.alias("cached_request")
+    # Referenced by name, as the subquery is not correlated automatically in ON CONFLICT ... WHERE
+    cached_id = literal_column(f"{cache.name}.{cache.c.request_id.name}")
+    failed = exists().where(
+        request.c.id == cached_id,
+        func.lower(request.c.status) == FAILED_STATUS,
+    )
+    return (cache.c.created < func.now() - max_age) | failed
+
+
+def _cached(session: Session, key: str, max_age: Optional[timedelta] = None):
+    stmt = (
+        select(models.Request)
+        .join(models.RequestCache, models.RequestCache.request_id == models.Request.id)
+        .where(models.RequestCache.key == key)
+        .options(lazyload(models.Request.results))
+    )
+    if max_age is not None:
+        stmt = stmt.where(~_stale(max_age))
+
+    return session.execute(stmt).scalar_one_or_none()
+
+
+def cached_request(
+    request: schemas.RequestBase, max_age: timedelta = MAX_AGE
+) -> Optional[schemas.Request]:
+    """Fresh (in progress or finished) request with the same parameters, if there is one."""
+    with Session(engine) as session:
+        request_db = _cached(session, request_key(request), max_age)
+        if request_db is None:
+            return None
+
+        return construct_trusted(schemas.Request, request_db)
+
+
+def submit_request(
+    request: schemas.RequestCreate,
+    max_age: timedelta = MAX_AGE,
+    status: Optional[str] = None,
+) -> tuple[schemas.Request, bool]:
+    """
+    Add a request, unless a fresh request with the same parameters (see request_key) exists, in which case that
+    request is returned instead so identical searches share one job and its results. Used to submit shared requests
+    (see job.submit_requests).
+
+    The request is inserted and its cache entry claimed in one transaction, with an upsert that only replaces stale or
+    failed entries. Concurrent identical submissions wait on each other's cache entry, so exactly one of them creates
+    a request and the others return it, across processes.
+
+    Parameters
+    ----------
+    request: Request to submit
+    max_age: Age after which cached requests are replaced by a new request
+    status: Initial status of an added request e.g. leases.QUEUED_STATUS
+
+    Returns
+    -------
+    Request, whether it was created (False if an existing request was returned)
+    """
+    key = request_key(request)
+
+    with Session(engine) as session:
+        request_db = models.Request(**request.model_dump(), status=status)
+        session.add(request_db)
+        session.flush()
+
+        cache = models.RequestCache.__table__
+        stmt = insert(cache).values(key=key, request_id=request_db.id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cache.c.key],
+            set_={"request_id": stmt.excluded.request_id, "created": func.now()},
+            where=_stale(max_age),
+        ).returning(cache.c.request_id)
+
+        if session.execute(stmt).scalar_one_or_none() is not None:
+            session.commit()
+            session.refresh(request_db)
+            return construct_trusted(schemas.Request, request_db), True
+
+        # Fresh entry exists (committed, the upsert waits for concurrent inserts of the same key)
+        session.rollback()
+        return construct_trusted(schemas.Request, _cached(session, key)), False
+
+
+def invalidate_request(request: schemas.RequestBase):
+    """Remove the cache entry for a request's parameters, so the next submission creates a new request."""
+    with Session(engine) as session:
+        session.execute(
+            delete(models.RequestCache).where(
+                models.RequestCache.key == request_key(request)
+            )
+        )
+        session.commit()
@@ -2,11 +2,19 @@ import logging
 from datetime import date, datetime
 from typing import Any, Optional
 
-from pydantic import BaseModel, FutureDate, root_validator, validator
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    FutureDate,
+    field_validator,
+    model_validator,
+)
 
 from packages.config import global_settings, paths
-from packages.shared.utils import types
-from packages.shared.utils.dates import time_from_string
+from packages.shared.utils import fields
+from packages.shared.utils.dates import minutes_from_string
+from packages.shared.utils.log import PrefixedMessage
 
 FLEXIBILITY = {1: "flexible-1day", 2: "flexible-2days", 3: "flexible-3days"}
 
@@ -14,15 +22,16 @@ SORT_OPTIONS = {0: "bestflight", 1: "price", 2: "duration"}
 
 
 class RequestBase(BaseModel):
-    dep_port: types.IataLonExample
-    arr_port: types.IataIstExample
-    dep_date: types.Date
-    ret_date: Optional[types.Date] = None
+    dep_port: fields.IataLonExample
+    arr_port: fields.IataIstExample
+    dep_date: fields.Date
+    ret_date: Optional[fields.Date] = None
     flex_option: int = 0
     sorted_by: Optional[str] = SORT_OPTIONS[0]
     direct: Optional[bool] = False
 
-    @validator("dep_date", "ret_date", pre=True)
+    @field_validator("dep_date", "ret_date", mode="before")
+    @classmethod
     def date_validate(cls, value):
         if value is not None:
             if isinstance(value, str):
@@ -33,32 +42,31 @@ class RequestBase(BaseModel):
 
         return value
 
-    @validator("flex_option", pre=True)
+    @field_validator("flex_option", mode="before")
+    @classmethod
     def flex_option_validate(cls, value):
         if value:
             validate_mapping(FLEXIBILITY, value)
 
         return value
 
-    @validator("sorted_by", pre=True)
+    @field_validator("sorted_by", mode="before")
+    @classmethod
     def sort_by_validate(cls, value):
         return validate_mapping(SORT_OPTIONS, value)
 
-    @root_validator()
-    def date_increase_validate(cls, values):
-        dep_date = values.get("dep_date")
-        ret_date = values.get("ret_date", None)
-
-        if ret_date is not None:
-            if dep_date > ret_date:
+    @model_validator(mode="after")
+    def date_increase_validate(self):
+        if self.ret_date is not None:
+            if self.dep_date > self.ret_date:
                 raise ValueError(
-                    f"ret_date must be greater than or equal to dep_date: {ret_date} !> {values['dep_date']}"
+                    f"ret_date must be greater than or equal to dep_date: {self.ret_date} !> {self.dep_date}"
                 )
 
-        return values
+        return self
 
     def get_url(self):
-        def get_date_str(d: types.Date):
+        def get_date_str(d: fields.Date):
             d_str = d.strftime(global_settings.date_fmt)
             if self.flex_option:
                 d_str += f"-{FLEXIBILITY[self.flex_option]}"
@@ -91,14 +99,16 @@ class FlightBase(BaseModel):
     arr_time: str
     arr_port: str
 
-    @validator("duration", pre=True)
+    @field_validator("duration", mode="before")
+    @classmethod
     def duration_validate(cls, value):
         if isinstance(value, str):
-            value = time_from_string(value).seconds / 60
+            value = minutes_from_string(value)
 
         return value
 
-    @validator("number", "dep_port", "arr_port")
+    @field_validator("number", "dep_port", "arr_port")
+    @classmethod
     def truncate_validator(cls, value: str):
         return value[:30]
 
@@ -117,10 +127,11 @@ class JourneyBase(BaseModel):
     stop_city: Optional[str] = None
     flights: Optional[list[FlightBase]] = None
 
-    @validator("duration", pre=True)
+    @field_validator("duration", mode="before")
+    @classmethod
     def duration_validate(cls, value):
         if isinstance(value, str):
-            value = time_from_string(value).seconds / 60
+            value = minutes_from_string(value)
 
         return value
 
@@ -131,6 +142,7 @@ class RequestJourneyBase(BaseModel):
     journey_id_2: Optional[int] = None
     price: int
     currency: str = "USD"
+    price_usd: Optional[int] = None
 
 
 class JourneyFlightBase(BaseModel):
@@ -141,8 +153,9 @@ class JourneyFlightBase(BaseModel):
 class RequestCreate(RequestBase):
     dep_date: FutureDate
     ret_date: Optional[FutureDate] = None
+    # Resubmitting with the same key returns the original request (see job.post_requests_to_db)
+    idempotency_key: Optional[str] = Field(None, max_length=100)
     # use_proxy: Optional[bool] = False
-    pass
 
 
 class RequestJourneyCreate(RequestJourneyBase):
@@ -158,8 +171,7 @@ class Request(RequestBase):
     status: Optional[str] = None
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
     def get_date(self) -> date:
         return self.timestamp.date()
@@ -193,51 +205,52 @@ class Request(RequestBase):
 
 
 class RequestAdapter(logging.LoggerAdapter):
+    """
+    Adds the request id to records as their request_id attribute, and as a "[Request: N]" message prefix formatted
+    only if the record is (see utils.log.PrefixedMessage, left out by the utils.log formatters).
+    """
+
     def process(self, msg, kwargs):
         if self.extra is None:
             raise ValueError("Adapter must be initialized with extra dict")
 
-        return "[Request: %s] %s" % (self.extra["id"], msg), kwargs
+        kwargs["extra"] = {"request_id": self.extra["id"], **kwargs.get("extra", {})}
+
+        return PrefixedMessage(msg, {"request_id": self.extra["id"]}), kwargs
 
 
 class Journey(JourneyBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Flight(FlightBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RequestJourney(RequestJourneyBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class JourneyFlight(JourneyFlightBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class FlightOutput(Flight):
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class JourneyOutput(Journey):
     flights: Optional[list[FlightOutput]] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TripBase(BaseModel):
@@ -249,23 +262,20 @@ class TripBase(BaseModel):
 
 
 class TripOutput(TripBase):
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RequestJourneyOutput(RequestJourney):
     journey_1: JourneyOutput
     journey_2: Optional[JourneyOutput] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RequestOutput(Request):
     results: Optional[list[RequestJourneyOutput]] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class PriceSummary(BaseModel):
@@ -273,8 +283,38 @@ class PriceSummary(BaseModel):
     min: int
     avg: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PricePoint(BaseModel):
+    observed_at: datetime
+    min_price: int
+    median_price: int
+    p90_price: int
+    currency: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CheapestDate(BaseModel):
+    dep_date: date
+    ret_date: Optional[date] = None
+    min_price: int
+    currency: str
+    observed_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PriceBand(BaseModel):
+    period: datetime
+    low: int
+    median: int
+    high: int
+    currency: str
+    n: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 def validate_mapping(d: dict[Any, Any], key_or_value):
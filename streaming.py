@@ -0,0 +1,287 @@
+import json
+from datetime import date
+from typing import Iterator, Optional
+
+from pymongo.database import Database
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+import packages.shared.combined_schemas as combined_schemas
+import packages.shared.mongodb.schemas as mdb_schemas
+from packages.shared.mongodb.cache import DocumentCache
+from packages.shared.sql import models
+from packages.shared.sql.database import engine
+from packages.shared.sql.partitions import since
+
+CHUNK_SIZE = 500
+
+# Output field order follows the response models so streamed and model-serialised responses are interchangeable
+REQUEST_FIELDS = [
+    f for f in combined_schemas.RequestOutput.model_fields if f != "results"
+]
+RESULT_FIELDS = [
+    f
+    for f in combined_schemas.RequestJourneyOutput.model_fields
+    if f not in ("journey_1", "journey_2")
+]
+JOURNEY_FIELDS = [
+    f for f in combined_schemas.JourneyOutput.model_fields if f != "flights"
+]
+FLIGHT_FIELDS = list(combined_schemas.FlightOutput.model_fields)
+PORT_FIELDS = ("dep_port", "arr_port")
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=_default).encode
+
+
+def stream_request_output(
+    request_id: int,
+    chunk_size: int = CHUNK_SIZE,
+    mdb: Optional[Database] = None,
+    normalised: bool = False,
+) -> Iterator[bytes]:
+    """
+    Serialise combined_schemas.RequestOutput JSON directly from SQL rows, without building the model tree. Results are
+    read through a server side cursor chunk_size rows at a time, with one flight query and one airport query per
+    chunk, so memory use is bounded regardless of the number of results. Usable directly as a FastAPI response:
+
+        StreamingResponse(stream_request_output(request_id), media_type="application/json")
+
+    Parameters
+    ----------
+    request_id: Request to serialise
+    chunk_size: Results read (and yielded) at a time
+    mdb: MongoDB database to resolve airports from, default the combined_schemas airport cache
+    normalised: Serialise combined_schemas.NormalisedRequestOutput instead, with each journey output once
+
+    Returns
+    -------
+    Iterator of JSON encoded byte chunks, the request is looked up before returning so a missing request raises here
+    rather than part way through a response
+    """
+    if mdb is None:
+        airport_cache = combined_schemas.airport_cache
+    else:
+        airport_cache = DocumentCache(mdb, "airports", "iata_code")
+
+    session = Session(engine)
+    try:
+        # Columns only, loading the Request model would also load all of its results (see _stream)
+        request = models.Request.__table__
+        stmt = select(*(request.c[field] for field in REQUEST_FIELDS)).where(
+            request.c.id == request_id
+        )
+        row = session.execute(stmt).mappings().one_or_none()
+        if row is None:
+            raise ValueError(f"No request found for id: {request_id}")
+
+        header = dict(row)
+    except Exception:
+        session.close()
+        raise
+
+    stream = _stream_normalised if normalised else _stream
+    return stream(session, header, request_id, chunk_size, airport_cache)
+
+
+def _stream(
+    session: Session,
+    header: dict,
+    request_id: int,
+    chunk_size: int,
+    airport_cache: DocumentCache,
+) -> Iterator[bytes]:
+    rj = models.RequestJourney.__table__
+    j1 = models.Journey.__table__.alias("journey_1")
+    j2 = models.Journey.__table__.alias("journey_2")
+
+    n_rj, n_j = len(rj.c), len(j1.c)
+    rj_names = [c.name for c in rj.c]
+    j_names = [c.name for c in j1.c]
+
+    stmt = (
+        select(rj, j1, j2)
+        .select_from(
+            rj.join(j1, rj.c.journey_id_1 == j1.c.id).outerjoin(
+                j2, rj.c.journey_id_2 == j2.c.id
+            )
+        )
+        .where(rj.c.request_id == request_id)
+        .order_by(rj.c.id)
+    )
+    if header["timestamp"] is not None:
+        # Results are never older than their request, so earlier request_journey partitions are skipped
+        stmt = since(stmt, rj, header["timestamp"])
+
+    airports: dict[str, dict] = {}
+
+    try:
+        yield _encode(header)[:-1].encode() + b',"results":['
+
+        first = True
+        result = session.execute(stmt, execution_options={"yield_per": chunk_size})
+        for partition in result.partitions():
+            rows = []
+            journey_ids = set()
+            for row in partition:
+                values = tuple(row)
+                result_row = dict(zip(rj_names, values[:n_rj]))
+                journey_1 = dict(zip(j_names, values[n_rj : n_rj + n_j]))
+                journey_2 = None
+                if result_row["journey_id_2"] is not None:
+                    journey_2 = dict(zip(j_names, values[n_rj + n_j :]))
+                    journey_ids.add(journey_2["id"])
+
+                journey_ids.add(journey_1["id"])
+                rows.append((result_row, journey_1, journey_2))
+
+            flights = _get_flights(session, journey_ids)
+            _update_airports(airport_cache, airports, flights)
+
+            parts = []
+            for result_row, journey_1, journey_2 in rows:
+                out = {field: result_row[field] for field in RESULT_FIELDS}
+                out["journey_1"] = _journey(journey_1, flights, airports)
+                out["journey_2"] = (
+                    _journey(journey_2, flights, airports) if journey_2 else None
+                )
+                parts.append(_encode(out))
+
+            chunk = ",".join(parts)
+            if not first:
+                chunk = "," + chunk
+            first = False
+
+            yield chunk.encode()
+
+        yield b"]}"
+    finally:
+        session.close()
+
+
+def _stream_normalised(
+    session: Session,
+    header: dict,
+    request_id: int,
+    chunk_size: int,
+    airport_cache: DocumentCache,
+) -> Iterator[bytes]:
+    rj = models.RequestJourney.__table__
+    j = models.Journey.__table__
+
+    results = select(rj).where(rj.c.request_id == request_id).order_by(rj.c.id)
+    if header["timestamp"] is not None:
+        results = since(results, rj, header["timestamp"])
+
+    journey_ids = union(
+        select(rj.c.journey_id_1).where(rj.c.request_id == request_id),
+        select(rj.c.journey_id_2).where(
+            rj.c.request_id == request_id, rj.c.journey_id_2.is_not(None)
+        ),
+    )
+    journeys = select(j).where(j.c.id.in_(journey_ids)).order_by(j.c.id)
+
+    airports: dict[str, dict] = {}
+
+    try:
+        yield _encode(header)[:-1].encode() + b',"results":['
+
+        first = True
+        result = session.execute(results, execution_options={"yield_per": chunk_size})
+        for partition in result.mappings().partitions():
+            chunk = ",".join(
+                _encode({field: row[field] for field in RESULT_FIELDS})
+                for row in partition
+            )
+            yield (chunk if first else "," + chunk).encode()
+            first = False
+
+        yield b'],"journeys":['
+
+        first = True
+        result = session.execute(journeys, execution_options={"yield_per": chunk_size})
+        for partition in result.mappings().partitions():
+            flights = _get_flights(session, {row["id"] for row in partition})
+            _update_airports(airport_cache, airports, flights)
+
+            chunk = ",".join(
+                _encode(_journey(row, flights, airports)) for row in partition
+            )
+            yield (chunk if first else "," + chunk).encode()
+            first = False
+
+        yield b"]}"
+    finally:
+        session.close()
+
+
+def _get_flights(session: Session, journey_ids: set[int]) -> dict[int, list[dict]]:
+    flights: dict[int, list[dict]] = {journey_id: [] for journey_id in journey_ids}
+    if not journey_ids:
+        return flights
+
+    jf = models.JourneyFlight.__table__
+    f = models.Flight.__table__
+
+    stmt = (
+        select(jf.c.journey_id, f)
+        .join(f, jf.c.flight_id == f.c.id)
+        .where(jf.c.journey_id.in_(journey_ids))
+        .order_by(jf.c.journey_id, f.c.id)
+    )
+
+    for row in session.execute(stmt).mappings():
+        flights[row["journey_id"]].append(
+            {field: row[field] for field in FLIGHT_FIELDS}
+        )
+
+    return flights
+
+
+def _update_airports(
+    airport_cache: DocumentCache,
+    airports: dict[str, dict],
+    flights: dict[int, list[dict]],
+):
+    codes = {
+        flight[field].upper()
+        for journey_flights in flights.values()
+        for flight in journey_flights
+        for field in PORT_FIELDS
+    }
+    missing = codes - airports.keys()
+    if not missing:
+        return
+
+    for code, port in airport_cache.get_many(missing).items():
+        airports[code] = mdb_schemas.AirportOutput(**port).model_dump(mode="json")
+
+    # Unknown airports are output by code only rather than failing part way through the response
+    for code in missing - airports.keys():
+        airports[code] = mdb_schemas.AirportOutput(iata_code=code).model_dump(
+            mode="json"
+        )
+
+
+def _journey(
+    journey: dict, flights: dict[int, list[dict]], airports: dict[str, dict]
+) -> dict:
+    out = {field: journey[field] for field in JOURNEY_FIELDS}
+
+    journey_flights = []
+    for flight in flights[journey["id"]]:
+        flight = dict(flight)
+        for field in PORT_FIELDS:
+            flight[field] = airports[flight[field].upper()]
+        journey_flights.append(flight)
+
+    out["flights"] = journey_flights
+
+    return out
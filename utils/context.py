@@ -0,0 +1,66 @@
+import os
+import socket
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Id of the request currently being processed, set for the duration of a Job's database/logging work so that lower
+# level hooks (e.g. sql.instrumentation) can attribute their work without having the request passed down explicitly.
+request_id: ContextVar[Optional[int]] = ContextVar("request_id", default=None)
+# Stage of the job in progress (e.g. "scrape", "ingest") and the worker (consumer process) running it, added to log
+# records along with the request id (see utils.log).
+phase: ContextVar[Optional[str]] = ContextVar("phase", default=None)
+worker_id: ContextVar[Optional[str]] = ContextVar("worker_id", default=None)
+
+# Log record attribute: context variable
+LOG_CONTEXT = {"request_id": request_id, "phase": phase, "worker_id": worker_id}
+
+
+@contextmanager
+def _set(var: ContextVar, value):
+    token = var.set(value)
+    try:
+        yield value
+    finally:
+        var.reset(token)
+
+
+@contextmanager
+def request_context(value: Optional[int]):
+    """
+    Set the current request id for the duration of the block, restoring the previous value on exit.
+
+    Parameters
+    ----------
+    value: Request id to attribute work to (None to explicitly clear)
+    """
+    with _set(request_id, value):
+        yield value
+
+
+@contextmanager
+def phase_context(value: Optional[str]):
+    """Set the current job phase for the duration of the block, restoring the previous value on exit."""
+    with _set(phase, value):
+        yield value
+
+
+@contextmanager
+def worker_context(value: Optional[str] = None):
+    """Set the current worker id (default_worker_id if not given) for the duration of the block."""
+    with _set(worker_id, value or default_worker_id()) as value:
+        yield value
+
+
+def default_worker_id() -> str:
+    """Identifies this process, as "<hostname>-<pid>"."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def current() -> dict:
+    """Context values currently set, by log record attribute."""
+    return {
+        name: value
+        for name, var in LOG_CONTEXT.items()
+        if (value := var.get()) is not None
+    }
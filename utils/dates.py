@@ -1,37 +1,167 @@
 import re
+from array import array
 from datetime import date, timedelta
+from functools import lru_cache
+from typing import Iterable, Sequence
 
 PERIOD_MAPPING = {"days": "d", "hours": "h", "minutes": "m", "seconds": "s"}
 
+# Inverted mapping: first letter of a unit (e.g. "h" for "h", "hr", "hours") to timedelta keyword
+PERIOD_PREFIXES = {val: key for key, val in PERIOD_MAPPING.items()}
+PERIOD_PATTERN = re.compile(r"(\d+)\s?([a-z]+)")
 
-def time_from_string(v: str):
+PARSE_CACHE_SIZE = 4096
+
+# Weekdays are numbered from Sunday (0) as in mongodb.schemas.Route.days, bit n of a weekday mask is set if weekday n
+# is included
+ALL_WEEKDAYS = 0b1111111
+MASK_WEEKDAYS = tuple(
+    tuple(day for day in range(7) if mask >> day & 1)
+    for mask in range(ALL_WEEKDAYS + 1)
+)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def time_from_string(v: str) -> timedelta:
     """
     Get time data from string: supports period mappings above, including more verbose formats e.g. 1day 6hours 3min
+    Results are memoised, scraped durations repeat heavily (e.g. "2h 35m").
     """
-    # TODO: Flip mapping and do one get(startswith) instead of double loop
-    out = re.findall(r"((\d+)(\s?[a-z]+))", v)
-
     args = {}
-    for group in out:
-        for key, val in PERIOD_MAPPING.items():
-            if group[-1].startswith(val):
-                args[key] = int(group[1])
-                break
+    for amount, unit in PERIOD_PATTERN.findall(v):
+        key = PERIOD_PREFIXES.get(unit[0])
+        if key is not None:
+            args[key] = int(amount)
 
     return timedelta(**args)
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def minutes_from_string(v: str) -> int:
     t = time_from_string(v)
     return int(t.seconds / 60)
 
 
+def parse_durations(values: Iterable[str]) -> array:
+    """
+    Parse many duration strings at once, see time_from_string for supported formats.
+
+    Parameters
+    ----------
+    values: Duration strings e.g. ["2h 35m", "55m"]
+
+    Returns
+    -------
+    Signed integer array of minutes, in input order
+    """
+    return array("l", map(minutes_from_string, values))
+
+
+def weekday(d: date) -> int:
+    #  Adding one to get Sunday as first day (0)
+    return (d.weekday() + 1) % 7
+
+
+def weekday_mask(departure_date: date, flexibility: int = 0) -> int:
+    """
+    Weekday bitmask covering departure_date +/- flexibility days, computed as a 7-bit rotation rather than by
+    expanding each date in the window.
+    """
+    span = 2 * flexibility + 1
+    if span <= 0:
+        return 0
+    if span >= 7:
+        return ALL_WEEKDAYS
+
+    start = (weekday(departure_date) - flexibility) % 7
+    run = (1 << span) - 1
+
+    return ((run << start) | (run >> (7 - start))) & ALL_WEEKDAYS
+
+
+def days_mask(days: Iterable[int]) -> int:
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+
+    return mask
+
+
+def weekdays_from_mask(mask: int) -> list[int]:
+    return list(MASK_WEEKDAYS[mask & ALL_WEEKDAYS])
+
+
 def calculate_weekdays(departure_date: date, flexibility: int = 0):
-    weekdays = []
-    for offset in range(-flexibility, flexibility + 1):
-        day = departure_date + timedelta(days=offset)
+    return weekdays_from_mask(weekday_mask(departure_date, flexibility))
+
 
-        #  Adding one to get Sunday as first day (0)
-        weekdays.append((day.weekday() + 1) % 7)
+def _broadcast(flexibilities: Sequence[int] | int, n: int) -> Sequence[int]:
+    if isinstance(flexibilities, int):
+        return [flexibilities] * n
+
+    if len(flexibilities) != n:
+        raise ValueError(
+            f"Expected one flexibility per date ({n}), got {len(flexibilities)}"
+        )
+
+    return flexibilities
+
+
+def expand_date_windows(
+    departure_dates: Sequence[date], flexibilities: Sequence[int] | int = 0
+) -> tuple[array, array]:
+    """
+    Expand many (date, flexibility) pairs into inclusive date windows.
+
+    Parameters
+    ----------
+    departure_dates: Centre date of each window
+    flexibilities: Days either side of each date, either one per date or a single value for all
+
+    Returns
+    -------
+    starts, ends: proleptic Gregorian ordinal arrays (see date.toordinal), windows are inclusive of both ends
+    """
+    flexibilities = _broadcast(flexibilities, len(departure_dates))
+    ordinals = [d.toordinal() for d in departure_dates]
+
+    starts = array("l", [o - f for o, f in zip(ordinals, flexibilities)])
+    ends = array("l", [o + f for o, f in zip(ordinals, flexibilities)])
+
+    return starts, ends
+
+
+def weekday_masks(
+    departure_dates: Sequence[date], flexibilities: Sequence[int] | int = 0
+) -> array:
+    """
+    Weekday bitmask (see weekday_mask) of each (date, flexibility) window, as an unsigned byte array.
+    """
+    flexibilities = _broadcast(flexibilities, len(departure_dates))
+    return array("B", map(weekday_mask, departure_dates, flexibilities))
+
+
+def combined_weekday_mask(
+    departure_dates: Sequence[date], flexibilities: Sequence[int] | int = 0
+) -> int:
+    """
+    Union of the weekdays covered by all windows, e.g. to fetch every route relevant to a batch of searches at once.
+    """
+    mask = 0
+    for window_mask in weekday_masks(departure_dates, flexibilities):
+        mask |= window_mask
+        if mask == ALL_WEEKDAYS:
+            break
+
+    return mask
+
+
+def days_filter(mask: int, field: str = "days") -> dict:
+    """
+    MongoDB filter matching routes operating on any of the weekdays in mask (e.g. {"days": {"$in": [0, 6]}}).
+    An all-day mask applies no restriction.
+    """
+    if mask & ALL_WEEKDAYS == ALL_WEEKDAYS:
+        return {}
 
-    return list(set(weekdays))
+    return {field: {"$in": weekdays_from_mask(mask)}}
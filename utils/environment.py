@@ -1,7 +1,10 @@
+import logging
 import os
 
 from packages.scraper.config import settings
 
+LOGGER = logging.getLogger(__name__)
+
 
 def env_variable_set(
     required_var: str, error: bool = False, verbose: bool = True
@@ -26,6 +29,6 @@ def env_variable_set(
         if error:
             raise EnvironmentError(message)
         elif verbose:
-            print(message)
+            LOGGER.warning(message)
 
     return is_set
@@ -0,0 +1,33 @@
+from datetime import date
+from typing import Annotated
+
+from pydantic import Field
+
+# Field types for the core schemas. FastAPI endpoint parameter types (Query, Path, Depends) are in utils.types, which
+# imports FastAPI, so schemas used outside the API (jobs, consumers, scripts) do not need it. Field metadata is read
+# by FastAPI as for Query, so endpoints taking these schemas document and validate them the same way, and utils.types
+# builds its Query parameter versions from these.
+
+IataLonExample = Annotated[
+    str,
+    Field(
+        examples=["LHR"],
+        min_length=3,
+        max_length=3,
+        description="Airport 3 letter IATA code.",
+    ),
+]
+IataIstExample = Annotated[
+    str,
+    Field(
+        examples=["IST"],
+        min_length=3,
+        max_length=3,
+        description="Airport 3 letter IATA code.",
+    ),
+]
+
+Date = Annotated[
+    date,
+    Field(examples=[date.today()], description="Date in the format 'YYYY-MM-DD'."),
+]
@@ -0,0 +1,194 @@
+"""
+Structured logging: the current request id, job phase and worker id (see utils.context) are added to log records as
+attributes, rather than formatted into messages, and written as JSON lines (or text) by a background thread.
+
+    listener = configure_logging()  # Root logger, INFO and above, JSON to stderr
+    with request_context(1), phase_context("scrape"):
+        LOGGER.info("Found %s results", n)
+    # {"time": ..., "level": "INFO", "logger": ..., "message": "Found 10 results", "request_id": 1, "phase": "scrape"}
+
+Messages are %-formatted only for records that are logged, so pass arguments rather than f-strings. Without
+configure_logging, messages of a RequestAdapter keep their "[Request: N]" prefix (see PrefixedMessage).
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+from packages.shared.utils import context
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# Text prefix of each context attribute
+LABELS = {"request_id": "Request", "phase": "Phase", "worker_id": "Worker"}
+
+
+class PrefixedMessage:
+    """
+    Log message (with any %-style arguments left on the record) whose context is added as a prefix when converted to
+    a string, e.g. "[Request: 1] Status updated", so the context is in the message for any formatter. The formatters
+    here output the context themselves, from record attributes, so leave it out (see record_message).
+    """
+
+    __slots__ = ("msg", "context")
+
+    def __init__(self, msg, context: dict):
+        self.msg = msg
+        self.context = context
+
+    def __str__(self) -> str:
+        return f"{prefix(self.context)}{self.msg}"
+
+
+def prefix(context: dict) -> str:
+    """Text prefix of context values that are set, e.g. "[Request: 1] [Phase: scrape] "."""
+    return "".join(
+        f"[{label}: {value}] "
+        for name, label in LABELS.items()
+        if (value := context.get(name)) is not None
+    )
+
+
+def record_message(record: logging.LogRecord) -> str:
+    """A record's message with its arguments, without the prefix of a PrefixedMessage."""
+    msg = record.msg
+    if isinstance(msg, PrefixedMessage):
+        msg = msg.msg
+
+    msg = str(msg)
+    return msg % record.args if record.args else msg
+
+
+class ContextFilter(logging.Filter):
+    """
+    Add the current context (utils.context) to records as attributes, keeping those already given, e.g. the request
+    id of a RequestAdapter. Attach to handlers rather than loggers, so it runs for records of child loggers too.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, var in context.LOG_CONTEXT.items():
+            if getattr(record, name, None) is None:
+                setattr(record, name, var.get())
+
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, context attributes that are set and exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record_message(record),
+        }
+        for name in context.LOG_CONTEXT:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Text, with messages prefixed by their context, e.g. "[Request: 1] [Phase: scrape] Found 10 results"."""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:  # noqa: N802
+        context = {name: getattr(record, name, None) for name in LABELS}
+        message = prefix(context) + record_message(record)
+        if message != record.message:
+            record = logging.makeLogRecord({**record.__dict__, "message": message})
+
+        return super().formatMessage(record)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Put records on a queue for a QueueListener to write, so logging never waits on I/O. The context and message are
+    resolved here, in the logging thread, formatting is left to the listener's handlers.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.addFilter(ContextFilter())
+        self._exception_formatter = logging.Formatter()
+        self.listener: Optional[StoppableListener] = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, keeps the message and exception separate for structured output
+        record = copy.copy(record)
+        record.message = record_message(record)
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+class StoppableListener(QueueListener):
+    """QueueListener that can be stopped more than once, e.g. explicitly and then at exit."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    json_output: bool = True,
+    stream: Optional[TextIO] = None,
+    logger: Optional[logging.Logger] = None,
+) -> StoppableListener:
+    """
+    Log records through a queue to a stream, written by a background thread which is stopped (writing any queued
+    records) at exit. Replaces the queue handler of a previous call on the same logger.
+
+    Parameters
+    ----------
+    level: Minimum level logged
+    json_output: Write JSON lines (see JsonFormatter), otherwise text (see TextFormatter)
+    stream: Stream to write to, default stderr
+    logger: Logger to configure, default the root logger
+
+    Returns
+    -------
+    Started listener
+    """
+    logger = logger or logging.getLogger()
+    for previous in logger.handlers[:]:
+        if isinstance(previous, ContextQueueHandler):
+            logger.removeHandler(previous)
+            if previous.listener is not None:
+                previous.listener.stop()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_output else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.listener = StoppableListener(
+        log_queue, handler, respect_handler_level=True
+    )
+
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)
+
+    return queue_handler.listener
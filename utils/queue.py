@@ -1,18 +1,19 @@
 import logging
 import ssl
-from typing import Callable
+from typing import Callable, Iterable, Optional
 
 import pika
 from pika.adapters.blocking_connection import BlockingChannel
 from pika.spec import PERSISTENT_DELIVERY_MODE
 
 from packages.config import global_settings
+from packages.shared.utils.context import worker_context
 
 LOGGER = logging.getLogger(__name__)
 
 
 def open_pika_connection(url: str = global_settings.cloudamqp_url):
-    LOGGER.info(f"Opening pika connection to: {url.split('@')[-1]}")
+    LOGGER.info("Opening pika connection to: %s", url.split("@")[-1])
 
     if "amazonaws" in url:
         # SSL Context for TLS configuration of Amazon MQ for RabbitMQ
@@ -28,8 +29,18 @@ def open_pika_connection(url: str = global_settings.cloudamqp_url):
 
 
 def consume(
-    queue: str, callback: Callable, url: str = global_settings.cloudamqp_url, prefetch: int = 1
+    queue: str,
+    callback: Callable,
+    url: str = global_settings.cloudamqp_url,
+    prefetch: int = 1,
+    worker_id: Optional[str] = None,
 ):
+    # Logs of callbacks are attributed to this worker (see utils.context)
+    with worker_context(worker_id):
+        _consume(queue, callback, url, prefetch)
+
+
+def _consume(queue: str, callback: Callable, url: str, prefetch: int):
     while True:
         try:
             connection = open_pika_connection(url)
@@ -40,7 +51,7 @@ def consume(
             channel.queue_declare(queue=queue, durable=True)  # Declare queue
             channel.basic_consume(queue, callback)
 
-            print("Waiting for messages...")
+            LOGGER.info("Waiting for messages on %s", queue)
             try:
                 channel.start_consuming()
             except KeyboardInterrupt:
@@ -50,7 +61,7 @@ def consume(
                 connection.close()  # Close connection
 
         except Exception as e:
-            LOGGER.exception(f"Error when trying to consume queue {queue}: {e}")
+            LOGGER.exception("Error when trying to consume queue %s: %s", queue, e)
             continue
 
 
@@ -62,3 +73,48 @@ def publish(channel: BlockingChannel, queue: str, body):
         properties=pika.BasicProperties(delivery_mode=PERSISTENT_DELIVERY_MODE),
         body=body,
     )
+
+
+def publish_batch(channel: BlockingChannel, queue: str, bodies: Iterable) -> int:
+    """
+    Publish messages to a queue as a single transaction: the queue is declared once, and the broker has accepted
+    every message (or none of them) when this returns. Messages are published on a new channel of the given
+    channel's connection, closed afterwards, so the given channel is not left in transaction mode (where later
+    publishes would wait for a commit).
+
+    Parameters
+    ----------
+    channel: Channel whose connection to publish on
+    queue: Queue name
+    bodies: Message bodies
+
+    Returns
+    -------
+    Number of messages published
+    """
+    tx_channel = channel.connection.channel()
+    try:
+        tx_channel.queue_declare(queue=queue, durable=True)
+        properties = pika.BasicProperties(delivery_mode=PERSISTENT_DELIVERY_MODE)
+
+        tx_channel.tx_select()
+        n = 0
+        try:
+            for body in bodies:
+                tx_channel.basic_publish(
+                    exchange="", routing_key=queue, properties=properties, body=body
+                )
+                n += 1
+
+            tx_channel.tx_commit()
+        except Exception:
+            if tx_channel.is_open:
+                tx_channel.tx_rollback()
+            raise
+    finally:
+        if tx_channel.is_open:
+            tx_channel.close()
+
+    LOGGER.info("Published %s messages to %s", n, queue)
+
+    return n
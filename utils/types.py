@@ -1,29 +1,29 @@
-from datetime import date
-from typing import Annotated, Literal, Optional
+import dataclasses
+from typing import Annotated, Literal, Optional, get_args
 
 from fastapi import Depends, Path, Query
-from pydantic import BaseModel
+from pydantic import BaseModel, BeforeValidator
 
 from packages.config import global_settings
+from packages.shared.utils import fields
 
-IataLonExample = Annotated[
-    str,
-    Query(
-        examples=["LHR"],
-        min_length=3,
-        max_length=3,
-        description="Airport 3 letter IATA code.",
-    ),
-]
-IataIstExample = Annotated[
-    str,
-    Query(
-        examples=["IST"],
-        min_length=3,
-        max_length=3,
-        description="Airport 3 letter IATA code.",
-    ),
-]
+
+def query(field_type):
+    """Query parameter version of a utils.fields type, with the same examples, description and constraints."""
+    tp, field = get_args(field_type)
+    constraints = {
+        name: value
+        for constraint in field.metadata
+        for name, value in dataclasses.asdict(constraint).items()
+    }
+    return Annotated[
+        tp,
+        Query(examples=field.examples, description=field.description, **constraints),
+    ]
+
+
+IataLonExample = query(fields.IataLonExample)
+IataIstExample = query(fields.IataIstExample)
 
 MultiIataLonExample = Annotated[
     list[str],
@@ -48,10 +48,7 @@ CountryCode = Annotated[
     ),
 ]
 
-Date = Annotated[
-    date,
-    Query(examples=[date.today()], description="Date in the format 'YYYY-MM-DD'."),
-]
+Date = query(fields.Date)
 Days = Annotated[
     list[int],
     Query(
@@ -69,9 +66,11 @@ GroupRoutes = Annotated[
 ]
 
 Idx = Annotated[int, Path(ge=0, description="Database ID")]
-# TODO: once pydantic upgraded to >2.0, try using a functional_validator to convert from str2int before Literal
+# Query values arrive as strings, convert before checking against the Literal
 SortOrder = Annotated[
-    Literal["1", "-1"], Query(description="Sort ascending (1) or descending (-1).")
+    Literal[1, -1],
+    BeforeValidator(int),
+    Query(description="Sort ascending (1) or descending (-1)."),
 ]
 Limit = Annotated[
     int,
@@ -114,7 +113,7 @@ LocationSortBy = Annotated[
 # TODO: Can we change defaults/examples within these for a specific endpoint i.e. resetting "example"?
 class CommonQueryParams(BaseModel):
     sort_by: Optional[GenericSortBy] = None
-    sort_order: SortOrder = "1"
+    sort_order: SortOrder = 1
     limit: Limit = global_settings.return_limit
     page: Page = 0
 